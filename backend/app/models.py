@@ -64,6 +64,7 @@ class ParkingLot(SQLModel, table=True):
     capacity: int
     hourly_rate: float
     is_active: bool = True
+    status_observed_at: Optional[datetime] = None  # capture time of the last CV status applied
     
     spots: List["ParkingSpot"] = Relationship(back_populates="parking_lot")
     cameras: List["Camera"] = Relationship(back_populates="parking_lot")
@@ -3,18 +3,39 @@ CV Module API Endpoints
 Handles parking space detection updates from the CV module
 """
 from typing import List
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
 from sqlmodel import Session, select
 import json
+import msgpack
 
-from app.database import get_session
+from app.database import get_session, engine
 from app.models import ParkingLot, ParkingSpot, SpotStatus
-from app.schemas import ParkingLotStatusUpdate, ParkingSpotStatusUpdate, CVEvent
+from app.schemas import (
+    ParkingLotStatusUpdate,
+    ParkingSpotStatusUpdate,
+    ParkingSpotStatusBulkUpdate,
+    CVEvent
+)
 from app.websockets import manager
 
 router = APIRouter(prefix="/cv", tags=["cv"])
 
+# Map status string to enum
+SPOT_STATUS_MAP = {
+    "empty": SpotStatus.EMPTY,
+    "occupied": SpotStatus.OCCUPIED,
+    "reserved": SpotStatus.RESERVED
+}
+
+
+def _naive_utc(timestamp: datetime) -> datetime:
+    """Stored timestamps are naive UTC"""
+    if timestamp and timestamp.tzinfo:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
 
 @router.put("/parking-lots/{parking_lot_id}/status")
 async def update_parking_lot_status(
@@ -25,6 +46,8 @@ async def update_parking_lot_status(
     """
     Update the status of a parking lot from CV module detection results.
     This endpoint is called by the CV module after processing camera frames.
+    Updates observed before the last applied one (replayed or spooled) are
+    reported as stale and neither stored nor broadcast.
     """
     # Verify parking lot exists
     parking_lot = session.get(ParkingLot, parking_lot_id)
@@ -34,9 +57,15 @@ async def update_parking_lot_status(
             detail="Parking lot not found"
         )
 
+    # Replayed (delayed) updates must not overwrite a newer state
+    observed_at = _naive_utc(status_update.observed_at)
+    if observed_at and parking_lot.status_observed_at and observed_at < parking_lot.status_observed_at:
+        return {"success": True, "parking_lot_id": parking_lot_id, "stale": True}
+
     # Update parking lot capacity info if needed
     if status_update.total_spots > 0:
         parking_lot.capacity = status_update.total_spots
+    parking_lot.status_observed_at = observed_at or datetime.utcnow()
 
     session.add(parking_lot)
     session.commit()
@@ -50,7 +79,7 @@ async def update_parking_lot_status(
             "empty_spots": status_update.empty_spots,
             "occupied_spots": status_update.occupied_spots,
             "occupancy_rate": status_update.occupancy_rate,
-            "updated_at": datetime.utcnow().isoformat()
+            "updated_at": (status_update.observed_at or datetime.utcnow()).isoformat()
         }
     })
 
@@ -59,6 +88,7 @@ async def update_parking_lot_status(
     return {
         "success": True,
         "parking_lot_id": parking_lot_id,
+        "stale": False,
         "status": {
             "total_spots": status_update.total_spots,
             "empty_spots": status_update.empty_spots,
@@ -84,14 +114,7 @@ async def update_spot_status(
             detail="Parking spot not found"
         )
 
-    # Map status string to enum
-    status_map = {
-        "empty": SpotStatus.EMPTY,
-        "occupied": SpotStatus.OCCUPIED,
-        "reserved": SpotStatus.RESERVED
-    }
-
-    new_status = status_map.get(status_update.status.lower())
+    new_status = SPOT_STATUS_MAP.get(status_update.status.lower())
     if not new_status:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -125,6 +148,72 @@ async def update_spot_status(
     }
 
 
+@router.put("/parking-spots/status")
+async def update_spot_statuses(
+    bulk_update: ParkingSpotStatusBulkUpdate,
+    session: Session = Depends(get_session)
+):
+    """
+    Update many parking spots at once.
+    All changes are applied in a single transaction and announced in one broadcast.
+    Unknown spots are reported back instead of failing the whole batch.
+    """
+    # Validate everything before touching the database; the last update per spot wins
+    updates = {}
+    for item in bulk_update.updates:
+        new_status = SPOT_STATUS_MAP.get(item.status.lower())
+        if not new_status:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid status for spot {item.spot_id}: {item.status}. "
+                       f"Must be one of: empty, occupied, reserved"
+            )
+        updates[item.spot_id] = (item, new_status, _naive_utc(item.observed_at))
+
+    spots = session.exec(
+        select(ParkingSpot).where(ParkingSpot.id.in_(list(updates)))
+    ).all() if updates else []
+
+    now = datetime.utcnow()
+    applied = []
+    stale = []
+    for spot in spots:
+        item, new_status, observed_at = updates[spot.id]
+        # Replayed (delayed) updates must not overwrite a newer state
+        if observed_at and spot.last_updated and observed_at < spot.last_updated:
+            stale.append(spot.id)
+            continue
+
+        spot.status = new_status
+        spot.last_updated = observed_at or now
+        session.add(spot)
+        applied.append({
+            "spot_id": spot.id,
+            "parking_lot_id": spot.parking_lot_id,
+            "data": {
+                "status": item.status,
+                "confidence": item.confidence,
+                "updated_at": spot.last_updated.isoformat()
+            }
+        })
+
+    session.commit()
+
+    if applied:
+        await manager.broadcast(json.dumps({
+            "type": "spot_update_batch",
+            "updates": applied
+        }))
+
+    found = {spot.id for spot in spots}
+    return {
+        "success": True,
+        "updated": len(applied),
+        "stale": stale,
+        "not_found": [spot_id for spot_id in updates if spot_id not in found]
+    }
+
+
 @router.post("/events")
 async def receive_cv_event(event: CVEvent):
     """
@@ -143,6 +232,98 @@ async def receive_cv_event(event: CVEvent):
     return {"success": True, "event_type": event.event_type}
 
 
+def _lot_status_from_frame(frame: dict) -> ParkingLotStatusUpdate:
+    """Expand a compact ingest lot frame into the REST payload"""
+    classes = frame.get("classes", [])
+    empty_classes = frame.get("empty_classes", [])
+    total = frame["total"]
+    return ParkingLotStatusUpdate(
+        total_spots=total,
+        empty_spots=frame["empty"],
+        occupied_spots=frame["occupied"],
+        occupancy_rate=frame["occupied"] / total if total > 0 else 0,
+        detections=[
+            {
+                "class_name": classes[class_index],
+                "confidence": confidence,
+                "x": x,
+                "y": y,
+                "width": width,
+                "height": height,
+                "is_empty": empty_classes[class_index]
+            }
+            for class_index, confidence, x, y, width, height in frame.get("detections", [])
+        ],
+        observed_at=datetime.fromtimestamp(frame["observed_at"], timezone.utc) if frame.get("observed_at") else None
+    )
+
+
+async def _ingest_frame(frame: dict, session: Session):
+    """Apply one ingest frame through the same code paths as the REST endpoints"""
+    frame_type = frame.get("type")
+
+    if frame_type == "lot_status":
+        status_update = _lot_status_from_frame(frame)
+        result = await update_parking_lot_status(frame["lot"], status_update, session)
+        if result.get("stale"):
+            return {"stale": True}
+        # Lot status and its event arrive as one frame but keep both broadcasts for clients
+        if frame.get("event"):
+            await receive_cv_event(CVEvent(
+                parking_lot_id=frame["lot"],
+                event_type=frame["event"],
+                data={
+                    "total": status_update.total_spots,
+                    "empty": status_update.empty_spots,
+                    "occupied": status_update.occupied_spots,
+                    "occupancy_rate": status_update.occupancy_rate
+                }
+            ))
+        return None
+
+    if frame_type == "spot_batch":
+        bulk_update = ParkingSpotStatusBulkUpdate(updates=[
+            {
+                "spot_id": spot_id,
+                "status": spot_status,
+                "confidence": confidence,
+                "observed_at": datetime.fromtimestamp(observed_at, timezone.utc) if observed_at else None
+            }
+            for spot_id, spot_status, confidence, observed_at in frame["updates"]
+        ])
+        result = await update_spot_statuses(bulk_update, session)
+        return {"not_found": result["not_found"]} if result["not_found"] else None
+
+    raise ValueError(f"Unknown frame type: {frame_type}")
+
+
+@router.websocket("/ingest")
+async def ingest(websocket: WebSocket):
+    """
+    Streaming ingest channel for the CV module.
+    Each binary frame is a msgpack map with a "seq" number; every frame is
+    answered with {"ack": seq} (plus "error" if it was rejected), so the
+    sender can release or re-send what it still holds.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            frame = msgpack.unpackb(await websocket.receive_bytes())
+            ack = {"ack": frame.get("seq")}
+            try:
+                with Session(engine) as session:
+                    extra = await _ingest_frame(frame, session)
+                if extra:
+                    ack.update(extra)
+            except HTTPException as e:
+                ack["error"] = e.detail
+            except (KeyError, TypeError, ValueError, ValidationError) as e:
+                ack["error"] = f"Malformed frame: {e}"
+            await websocket.send_bytes(msgpack.packb(ack))
+    except WebSocketDisconnect:
+        pass
+
+
 @router.get("/parking-lots/{parking_lot_id}/detections")
 def get_latest_detections(
     parking_lot_id: int,
@@ -124,6 +124,7 @@ class ParkingLotStatusUpdate(BaseModel):
     occupied_spots: int
     occupancy_rate: float
     detections: list[DetectionData] = []
+    observed_at: Optional[datetime] = None  # capture time (later than received when replayed)
 
 
 class ParkingSpotStatusUpdate(BaseModel):
@@ -131,6 +132,17 @@ class ParkingSpotStatusUpdate(BaseModel):
     confidence: float = 1.0
 
 
+class ParkingSpotStatusBulkItem(BaseModel):
+    spot_id: int
+    status: str  # "empty", "occupied", "reserved"
+    confidence: float = 1.0
+    observed_at: Optional[datetime] = None  # capture time; older than the stored state is ignored
+
+
+class ParkingSpotStatusBulkUpdate(BaseModel):
+    updates: list[ParkingSpotStatusBulkItem]
+
+
 class CVEvent(BaseModel):
     parking_lot_id: int
     event_type: str
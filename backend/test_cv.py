@@ -0,0 +1,75 @@
+"""
+Tests for the CV update endpoints: replayed updates must not overwrite newer state
+Run with: python -m pytest test_cv.py (from the backend directory)
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.models import ParkingLot, ParkingSpot, SpotStatus
+from app.routers import cv
+from app.schemas import ParkingLotStatusUpdate, ParkingSpotStatusBulkUpdate
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(ParkingLot(id=1, name="Lot", address="Street 1", latitude=0, longitude=0, capacity=10,
+                               hourly_rate=1.0))
+        session.add(ParkingSpot(id=1, parking_lot_id=1, spot_number="A1", status=SpotStatus.EMPTY,
+                                last_updated=NOW))
+        session.add(ParkingSpot(id=2, parking_lot_id=1, spot_number="A2", status=SpotStatus.EMPTY,
+                                last_updated=NOW))
+        session.commit()
+        yield session
+
+
+def _utc(offset_seconds: int) -> str:
+    return (NOW + timedelta(seconds=offset_seconds)).replace(tzinfo=timezone.utc).isoformat()
+
+
+def _bulk(session, *updates):
+    return asyncio.run(cv.update_spot_statuses(ParkingSpotStatusBulkUpdate(updates=list(updates)), session))
+
+
+def _lot_status(session, empty: int, observed_at: str = None):
+    update = ParkingLotStatusUpdate(
+        total_spots=10, empty_spots=empty, occupied_spots=10 - empty, occupancy_rate=(10 - empty) / 10,
+        observed_at=observed_at
+    )
+    return asyncio.run(cv.update_parking_lot_status(1, update, session))
+
+
+def test_bulk_update_skips_spots_observed_before_their_state(session):
+    result = _bulk(
+        session,
+        {"spot_id": 1, "status": "occupied", "observed_at": _utc(-60)},
+        {"spot_id": 2, "status": "occupied", "observed_at": _utc(60)},
+        {"spot_id": 99, "status": "occupied"},
+    )
+    assert result["updated"] == 1
+    assert result["stale"] == [1]
+    assert result["not_found"] == [99]
+    assert session.get(ParkingSpot, 1).status == SpotStatus.EMPTY
+    assert session.get(ParkingSpot, 2).status == SpotStatus.OCCUPIED
+    assert session.get(ParkingSpot, 2).last_updated == NOW + timedelta(seconds=60)
+
+
+def test_bulk_update_rejects_unknown_status(session):
+    with pytest.raises(cv.HTTPException):
+        _bulk(session, {"spot_id": 1, "status": "parked"})
+
+
+def test_lot_status_skips_updates_observed_before_the_applied_one(session):
+    assert not _lot_status(session, empty=4, observed_at=_utc(60))["stale"]
+    assert _lot_status(session, empty=9, observed_at=_utc(30))["stale"]
+    assert session.get(ParkingLot, 1).status_observed_at == NOW + timedelta(seconds=60)
+    # Updates without a capture time are current
+    assert not _lot_status(session, empty=5)["stale"]
@@ -2,12 +2,34 @@
 Backend API Client for CV Module
 Sends detection results to the ParkVision backend
 """
+import re
+import time
+import random
 import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from datetime import datetime, timezone
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
 
-from config import BACKEND_API_URL, BACKEND_API_KEY
+from config import (
+    BACKEND_API_URL,
+    BACKEND_API_KEY,
+    SPOT_BATCH_SIZE,
+    SPOT_BATCH_INTERVAL,
+    API_RETRIES,
+    API_BACKOFF,
+    SPOOL_ENABLED,
+    SPOOL_RETRY_INTERVAL,
+    SPOOL_REPLAY_BATCH,
+    SPOOL_REPLAY_RATE,
+    SPOOL_REPLAY_JITTER,
+    INGEST_ENABLED
+)
+from spool import UpdateSpool, LOT_STATUS, SPOT_STATUS, EVENT
+from ingest import IngestChannel, LOT_STATUS_FRAME, SPOT_BATCH_FRAME
+from metrics import BACKEND_REQUEST_SECONDS, BACKEND_REQUESTS_TOTAL, BACKEND_QUEUE_DEPTH
 
 logger = logging.getLogger(__name__)
 
@@ -23,28 +45,200 @@ class ParkingUpdate:
     detections: List[Dict[str, Any]]
 
 
+@dataclass
+class SpotUpdate:
+    """A spot state change waiting to be sent"""
+    spot_id: int
+    status: str
+    confidence: float
+    observed_at: float  # capture time, epoch seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "spot_id": self.spot_id,
+            "status": self.status,
+            "confidence": self.confidence,
+            "observed_at": _isoformat(self.observed_at)
+        }
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def _observe_request(url: str, started: float, response: Optional[requests.Response]):
+    """Record one backend call (ids folded out of the path to keep label cardinality low)"""
+    endpoint = _ID_SEGMENT.sub("/{id}", requests.utils.urlparse(url).path)
+    BACKEND_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+    status = f"{response.status_code // 100}xx" if response is not None else "error"
+    BACKEND_REQUESTS_TOTAL.labels(endpoint, status).inc()
+
+
 class BackendClient:
     """
     Client for communicating with ParkVision backend API
+
+    Spot changes are buffered (latest state per spot) and sent through the
+    bulk endpoint once batch_size spots are pending or the oldest change is
+    flush_interval seconds old.
+
+    Updates the backend cannot take are written to a durable spool. While
+    the spool holds anything, new updates are appended behind it so order
+    is kept; a background thread replays it, compacted per spot/lot and
+    paced, once health_check() succeeds again.
+
+    With an ingest channel, lot status (with its event) and spot batches
+    go out as msgpack frames on one WebSocket; the HTTP endpoints remain
+    the fallback whenever the channel is down.
     """
 
-    def __init__(self, base_url: str = None, api_key: str = None):
+    def __init__(
+        self,
+        base_url: str = None,
+        api_key: str = None,
+        pool_size: int = 10,
+        batch_size: int = None,
+        flush_interval: float = None,
+        spool: UpdateSpool = None,
+        ingest_channel: IngestChannel = None,
+        durable: bool = True
+    ):
         """
         Initialize the backend client
 
         Args:
             base_url: Backend API URL
             api_key: Optional API key for authentication
+            pool_size: Keep-alive connections kept per host (raise when shared by many workers)
+            batch_size: Pending spot changes that trigger a flush
+            flush_interval: Maximum seconds a spot change waits in the buffer
+            spool: Durable store for undeliverable updates (default: SPOOL_PATH if enabled)
+            ingest_channel: Streaming channel to the backend (default: one if INGEST_ENABLED)
+            durable: Open the default spool and ingest channel (off for clients that only read)
         """
         self.base_url = (base_url or BACKEND_API_URL).rstrip("/")
         self.api_key = api_key or BACKEND_API_KEY
         self.session = requests.Session()
 
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
         if self.api_key:
             self.session.headers["X-API-Key"] = self.api_key
 
         self.session.headers["Content-Type"] = "application/json"
 
+        self.batch_size = batch_size or SPOT_BATCH_SIZE
+        self.flush_interval = SPOT_BATCH_INTERVAL if flush_interval is None else flush_interval
+        self._spot_buffer: Dict[int, SpotUpdate] = {}
+        self._buffer_since: Optional[float] = None
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._flush_now = threading.Event()
+        self._closed = threading.Event()
+        self._bulk_supported = True
+
+        if spool is None and SPOOL_ENABLED and durable:
+            spool = UpdateSpool()
+        self.spool = spool
+        if ingest_channel is None and INGEST_ENABLED and durable:
+            ingest_channel = IngestChannel(self.base_url, self.api_key)
+        self.ingest = ingest_channel
+
+        # Read at scrape time only
+        BACKEND_QUEUE_DEPTH.labels("spot_buffer").set_function(lambda: len(self._spot_buffer))
+        if self.spool is not None:
+            BACKEND_QUEUE_DEPTH.labels("spool").set_function(lambda: len(self.spool))
+        if self.ingest is not None:
+            BACKEND_QUEUE_DEPTH.labels("ingest_in_flight").set_function(lambda: len(self.ingest._unacked))
+        self._recovery: Optional[threading.Thread] = None
+        if self.spool is not None and len(self.spool):
+            logger.info(f"{len(self.spool)} spooled update(s) from a previous run will be replayed")
+            self._start_recovery()
+
+    @property
+    def degraded(self) -> bool:
+        """True while spooled updates wait for replay"""
+        return self.spool is not None and len(self.spool) > 0
+
+    def _spool(self, kind: str, key: Any, payload: Dict[str, Any], observed_at: float = None) -> bool:
+        """
+        Keep an update for later replay
+
+        Returns:
+            True if it was spooled (False when no spool is configured)
+        """
+        if self.spool is None:
+            return False
+        self.spool.append(kind, key, payload, observed_at)
+        self._start_recovery()
+        return True
+
+    def _start_recovery(self):
+        with self._buffer_lock:
+            if self._recovery is not None:
+                return
+            self._recovery = threading.Thread(target=self._recovery_loop, name="spool-replay", daemon=True)
+            self._recovery.start()
+
+    def _recovery_loop(self):
+        """Wait for the backend to come back, then drain the spool"""
+        while not self._closed.wait(SPOOL_RETRY_INTERVAL):
+            if not len(self.spool) or not self.health_check():
+                continue
+            # Many CV nodes see the backend return at the same moment: spread the replays
+            if self._closed.wait(random.uniform(0, SPOOL_REPLAY_JITTER)):
+                break
+            self.replay()
+
+    def replay(self) -> bool:
+        """
+        Send spooled updates, oldest first, compacted to the latest per spot/lot
+
+        Returns:
+            True if the spool was drained
+        """
+        logger.info(f"Replaying {len(self.spool)} spooled update(s)")
+        while not self._closed.is_set():
+            entries = self.spool.compacted(limit=SPOOL_REPLAY_BATCH)
+            if not entries:
+                logger.info(f"Spool drained: {self.spool.stats()}")
+                return True
+
+            delivered = []
+            spots = [e for e in entries if e[1] == SPOT_STATUS]
+            if spots:
+                updates = [
+                    SpotUpdate(int(key), payload["status"], payload["confidence"], observed_at)
+                    for _, _, key, payload, observed_at in spots
+                ]
+                if not self.update_spot_statuses(updates):
+                    return False
+                delivered += [(seq, kind, key) for seq, kind, key, _, _ in spots]
+
+            for seq, kind, key, payload, _ in entries:
+                if kind == SPOT_STATUS:
+                    continue
+                if kind == LOT_STATUS:
+                    url = f"{self.base_url}/cv/parking-lots/{payload['parking_lot_id']}/status"
+                    response = self._request_with_retry("PUT", url, json=payload["body"])
+                else:
+                    response = self._request_with_retry("POST", f"{self.base_url}/cv/events", json=payload)
+                if response is None or response.status_code >= 500:
+                    self.spool.acknowledge(delivered)
+                    return False
+                delivered.append((seq, kind, key))
+
+            self.spool.acknowledge(delivered)
+            # Pace the backlog so a recovering backend is not flooded
+            time.sleep(1.0 / SPOOL_REPLAY_RATE)
+        return False
+
     def health_check(self) -> bool:
         """Check if backend is reachable"""
         try:
@@ -60,7 +254,8 @@ class BackendClient:
         total_spots: int,
         empty_spots: int,
         occupied_spots: int,
-        detections: List[Dict] = None
+        detections: List[Dict] = None,
+        observed_at: float = None
     ) -> bool:
         """
         Update the status of a parking lot
@@ -71,36 +266,102 @@ class BackendClient:
             empty_spots: Number of empty spots
             occupied_spots: Number of occupied spots
             detections: Raw detection data (optional)
+            observed_at: Capture time of the frame, epoch seconds (default: now)
 
         Returns:
-            True if update was successful
+            True if update was successful (False also when it was spooled for later)
         """
-        try:
-            payload = {
-                "total_spots": total_spots,
-                "empty_spots": empty_spots,
-                "occupied_spots": occupied_spots,
-                "occupancy_rate": occupied_spots / total_spots if total_spots > 0 else 0,
-                "detections": detections or []
-            }
-
-            response = self.session.put(
-                f"{self.base_url}/cv/parking-lots/{parking_lot_id}/status",
-                json=payload,
-                timeout=10
-            )
+        observed_at = observed_at or time.time()
+        payload = {
+            "total_spots": total_spots,
+            "empty_spots": empty_spots,
+            "occupied_spots": occupied_spots,
+            "occupancy_rate": occupied_spots / total_spots if total_spots > 0 else 0,
+            "detections": detections or [],
+            "observed_at": _isoformat(observed_at)
+        }
+        spooled = {"parking_lot_id": parking_lot_id, "body": payload}
+
+        # Keep order behind updates that are still waiting for replay
+        if self.degraded:
+            self._spool(LOT_STATUS, parking_lot_id, spooled, observed_at)
+            return False
 
-            if response.status_code == 200:
-                logger.info(f"Updated parking lot {parking_lot_id}: {empty_spots}/{total_spots} empty")
-                return True
-            else:
-                logger.error(f"Failed to update: {response.status_code} - {response.text}")
-                return False
+        response = self._request_with_retry(
+            "PUT",
+            f"{self.base_url}/cv/parking-lots/{parking_lot_id}/status",
+            json=payload
+        )
+        if response is None or response.status_code >= 500:
+            logger.error(f"API request failed for parking lot {parking_lot_id}")
+            self._spool(LOT_STATUS, parking_lot_id, spooled, observed_at)
+            return False
 
-        except Exception as e:
-            logger.error(f"API request failed: {e}")
+        if response.status_code == 200:
+            logger.info(f"Updated parking lot {parking_lot_id}: {empty_spots}/{total_spots} empty")
+            return True
+        else:
+            logger.error(f"Failed to update: {response.status_code} - {response.text}")
             return False
 
+    def publish_lot_status(
+        self,
+        parking_lot_id: int,
+        detections,
+        summary: Dict[str, Any],
+        observed_at: float = None,
+        event_type: str = "status_update"
+    ) -> bool:
+        """
+        Publish a lot status change and its event in one message
+
+        Goes out as a single ingest frame when the channel is up, otherwise
+        as the status update followed by the event over HTTP. Streamed frames
+        are not waited on: one the backend never acknowledges is delivered
+        over HTTP (or spooled) later by the ingest channel.
+
+        Args:
+            parking_lot_id: ID of the parking lot
+            detections: DetectionBatch the status was computed from
+            summary: Lot summary (total, empty, occupied, occupancy_rate)
+            observed_at: Capture time of the frame, epoch seconds (default: now)
+            event_type: Event broadcast alongside the status (None for no event)
+
+        Returns:
+            True if the update was queued on the ingest channel or accepted
+            over HTTP; not a backend acknowledgement of a streamed frame
+        """
+        observed_at = observed_at or time.time()
+
+        def send_http() -> bool:
+            success = self.update_parking_lot_status(
+                parking_lot_id=parking_lot_id,
+                total_spots=summary["total"],
+                empty_spots=summary["empty"],
+                occupied_spots=summary["occupied"],
+                detections=detections.to_payload(),
+                observed_at=observed_at
+            )
+            if success and event_type:
+                self.send_detection_event(parking_lot_id, event_type, summary)
+            return success
+
+        if self.ingest is not None and not self.degraded:
+            frame = {
+                "type": LOT_STATUS_FRAME,
+                "lot": parking_lot_id,
+                "total": summary["total"],
+                "empty": summary["empty"],
+                "occupied": summary["occupied"],
+                "observed_at": observed_at,
+                "event": event_type,
+                **detections.to_compact()
+            }
+            if self.ingest.send(frame, fallback=send_http):
+                logger.debug(f"Streamed parking lot {parking_lot_id}: {summary['empty']}/{summary['total']} empty")
+                return True
+        return send_http()
+
     def update_spot_status(
         self,
         spot_id: int,
@@ -124,11 +385,13 @@ class BackendClient:
                 "confidence": confidence
             }
 
-            response = self.session.put(
-                f"{self.base_url}/cv/parking-spots/{spot_id}/status",
-                json=payload,
-                timeout=10
-            )
+            url = f"{self.base_url}/cv/parking-spots/{spot_id}/status"
+            started = time.perf_counter()
+            response = None
+            try:
+                response = self.session.put(url, json=payload, timeout=10)
+            finally:
+                _observe_request(url, started, response)
 
             if response.status_code == 200:
                 logger.debug(f"Updated spot {spot_id} to {status}")
@@ -141,6 +404,186 @@ class BackendClient:
             logger.error(f"Spot update failed: {e}")
             return False
 
+    def queue_spot_status(
+        self,
+        spot_id: int,
+        status: str,
+        confidence: float = 1.0,
+        observed_at: float = None
+    ):
+        """
+        Buffer a spot change for the next bulk flush
+
+        A newer change of the same spot replaces the pending one.
+
+        Args:
+            spot_id: ID of the parking spot
+            status: "empty", "occupied", or "reserved"
+            confidence: Detection confidence (0-1)
+            observed_at: Capture time of the frame (default: now)
+        """
+        update = SpotUpdate(spot_id, status, confidence, observed_at or time.time())
+        with self._buffer_lock:
+            self._spot_buffer.pop(spot_id, None)
+            self._spot_buffer[spot_id] = update
+            if self._buffer_since is None:
+                self._buffer_since = time.monotonic()
+            full = len(self._spot_buffer) >= self.batch_size
+
+        if self._flusher is None:
+            self._start_flusher()
+        if full:
+            # The flusher sends it: a slow backend must not stall the camera thread
+            self._flush_now.set()
+
+    def _start_flusher(self):
+        with self._buffer_lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="spot-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        """Flush the buffer once it is full or its oldest change is flush_interval old"""
+        while not self._closed.is_set():
+            full = self._flush_now.wait(max(self.flush_interval / 2, 0.05))
+            if self._closed.is_set():
+                break
+            self._flush_now.clear()
+            since = self._buffer_since
+            if full or (since is not None and time.monotonic() - since >= self.flush_interval):
+                self.flush()
+
+    def flush(self) -> bool:
+        """
+        Send all buffered spot changes
+
+        Changes that could not be delivered are spooled, or without a spool go
+        back into the buffer unless a newer change for the same spot arrived
+        in the meantime.
+
+        Returns:
+            True if the buffer was delivered (or empty)
+        """
+        with self._flush_lock:
+            with self._buffer_lock:
+                updates = list(self._spot_buffer.values())
+                self._spot_buffer = {}
+                self._buffer_since = None
+            if not updates:
+                return True
+
+            if not self.degraded and self._stream_spot_statuses(updates):
+                return True
+            if not self.degraded and self.update_spot_statuses(updates):
+                return True
+
+            if self.spool is not None:
+                for update in updates:
+                    self._spool(SPOT_STATUS, update.spot_id, update.to_dict(), update.observed_at)
+                return False
+
+            with self._buffer_lock:
+                for update in updates:
+                    self._spot_buffer.setdefault(update.spot_id, update)
+                if self._buffer_since is None:
+                    self._buffer_since = time.monotonic()
+            return False
+
+    def _stream_spot_statuses(self, updates: List[SpotUpdate]) -> bool:
+        """Send a spot batch over the ingest channel; False if it has to go over HTTP"""
+        if self.ingest is None:
+            return False
+
+        def send_http():
+            if not self.update_spot_statuses(updates) and self.spool is not None:
+                for update in updates:
+                    self._spool(SPOT_STATUS, update.spot_id, update.to_dict(), update.observed_at)
+
+        frame = {
+            "type": SPOT_BATCH_FRAME,
+            "updates": [[u.spot_id, u.status, u.confidence, u.observed_at] for u in updates]
+        }
+        return self.ingest.send(frame, fallback=send_http)
+
+    def _request_with_retry(self, method: str, url: str, **kwargs) -> Optional[requests.Response]:
+        """
+        Send a request, retrying connection errors and 5xx/429 with exponential backoff
+
+        Returns:
+            The final response, or None if the backend stayed unreachable
+        """
+        started = time.perf_counter()
+        response = None
+        for attempt in range(API_RETRIES + 1):
+            if attempt:
+                # Jitter keeps many workers from retrying in lockstep
+                delay = min(API_BACKOFF * 2 ** (attempt - 1), 10.0)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+            try:
+                response = self.session.request(method, url, timeout=10, **kwargs)
+            except requests.RequestException as e:
+                logger.warning(f"{method} {url} failed (attempt {attempt + 1}): {e}")
+                response = None
+                continue
+            if response.status_code < 500 and response.status_code != 429:
+                break
+            logger.warning(f"{method} {url} returned {response.status_code} (attempt {attempt + 1})")
+        _observe_request(url, started, response)
+        return response
+
+    def update_spot_statuses(self, updates: List[SpotUpdate]) -> bool:
+        """
+        Send many spot changes in one request (one transaction, one broadcast)
+
+        Args:
+            updates: Spot changes to apply
+
+        Returns:
+            True if the batch was handled by the backend
+        """
+        if not self._bulk_supported:
+            return all([self.update_spot_status(u.spot_id, u.status, u.confidence) for u in updates])
+
+        response = self._request_with_retry(
+            "PUT",
+            f"{self.base_url}/cv/parking-spots/status",
+            json={"updates": [u.to_dict() for u in updates]}
+        )
+        if response is None or response.status_code >= 500 or response.status_code == 429:
+            logger.error(f"Spot batch of {len(updates)} not delivered")
+            return False
+
+        if response.status_code in (404, 405):
+            # Backend predates the bulk endpoint
+            logger.warning("Bulk spot endpoint unavailable, falling back to per-spot updates")
+            self._bulk_supported = False
+            return self.update_spot_statuses(updates)
+
+        if response.status_code != 200:
+            # Rejected payloads would fail again: drop instead of retrying forever
+            logger.error(f"Spot batch rejected: {response.status_code} - {response.text}")
+            return True
+
+        result = response.json()
+        if result.get("not_found"):
+            logger.warning(f"Unknown spots in batch: {result['not_found']}")
+        logger.debug(f"Updated {result.get('updated', len(updates))} spot(s) in one batch")
+        return True
+
+    def close(self):
+        """Flush pending spot changes and stop the background threads"""
+        self._closed.set()
+        self._flush_now.set()
+        for thread in (self._flusher, self._recovery):
+            if thread is not None:
+                thread.join(timeout=2)
+        self._flusher = None
+        self._recovery = None
+        self.flush()
+        if self.ingest is not None:
+            self.ingest.close()
+
     def get_parking_lots(self) -> List[Dict]:
         """Get list of all parking lots"""
         try:
@@ -184,21 +627,74 @@ class BackendClient:
         Returns:
             True if event was sent successfully
         """
-        try:
-            payload = {
-                "parking_lot_id": parking_lot_id,
-                "event_type": event_type,
-                "data": data
-            }
-
-            response = self.session.post(
-                f"{self.base_url}/cv/events",
-                json=payload,
-                timeout=10
-            )
+        payload = {
+            "parking_lot_id": parking_lot_id,
+            "event_type": event_type,
+            "data": data
+        }
+        key = f"{parking_lot_id}:{event_type}"
+        if self.degraded:
+            self._spool(EVENT, key, payload)
+            return False
 
+        url = f"{self.base_url}/cv/events"
+        started = time.perf_counter()
+        response = None
+        try:
+            response = self.session.post(url, json=payload, timeout=10)
+            _observe_request(url, started, response)
+            if response.status_code >= 500:
+                self._spool(EVENT, key, payload)
             return response.status_code in [200, 201, 202]
 
         except Exception as e:
+            if response is None:
+                _observe_request(url, started, None)
             logger.error(f"Failed to send event: {e}")
+            self._spool(EVENT, key, payload)
             return False
+
+
+class DryRunClient:
+    """
+    Stand-in for BackendClient that publishes nothing
+
+    Used for replays: historical lot and spot states are logged and counted
+    instead of overwriting the live state on the backend.
+    """
+
+    def __init__(self):
+        self.base_url = "dry-run"
+        self.spool = None
+        self.ingest = None
+        self.degraded = False
+        self.lot_updates = 0
+        self.spot_updates = 0
+
+    def publish_lot_status(
+        self,
+        parking_lot_id: int,
+        detections,
+        summary: Dict[str, Any],
+        observed_at: float = None,
+        event_type: str = "status_update"
+    ) -> bool:
+        self.lot_updates += 1
+        logger.info(f"[dry run] Parking lot {parking_lot_id}: {summary['empty']}/{summary['total']} empty")
+        return True
+
+    def queue_spot_status(self, spot_id: int, status: str, confidence: float = 1.0, observed_at: float = None):
+        self.spot_updates += 1
+        logger.debug(f"[dry run] Spot {spot_id}: {status} ({confidence:.2f})")
+
+    def flush(self) -> bool:
+        return True
+
+    def close(self):
+        logger.info(f"[dry run] {self.lot_updates} lot and {self.spot_updates} spot update(s) not published")
+
+    def get_parking_lots(self) -> List[Dict]:
+        return []
+
+    def get_cameras(self, parking_lot_id: int = None) -> List[Dict]:
+        return []
@@ -0,0 +1,383 @@
+"""
+Inference backends for the parking detector
+Remote Roboflow API or a local ONNX Runtime session on the CPU
+"""
+import base64
+import logging
+import threading
+from typing import List, Dict, Any, Union
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    ROBOFLOW_API_KEY,
+    ROBOFLOW_API_URL,
+    ROBOFLOW_PROJECT,
+    ROBOFLOW_CONFIDENCE,
+    CONFIDENCE_THRESHOLD,
+    ONNX_MODEL_PATH,
+    ONNX_INPUT_SIZE,
+    ONNX_NUM_THREADS,
+    ONNX_CLASS_NAMES,
+    ONNX_IOU_THRESHOLD
+)
+from encoding import FrameEncoder
+
+logger = logging.getLogger(__name__)
+
+# An image reference: file path or BGR numpy array (OpenCV format)
+ImageInput = Union[str, np.ndarray]
+
+
+class InferenceBackend:
+    """
+    Base class for inference engines used by ParkingDetector
+
+    Backends return raw predictions in the Roboflow response format
+    ({"x", "y", "width", "height", "confidence", "class"}, center based,
+    in original image pixels) so the detector can stay engine agnostic.
+    """
+
+    name = "base"
+    # prepare() serializes the frame, so the caller may reuse the array right after
+    encodes_frames = False
+
+    def __init__(self, model_id: str):
+        self.model_id = model_id
+
+    @property
+    def cache_namespace(self) -> str:
+        """Identity of the model output, used to key cached predictions"""
+        return f"{self.name}:{self.model_id}"
+
+    def infer(self, image: ImageInput) -> List[Dict[str, Any]]:
+        """
+        Run inference on a single image
+
+        Args:
+            image: Path to an image file or a BGR numpy array
+
+        Returns:
+            List of raw prediction dictionaries
+        """
+        raise NotImplementedError
+
+    def prepare(self, frame: np.ndarray, quality: int = None) -> Any:
+        """
+        CPU-side preparation of a frame (resize, encode) for infer_prepared
+
+        Split from inference so a pipeline can run it as its own stage.
+
+        Args:
+            frame: numpy array (BGR format from OpenCV)
+            quality: JPEG quality for backends that encode frames (default: their own)
+        """
+        return frame
+
+    def payload_bytes(self, payload: Any) -> int:
+        """Size of a prepared payload as handed to the engine"""
+        return int(getattr(payload, "nbytes", 0))
+
+    def prepare_path(self, image_path: str) -> Any:
+        """Payload for infer_prepared from an image file"""
+        return image_path
+
+    def infer_prepared(self, payload: Any, timeout: float = None) -> List[Dict[str, Any]]:
+        """
+        Run inference on a payload returned by prepare() or prepare_path()
+
+        Args:
+            payload: Prepared payload
+            timeout: Seconds a remote call may take (local backends ignore it)
+        """
+        return self.infer(payload)
+
+    def close(self):
+        """Release resources held by the backend"""
+
+
+class RoboflowBackend(InferenceBackend):
+    """
+    Remote inference through the Roboflow hosted API
+
+    With pool_size set, requests go over a pooled keep-alive session instead
+    of the SDK (which opens a new connection per call), for batch workloads.
+    """
+
+    name = "roboflow"
+    encodes_frames = True
+
+    def __init__(
+        self,
+        api_key: str = None,
+        api_url: str = None,
+        model_id: str = None,
+        encoder: FrameEncoder = None,
+        pool_size: int = None,
+        confidence: float = None
+    ):
+        from inference_sdk import InferenceConfiguration, InferenceHTTPClient
+
+        super().__init__(model_id or ROBOFLOW_PROJECT)
+        self.api_key = api_key or ROBOFLOW_API_KEY
+        self.api_url = (api_url or ROBOFLOW_API_URL).rstrip("/")
+        # Sent with every request rather than left to the server's default, so cached results have a known floor
+        self.confidence = ROBOFLOW_CONFIDENCE if confidence is None else confidence
+        self.client = InferenceHTTPClient(api_url=self.api_url, api_key=self.api_key)
+        self.client.configure(InferenceConfiguration(confidence_threshold=self.confidence))
+        self.encoder = encoder or FrameEncoder()
+
+        self.session = None
+        if pool_size:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+
+    @property
+    def cache_namespace(self) -> str:
+        # The SDK and the REST endpoint may answer differently; scores below the confidence are dropped server-side
+        endpoint = "sdk" if self.session is None else "rest"
+        return f"{self.name}:{endpoint}:{self.api_url}:{self.model_id}:{self.confidence}"
+
+    def _infer_base64(self, image: str, timeout: float = None) -> List[Dict[str, Any]]:
+        """Infer a base64 image (or a path through the SDK when no session is pooled)"""
+        if self.session is None:
+            return self.client.infer(image, model_id=self.model_id).get("predictions", [])
+
+        response = self.session.post(
+            f"{self.api_url}/{self.model_id}",
+            params={"api_key": self.api_key, "confidence": round(self.confidence * 100)},
+            data=image,
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            timeout=timeout or 30
+        )
+        response.raise_for_status()
+        return response.json().get("predictions", [])
+
+    def infer(self, image: ImageInput) -> List[Dict[str, Any]]:
+        if isinstance(image, np.ndarray):
+            return self.infer_prepared(self.prepare(image))
+
+        if self.session is not None:
+            with open(image, "rb") as f:
+                image = base64.b64encode(f.read()).decode("ascii")
+        return self._infer_base64(image)
+
+    def prepare(self, frame: np.ndarray, quality: int = None):
+        """Encode a frame in memory: (base64 JPEG, scale factor)"""
+        return self.encoder.encode_base64(frame, quality)
+
+    def payload_bytes(self, payload) -> int:
+        """Request body size of an encoded frame"""
+        return len(payload[0])
+
+    def prepare_path(self, image_path: str):
+        """Base64 of the file as is (the SDK takes the path when no session is pooled)"""
+        if self.session is None:
+            return image_path, 1.0
+        with open(image_path, "rb") as f:
+            return base64.b64encode(f.read()).decode("ascii"), 1.0
+
+    def infer_prepared(self, payload, timeout: float = None) -> List[Dict[str, Any]]:
+        """Infer an encoded frame and map predictions back to frame pixels"""
+        payload, scale = payload
+        predictions = self._infer_base64(payload, timeout)
+
+        if scale != 1.0:
+            for pred in predictions:
+                pred["x"] /= scale
+                pred["y"] /= scale
+                pred["width"] /= scale
+                pred["height"] /= scale
+        return predictions
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+# Warm ONNX sessions shared by every backend instance in the process
+_session_cache: Dict[tuple, Any] = {}
+_session_lock = threading.Lock()
+
+
+def _get_onnx_session(model_path: str, num_threads: int):
+    """Create (once) and return a warm ONNX Runtime session"""
+    import onnxruntime as ort
+
+    key = (model_path, num_threads)
+    with _session_lock:
+        session = _session_cache.get(key)
+        if session is None:
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+
+            session = ort.InferenceSession(
+                model_path,
+                sess_options=options,
+                providers=["CPUExecutionProvider"]
+            )
+            _session_cache[key] = session
+            logger.info(f"Loaded ONNX model {model_path} ({num_threads or 'auto'} threads)")
+        return session
+
+
+class OnnxBackend(InferenceBackend):
+    """
+    Local CPU inference with an exported YOLOv8 model on ONNX Runtime
+    """
+
+    name = "onnx"
+
+    def __init__(
+        self,
+        model_path: str = None,
+        input_size: int = None,
+        num_threads: int = None,
+        class_names: List[str] = None,
+        iou_threshold: float = None,
+        confidence: float = None
+    ):
+        """
+        Initialize the ONNX backend
+
+        Args:
+            model_path: Path to the exported .onnx model
+            input_size: Square model input size in pixels
+            num_threads: Intra-op thread count (0 lets ONNX Runtime decide)
+            class_names: Class names indexed by class id
+            iou_threshold: IoU threshold for non-maximum suppression
+            confidence: Minimum score kept before NMS (default: CONFIDENCE_THRESHOLD)
+        """
+        self.model_path = model_path or ONNX_MODEL_PATH
+        super().__init__(self.model_path)
+        self.input_size = input_size or ONNX_INPUT_SIZE
+        self.num_threads = ONNX_NUM_THREADS if num_threads is None else num_threads
+        self.class_names = class_names or ONNX_CLASS_NAMES
+        self.iou_threshold = iou_threshold or ONNX_IOU_THRESHOLD
+        self.confidence = CONFIDENCE_THRESHOLD if confidence is None else confidence
+
+        self.session = _get_onnx_session(self.model_path, self.num_threads)
+        self.input_name = self.session.get_inputs()[0].name
+
+        # Letterbox canvas and input tensor reused for every frame (per worker thread;
+        # the session itself is safe to run concurrently)
+        self._local = threading.local()
+
+        # Warm-up run so the first real frame does not pay graph initialization
+        canvas, _ = self._buffers()
+        self.session.run(None, {self.input_name: self._to_tensor(canvas)})
+
+    @property
+    def cache_namespace(self) -> str:
+        # Scores below the confidence and NMS-suppressed boxes never leave the backend
+        return f"{self.name}:{self.model_id}:{self.input_size}:{self.confidence}:{self.iou_threshold}"
+
+    def _buffers(self):
+        """Per-thread letterbox canvas and input tensor"""
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = (
+                np.full((self.input_size, self.input_size, 3), 114, dtype=np.uint8),
+                np.empty((1, 3, self.input_size, self.input_size), dtype=np.float32)
+            )
+            self._local.buffers = buffers
+        return buffers
+
+    def _to_tensor(self, canvas: np.ndarray) -> np.ndarray:
+        """Canvas BGR HWC uint8 -> reused RGB NCHW float32 tensor in [0, 1]"""
+        _, tensor = self._buffers()
+        np.multiply(canvas[:, :, ::-1].transpose(2, 0, 1), 1.0 / 255.0, out=tensor[0])
+        return tensor
+
+    def _letterbox(self, image: np.ndarray, canvas: np.ndarray):
+        """Resize into the reused square canvas keeping the aspect ratio"""
+        import cv2
+
+        height, width = image.shape[:2]
+        scale = min(self.input_size / width, self.input_size / height)
+        new_w, new_h = int(round(width * scale)), int(round(height * scale))
+        pad_x = (self.input_size - new_w) // 2
+        pad_y = (self.input_size - new_h) // 2
+
+        canvas.fill(114)
+        canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(
+            image, (new_w, new_h), interpolation=cv2.INTER_LINEAR
+        )
+        return scale, pad_x, pad_y
+
+    def infer(self, image: ImageInput) -> List[Dict[str, Any]]:
+        import cv2
+
+        if isinstance(image, str):
+            frame = cv2.imread(image)
+            if frame is None:
+                raise ValueError(f"Could not read image: {image}")
+        else:
+            frame = image
+
+        canvas, _ = self._buffers()
+        scale, pad_x, pad_y = self._letterbox(frame, canvas)
+        output = self.session.run(None, {self.input_name: self._to_tensor(canvas)})[0]
+
+        # YOLOv8 output: (1, 4 + num_classes, num_anchors)
+        preds = output[0].T
+        scores = preds[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+
+        keep = confidences >= self.confidence
+        if not keep.any():
+            return []
+        boxes, confidences, class_ids = preds[keep, :4], confidences[keep], class_ids[keep]
+
+        # Undo letterbox: model space -> original image pixels
+        boxes[:, 0] = (boxes[:, 0] - pad_x) / scale
+        boxes[:, 1] = (boxes[:, 1] - pad_y) / scale
+        boxes[:, 2:] /= scale
+
+        xywh = np.column_stack((boxes[:, 0] - boxes[:, 2] / 2, boxes[:, 1] - boxes[:, 3] / 2, boxes[:, 2:]))
+        indices = cv2.dnn.NMSBoxes(xywh.tolist(), confidences.tolist(), self.confidence, self.iou_threshold)
+
+        predictions = []
+        for i in np.asarray(indices).reshape(-1):
+            class_id = int(class_ids[i])
+            predictions.append({
+                "x": float(boxes[i, 0]),
+                "y": float(boxes[i, 1]),
+                "width": float(boxes[i, 2]),
+                "height": float(boxes[i, 3]),
+                "confidence": float(confidences[i]),
+                "class": self.class_names[class_id] if class_id < len(self.class_names) else str(class_id),
+                "class_id": class_id
+            })
+        return predictions
+
+
+BACKENDS = {
+    RoboflowBackend.name: RoboflowBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def create_backend(name: str, **kwargs) -> InferenceBackend:
+    """
+    Create an inference backend by name
+
+    Args:
+        name: "roboflow" or "onnx"
+        **kwargs: Backend specific options
+
+    Returns:
+        InferenceBackend instance
+    """
+    backend_cls = BACKENDS.get(name.lower())
+    if backend_cls is None:
+        raise ValueError(f"Unknown inference backend: {name}. Must be one of: {', '.join(BACKENDS)}")
+    return backend_cls(**kwargs)
@@ -0,0 +1,215 @@
+"""
+ParkVision Batch Processor
+Runs detection over a directory or glob of archived images on a worker pool
+"""
+import os
+import glob
+import json
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from config import (
+    INFERENCE_BACKEND,
+    BATCH_WORKERS,
+    BATCH_POOL,
+    BATCH_REPORT_EVERY
+)
+from backends import RoboflowBackend, create_backend
+from detector import ParkingDetector
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Per-process detector for process pools (built by _init_worker)
+_worker_detector: Optional[ParkingDetector] = None
+
+
+def find_images(source: str) -> List[str]:
+    """Resolve a directory, glob pattern or single file to image paths"""
+    path = Path(source)
+    if path.is_dir():
+        return sorted(str(p) for p in path.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    return sorted(glob.glob(source, recursive=True))
+
+
+def create_batch_detector(pool_size: int) -> ParkingDetector:
+    """Detector whose backend keeps pool_size connections alive"""
+    if INFERENCE_BACKEND.lower() == RoboflowBackend.name:
+        return ParkingDetector(backend=RoboflowBackend(pool_size=pool_size))
+    return ParkingDetector(backend=create_backend(INFERENCE_BACKEND))
+
+
+def _init_worker():
+    global _worker_detector
+    _worker_detector = create_batch_detector(pool_size=1)
+
+
+def _detect_image(detector: Optional[ParkingDetector], image_path: str) -> Dict[str, Any]:
+    """Worker task: one result record for one image"""
+    detector = detector or _worker_detector
+    started = time.perf_counter()
+    try:
+        detections = detector.detect(image_path, raise_errors=True)
+    except Exception as e:
+        return {"path": image_path, "error": str(e)}
+    return {
+        "path": image_path,
+        "summary": detections.summary(),
+        "detections": detections.to_payload(),
+        "elapsed_ms": (time.perf_counter() - started) * 1000
+    }
+
+
+class BatchProcessor:
+    """
+    Parallel, resumable detection over an image archive
+
+    Each result is appended to a JSONL file as soon as it completes; a
+    manifest next to it records progress. On restart, images that already
+    have a successful result line are skipped, failed ones are retried.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        workers: int = None,
+        pool: str = None,
+        window: int = None
+    ):
+        """
+        Initialize the batch processor
+
+        Args:
+            output_path: JSONL results file (manifest is written as <output>.manifest.json)
+            workers: Number of pool workers
+            pool: "thread" (one shared detector) or "process" (one detector per process)
+            window: Maximum images in flight (default: 4 per worker)
+        """
+        self.output_path = output_path
+        self.manifest_path = f"{output_path}.manifest.json"
+        self.workers = workers or BATCH_WORKERS
+        self.pool = (pool or BATCH_POOL).lower()
+        self.window = window or self.workers * 4
+        if self.pool not in ("thread", "process"):
+            raise ValueError(f"Unknown pool type: {self.pool}. Must be 'thread' or 'process'")
+
+        self.processed = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def completed_paths(self) -> Set[str]:
+        """Images with a successful result line in the output file"""
+        done = set()
+        if not os.path.exists(self.output_path):
+            return done
+        with open(self.output_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Last line of an interrupted run may be truncated
+                    continue
+                if "error" not in record:
+                    done.add(record["path"])
+        return done
+
+    def _write_manifest(self, source: str, total: int, started: float, finished: bool = False):
+        elapsed = time.monotonic() - started
+        manifest = {
+            "source": source,
+            "output": self.output_path,
+            "total": total,
+            "completed": self.skipped + self.processed,
+            "processed": self.processed,
+            "failed": self.failed,
+            "images_per_sec": self.processed / elapsed if elapsed > 0 else 0.0,
+            "finished": finished,
+            "updated_at": time.time()
+        }
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def run(self, source: str) -> Dict[str, Any]:
+        """
+        Process every image in source not completed by a previous run
+
+        Args:
+            source: Directory, glob pattern or single file
+
+        Returns:
+            Final manifest contents
+        """
+        paths = find_images(source)
+        done = self.completed_paths()
+        pending = [p for p in paths if p not in done]
+        self.skipped = len(paths) - len(pending)
+        logger.info(f"Batch: {len(paths)} images, {self.skipped} already done, {len(pending)} to process "
+                    f"on {self.workers} {self.pool} workers")
+
+        if self.pool == "process":
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+            detector = None
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch")
+            detector = create_batch_detector(pool_size=self.workers)
+
+        started = time.monotonic()
+        queue = iter(pending)
+        in_flight = set()
+
+        with open(self.output_path, "a+") as out:
+            # Never append to a line truncated by an interrupted run
+            if out.tell() > 0:
+                out.seek(out.tell() - 1)
+                if out.read(1) != "\n":
+                    out.write("\n")
+
+            try:
+                while True:
+                    # Bounded window: tens of thousands of images are never queued at once
+                    for path in queue:
+                        in_flight.add(executor.submit(_detect_image, detector, path))
+                        if len(in_flight) >= self.window:
+                            break
+                    if not in_flight:
+                        break
+
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        record = future.result()
+                        out.write(json.dumps(record) + "\n")
+                        if "error" in record:
+                            self.failed += 1
+                            logger.warning(f"Failed {record['path']}: {record['error']}")
+                        else:
+                            self.processed += 1
+                    out.flush()
+
+                    count = self.processed + self.failed
+                    if count and count % BATCH_REPORT_EVERY < len(finished):
+                        elapsed = time.monotonic() - started
+                        logger.info(f"Batch progress: {count}/{len(pending)}, "
+                                    f"{self.processed / elapsed:.1f} images/sec, {self.failed} failed")
+                        self._write_manifest(source, len(paths), started)
+
+            except KeyboardInterrupt:
+                logger.info("Batch interrupted; rerun with the same output to resume")
+                for future in in_flight:
+                    future.cancel()
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+                if detector is not None:
+                    detector.backend.close()
+
+        self._write_manifest(source, len(paths), started, finished=self.skipped + self.processed == len(paths))
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        logger.info(f"Batch finished: {self.processed} processed, {self.failed} failed, "
+                    f"{manifest['images_per_sec']:.1f} images/sec")
+        return manifest
@@ -0,0 +1,146 @@
+"""
+ParkVision Inference Backend Benchmark
+Compares per-frame latency and throughput of the inference backends
+
+Usage:
+    python benchmark.py --images ../parkresim --backends roboflow onnx --iterations 20
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+from typing import List, Dict
+
+import cv2
+import numpy as np
+
+from config import LOG_LEVEL
+from backends import create_backend
+from detector import ParkingDetector
+from batch import find_images
+
+logging.basicConfig(
+    level=getattr(logging, LOG_LEVEL),
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, float]:
+    """Latency statistics in milliseconds plus throughput in frames/sec"""
+    values = np.asarray(latencies) * 1000.0
+    total = float(np.sum(latencies))
+    return {
+        "frames": len(latencies),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "max_ms": float(values.max()),
+        "fps": len(latencies) / total if total > 0 else 0.0
+    }
+
+
+def benchmark_backend(name: str, image_paths: List[str], iterations: int, warmup: int) -> Dict[str, Dict]:
+    """
+    Measure a single backend on file paths and on decoded frames
+
+    Args:
+        name: Backend name ("roboflow" or "onnx")
+        image_paths: Images to run
+        iterations: Measured passes over the image set
+        warmup: Unmeasured passes before timing
+
+    Returns:
+        Statistics for detect() and detect_from_frame()
+    """
+    backend = create_backend(name)
+    detector = ParkingDetector(backend=backend)
+    frames = [cv2.imread(p) for p in image_paths]
+
+    results = {}
+    for mode, inputs, run in (
+        ("detect", image_paths, detector.detect),
+        ("detect_from_frame", frames, detector.detect_from_frame),
+    ):
+        for _ in range(warmup):
+            for item in inputs:
+                run(item)
+
+        latencies = []
+        for _ in range(iterations):
+            for item in inputs:
+                start = time.perf_counter()
+                run(item)
+                latencies.append(time.perf_counter() - start)
+
+        results[mode] = summarize_latencies(latencies)
+
+    backend.close()
+    return results
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="ParkVision inference backend benchmark")
+    parser.add_argument(
+        "--images", "-i",
+        type=str,
+        default="../parkresim",
+        help="Image directory, glob pattern or file"
+    )
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=["roboflow", "onnx"],
+        help="Backends to compare"
+    )
+    parser.add_argument(
+        "--iterations", "-n",
+        type=int,
+        default=10,
+        help="Measured passes over the image set"
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=1,
+        help="Unmeasured warm-up passes"
+    )
+    parser.add_argument(
+        "--json",
+        type=str,
+        help="Write results as JSON to this path"
+    )
+
+    args = parser.parse_args()
+
+    image_paths = find_images(args.images)
+    if not image_paths:
+        logger.error(f"No images found at: {args.images}")
+        sys.exit(1)
+
+    report = {"images": len(image_paths), "iterations": args.iterations, "backends": {}}
+    for name in args.backends:
+        logger.info(f"Benchmarking {name} backend on {len(image_paths)} images...")
+        try:
+            report["backends"][name] = benchmark_backend(name, image_paths, args.iterations, args.warmup)
+        except Exception as e:
+            logger.error(f"Backend {name} failed: {e}")
+
+    print(f"\n{'backend':<10} {'mode':<18} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'fps':>8}")
+    for name, modes in report["backends"].items():
+        for mode, stats in modes.items():
+            print(
+                f"{name:<10} {mode:<18} {stats['mean_ms']:>9.1f} {stats['p50_ms']:>9.1f} "
+                f"{stats['p95_ms']:>9.1f} {stats['max_ms']:>9.1f} {stats['fps']:>8.2f}"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Saved results to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
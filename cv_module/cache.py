@@ -0,0 +1,143 @@
+"""
+Content-addressed inference result cache
+Raw predictions stored in SQLite, keyed by image bytes and model identity
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from config import INFERENCE_CACHE_PATH, INFERENCE_CACHE_MAX_MB
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceCache:
+    """
+    On-disk LRU cache of raw inference predictions
+
+    Keys are SHA-256 of the image bytes combined with a backend namespace
+    (model, endpoint and the backend's own confidence floor), so the same
+    image is only inferred once per model. Predictions are stored as the
+    backend returned them, before CONFIDENCE_THRESHOLD: raising it is
+    served from the cache, lowering it below the backend's floor is not.
+    When the stored payload exceeds max_bytes, least recently used entries
+    are evicted.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = None):
+        """
+        Initialize the cache
+
+        Args:
+            path: SQLite database file (default: INFERENCE_CACHE_PATH)
+            max_bytes: Payload size bound (default: INFERENCE_CACHE_MAX_MB)
+        """
+        self.path = path or INFERENCE_CACHE_PATH
+        self.max_bytes = max_bytes or INFERENCE_CACHE_MAX_MB * 1024 * 1024
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            "key TEXT PRIMARY KEY, namespace TEXT, payload TEXT, size INTEGER, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_access ON predictions (last_access)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM predictions").fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(image_bytes: bytes, namespace: str) -> str:
+        """Content hash of the image combined with the backend namespace"""
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        return hashlib.sha256(f"{namespace}|{digest}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Return cached predictions or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM predictions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE predictions SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, namespace: str, predictions: List[Dict[str, Any]]):
+        """Store predictions, evicting least recently used entries if over budget"""
+        payload = json.dumps(predictions, separators=(",", ":"))
+        size = len(payload)
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM predictions WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO predictions (key, namespace, payload, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, namespace, payload, size, time.time())
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop oldest entries until the cache is back under 90% of its budget"""
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT key, size FROM predictions ORDER BY last_access ASC").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            doomed.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM predictions WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def get_or_infer(
+        self,
+        image_bytes: bytes,
+        namespace: str,
+        infer: Callable[[], List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Serve predictions from the cache or run inference and store them
+
+        Args:
+            image_bytes: Encoded image content
+            namespace: Backend namespace (model, endpoint and confidence floor)
+            infer: Callable running the actual inference
+
+        Returns:
+            Raw predictions
+        """
+        key = self.make_key(image_bytes, namespace)
+        predictions = self.get(key)
+        if predictions is None:
+            predictions = infer()
+            self.put(key, namespace, predictions)
+        return predictions
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and stored size"""
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": self._total_bytes
+        }
+
+    def close(self):
+        self._conn.close()
@@ -7,17 +7,167 @@ import os
 # API key'den workspace otomatik çekilir, sadece proje ve model ID gerekli
 ROBOFLOW_API_KEY = os.getenv("ROBOFLOW_API_KEY", "0Zmk2YMfrmOASiUGMQSG")
 ROBOFLOW_PROJECT = "car-parking-xutja/1"  # project_id/version formatında
+ROBOFLOW_API_URL = os.getenv("ROBOFLOW_API_URL", "https://detect.roboflow.com")
+ROBOFLOW_CONFIDENCE = float(os.getenv("ROBOFLOW_CONFIDENCE", "0.4"))  # server-side minimum score, Roboflow's default
 CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", "0.5"))  # 50%
 
+# Inference Backend: "roboflow" (remote API) or "onnx" (local CPU)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "roboflow")
+
+# Local ONNX Runtime backend - exported car-parking model
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", "models/car-parking-xutja-1.onnx")
+ONNX_INPUT_SIZE = int(os.getenv("ONNX_INPUT_SIZE", "640"))  # model input, pixels
+ONNX_NUM_THREADS = int(os.getenv("ONNX_NUM_THREADS", "0"))  # 0 = ONNX Runtime default
+ONNX_CLASS_NAMES = os.getenv("ONNX_CLASS_NAMES", "space-empty,space-occupied").split(",")
+ONNX_IOU_THRESHOLD = float(os.getenv("ONNX_IOU_THRESHOLD", "0.45"))
+
+# In-memory frame encoding for remote inference
+FRAME_JPEG_QUALITY = int(os.getenv("FRAME_JPEG_QUALITY", "85"))  # 1-100
+FRAME_MAX_DIMENSION = int(os.getenv("FRAME_MAX_DIMENSION", "1280"))  # longest side, 0 = no resize
+
+# Tiled inference for high-resolution frames (per-camera override in the camera list)
+TILE_SIZE = int(os.getenv("TILE_SIZE", "0"))  # tile side in pixels, 0 = no tiling
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))  # fraction of a tile shared with each neighbour
+TILE_WORKERS = int(os.getenv("TILE_WORKERS", "0"))  # concurrent tile inferences, 0 = CPU count
+TILE_NMS_IOU = float(os.getenv("TILE_NMS_IOU", "0.5"))  # cross-tile duplicate suppression
+
+# Upload-size reduction before inference: crop to the spot ROIs, blank the rest, resize, adapt JPEG quality
+PREPROCESS_ENABLED = os.getenv("PREPROCESS_ENABLED", "true").lower() == "true"  # calibrated cameras only
+PREPROCESS_INPUT_SIZE = int(os.getenv("PREPROCESS_INPUT_SIZE", "640"))  # model input side in pixels, 0 = no resize
+PREPROCESS_MASK = os.getenv("PREPROCESS_MASK", "true").lower() == "true"  # blank pixels outside the spot ROIs
+PREPROCESS_MARGIN = float(os.getenv("PREPROCESS_MARGIN", "0.5"))  # ROI growth, fraction of the median spot size
+PREPROCESS_TARGET_KB = float(os.getenv("PREPROCESS_TARGET_KB", "40"))  # JPEG size aimed for, 0 = fixed FRAME_JPEG_QUALITY
+PREPROCESS_MIN_QUALITY = int(os.getenv("PREPROCESS_MIN_QUALITY", "50"))  # adaptive JPEG quality bounds
+PREPROCESS_MAX_QUALITY = int(os.getenv("PREPROCESS_MAX_QUALITY", "90"))
+
+# Remote inference dispatcher (concurrent calls over pooled keep-alive connections, within the plan quota)
+DISPATCH_ENABLED = os.getenv("DISPATCH_ENABLED", "true").lower() == "true"  # remote backends only
+DISPATCH_CONCURRENCY = int(os.getenv("DISPATCH_CONCURRENCY", "8"))  # calls in flight = pooled connections
+DISPATCH_RATE = float(os.getenv("DISPATCH_RATE", "0"))  # calls/sec allowed by the plan quota, 0 = unlimited
+DISPATCH_BURST = int(os.getenv("DISPATCH_BURST", "0"))  # token bucket capacity, 0 = one second of DISPATCH_RATE
+DISPATCH_DEADLINE = float(os.getenv("DISPATCH_DEADLINE", "10.0"))  # seconds per call, queueing and hedges included
+DISPATCH_HEDGE = os.getenv("DISPATCH_HEDGE", "false").lower() == "true"  # duplicate slow calls, retry failed ones
+DISPATCH_HEDGE_DELAY = float(os.getenv("DISPATCH_HEDGE_DELAY", "0"))  # seconds before hedging, 0 = recent p95 latency
+
+# On-disk inference cache (raw predictions keyed by image hash + model)
+INFERENCE_CACHE_ENABLED = os.getenv("INFERENCE_CACHE_ENABLED", "true").lower() == "true"
+INFERENCE_CACHE_PATH = os.getenv(
+    "INFERENCE_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "parkvision", "inference.sqlite")
+)
+INFERENCE_CACHE_MAX_MB = int(os.getenv("INFERENCE_CACHE_MAX_MB", "256"))  # LRU eviction above this size
+
 # Backend API Configuration
 BACKEND_API_URL = os.getenv("BACKEND_API_URL", "http://backend:8000")
 BACKEND_API_KEY = os.getenv("BACKEND_API_KEY", "")  # Optional internal API key
+API_RETRIES = int(os.getenv("API_RETRIES", "3"))  # retries on connection errors / 5xx
+API_BACKOFF = float(os.getenv("API_BACKOFF", "0.5"))  # seconds, doubled per retry
+
+# Spot changes are sent in bulk: flushed at this many spots or after this delay
+SPOT_BATCH_SIZE = int(os.getenv("SPOT_BATCH_SIZE", "100"))
+SPOT_BATCH_INTERVAL = float(os.getenv("SPOT_BATCH_INTERVAL", "1.0"))  # seconds
+
+# Durable spool for updates the backend could not take (replayed when it is healthy again)
+SPOOL_ENABLED = os.getenv("SPOOL_ENABLED", "true").lower() == "true"
+SPOOL_PATH = os.getenv(
+    "SPOOL_PATH", os.path.join(os.path.expanduser("~"), ".cache", "parkvision", "spool.sqlite")
+)
+SPOOL_MAX_MB = int(os.getenv("SPOOL_MAX_MB", "64"))  # oldest updates dropped above this size
+SPOOL_RETRY_INTERVAL = float(os.getenv("SPOOL_RETRY_INTERVAL", "5.0"))  # seconds between health checks
+SPOOL_REPLAY_BATCH = int(os.getenv("SPOOL_REPLAY_BATCH", "200"))  # compacted updates per replay step
+SPOOL_REPLAY_RATE = float(os.getenv("SPOOL_REPLAY_RATE", "5.0"))  # replay steps per second
+SPOOL_REPLAY_JITTER = float(os.getenv("SPOOL_REPLAY_JITTER", "3.0"))  # random delay before replaying, seconds
+
+# Streaming ingest channel (one WebSocket instead of per-update HTTP requests)
+INGEST_ENABLED = os.getenv("INGEST_ENABLED", "true").lower() == "true"  # falls back to HTTP when unavailable
+INGEST_WINDOW = int(os.getenv("INGEST_WINDOW", "64"))  # unacknowledged frames in flight
+INGEST_ACK_TIMEOUT = float(os.getenv("INGEST_ACK_TIMEOUT", "5.0"))  # seconds before a stalled channel is dropped
+INGEST_RECONNECT_INTERVAL = float(os.getenv("INGEST_RECONNECT_INTERVAL", "30.0"))  # seconds between connection attempts
 
 # Processing Configuration
 PROCESSING_INTERVAL = float(os.getenv("PROCESSING_INTERVAL", "2.0"))  # seconds
 
+# Fleet mode (many cameras in one process)
+CAMERAS_CONFIG = os.getenv("CAMERAS_CONFIG", "")  # JSON camera list, empty = fetch from backend
+FLEET_WORKERS = int(os.getenv("FLEET_WORKERS", "4"))  # shared inference worker pool size
+FLEET_REPORT_INTERVAL = float(os.getenv("FLEET_REPORT_INTERVAL", "30.0"))  # seconds
+
+# Multi-process fleet: capture processes decode into shared-memory frame rings read by processing shards
+SHARD_PROCESSES = int(os.getenv("SHARD_PROCESSES", "0"))  # processing shards, 0 = single-process fleet
+SHARD_CAPTURE_PROCESSES = int(os.getenv("SHARD_CAPTURE_PROCESSES", "0"))  # decoding processes, 0 = one per shard
+SHARD_MAX_FRAME = os.getenv("SHARD_MAX_FRAME", "1920x1080")  # slot size of unprobed cameras, grown for larger frames
+SHARD_HEARTBEAT_TIMEOUT = float(os.getenv("SHARD_HEARTBEAT_TIMEOUT", "30.0"))  # silent worker restarted, seconds
+SHARD_RESTART_BACKOFF = float(os.getenv("SHARD_RESTART_BACKOFF", "60.0"))  # longest wait before a restart, seconds
+
+# Adaptive fleet scheduling (per-camera intervals within a global budget)
+SCHEDULER_ADAPTIVE = os.getenv("SCHEDULER_ADAPTIVE", "true").lower() == "true"  # false = fixed PROCESSING_INTERVAL
+SCHEDULER_BUDGET = float(os.getenv("SCHEDULER_BUDGET", "0"))  # inferences/sec across all cameras, 0 = unlimited
+SCHEDULER_MIN_INTERVAL = float(os.getenv("SCHEDULER_MIN_INTERVAL", "1.0"))  # busiest camera, seconds
+SCHEDULER_MAX_INTERVAL = float(os.getenv("SCHEDULER_MAX_INTERVAL", "30.0"))  # idle camera, seconds
+SCHEDULER_ACTIVITY_ALPHA = float(os.getenv("SCHEDULER_ACTIVITY_ALPHA", "0.3"))  # weight of the newest run
+SCHEDULER_PROFILE = os.getenv("SCHEDULER_PROFILE", "")  # hour multipliers, e.g. "0-5:0.25,7-9:1.5,17-19:1.5"
+SCHEDULER_LOT_REFRESH = float(os.getenv("SCHEDULER_LOT_REFRESH", "300.0"))  # seconds between is_active checks
+
+# Batch mode (archived images on a worker pool)
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "8"))  # pool size (threads or processes)
+BATCH_POOL = os.getenv("BATCH_POOL", "thread")  # "thread" or "process"
+BATCH_OUTPUT = os.getenv("BATCH_OUTPUT", "batch_results.jsonl")  # JSONL results, manifest alongside
+BATCH_REPORT_EVERY = int(os.getenv("BATCH_REPORT_EVERY", "100"))  # images between progress logs
+
+# Frame-change gating (skip inference on static scenes)
+GATE_ENABLED = os.getenv("GATE_ENABLED", "true").lower() == "true"
+GATE_CHANGE_THRESHOLD = float(os.getenv("GATE_CHANGE_THRESHOLD", "0.01"))  # fraction of changed pixels
+GATE_PIXEL_DELTA = int(os.getenv("GATE_PIXEL_DELTA", "25"))  # grayscale difference counted as change
+GATE_REFRESH_INTERVAL = float(os.getenv("GATE_REFRESH_INTERVAL", "60.0"))  # seconds, forced inference
+GATE_WIDTH = int(os.getenv("GATE_WIDTH", "160"))  # thumbnail width, pixels
+
+# Spot calibration (per-camera spot ROIs, matched to detections)
+SPOT_CALIBRATION_DIR = os.getenv("SPOT_CALIBRATION_DIR", "calibration")  # camera_<id>.json files
+SPOT_MIN_IOU = float(os.getenv("SPOT_MIN_IOU", "0.1"))  # detection/spot overlap needed for a match
+
+# Spot status smoothing: "ema" (score + hysteresis) or "vote" (N-of-M)
+SPOT_SMOOTHING = os.getenv("SPOT_SMOOTHING", "ema")
+SPOT_EMA_ALPHA = float(os.getenv("SPOT_EMA_ALPHA", "0.5"))  # weight of the newest observation
+SPOT_OCCUPIED_THRESHOLD = float(os.getenv("SPOT_OCCUPIED_THRESHOLD", "0.65"))  # commit occupied at/above
+SPOT_EMPTY_THRESHOLD = float(os.getenv("SPOT_EMPTY_THRESHOLD", "0.35"))  # commit empty at/below
+SPOT_VOTE_WINDOW = int(os.getenv("SPOT_VOTE_WINDOW", "3"))  # M
+SPOT_VOTE_MIN = int(os.getenv("SPOT_VOTE_MIN", "2"))  # N
+STATUS_CONFIRM_FRAMES = int(os.getenv("STATUS_CONFIRM_FRAMES", "2"))  # lot counts must repeat before push (no calibration)
+
+# Per-spot classifier between full detections (calibrated cameras; the detector runs on flips and doubt)
+SPOT_CLASSIFIER_ENABLED = os.getenv("SPOT_CLASSIFIER_ENABLED", "true").lower() == "true"
+SPOT_CLASSIFIER_PATCH = int(os.getenv("SPOT_CLASSIFIER_PATCH", "24"))  # spot patch side, pixels
+SPOT_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("SPOT_CLASSIFIER_MIN_CONFIDENCE", "0.8"))  # below: run the detector
+SPOT_CLASSIFIER_DRIFT = float(os.getenv("SPOT_CLASSIFIER_DRIFT", "0.25"))  # patch change still taken as unchanged
+SPOT_CLASSIFIER_MIN_SAMPLES = int(os.getenv("SPOT_CLASSIFIER_MIN_SAMPLES", "200"))  # detector labels before skipping
+SPOT_CLASSIFIER_REFRESH = float(os.getenv("SPOT_CLASSIFIER_REFRESH", "300.0"))  # seconds, forced full detection
+
+# Async staged pipeline
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "2"))  # per stage, oldest item dropped when full
+PIPELINE_INFER_WORKERS = int(os.getenv("PIPELINE_INFER_WORKERS", "1"))  # concurrent inference calls
+PIPELINE_REPORT_INTERVAL = float(os.getenv("PIPELINE_REPORT_INTERVAL", "30.0"))  # seconds
+
 # Video/Image Source
 VIDEO_SOURCE = os.getenv("VIDEO_SOURCE", "0")  # 0 for webcam, or file path/URL
+CAPTURE_THREADED = os.getenv("CAPTURE_THREADED", "true").lower() == "true"  # background latest-frame grabber
+CAPTURE_TARGET_FPS = float(os.getenv("CAPTURE_TARGET_FPS", "2.0"))  # frames decoded per second, 0 = every frame
+
+# Live annotated MJPEG view (/cameras/<id>.mjpg), rendered only while watched
+LIVE_VIEW_PORT = int(os.getenv("LIVE_VIEW_PORT", "0"))  # 0 = disabled
+LIVE_VIEW_HOST = os.getenv("LIVE_VIEW_HOST", "127.0.0.1")  # no auth: expose beyond localhost via a proxy or 0.0.0.0
+LIVE_VIEW_JPEG_QUALITY = int(os.getenv("LIVE_VIEW_JPEG_QUALITY", "70"))  # 1-100
+LIVE_VIEW_MAX_FPS = float(os.getenv("LIVE_VIEW_MAX_FPS", "5.0"))  # frames rendered per second per camera
+LIVE_VIEW_SNAPSHOT_TIMEOUT = float(os.getenv("LIVE_VIEW_SNAPSHOT_TIMEOUT", str(SCHEDULER_MAX_INTERVAL)))  # idle fleet cameras
+
+# Frame + raw prediction recording (append-only indexed segments for incident replay and threshold tuning)
+RECORD_ENABLED = os.getenv("RECORD_ENABLED", "false").lower() == "true"
+RECORD_DIR = os.getenv("RECORD_DIR", "recordings")  # camera_<id>_<UTC start>.pvr segments
+RECORD_INTERVAL = float(os.getenv("RECORD_INTERVAL", "10.0"))  # seconds between recorded frames, 0 = every inferred frame
+RECORD_JPEG_QUALITY = int(os.getenv("RECORD_JPEG_QUALITY", "85"))  # 1-100
+RECORD_SEGMENT_SECONDS = float(os.getenv("RECORD_SEGMENT_SECONDS", "3600.0"))  # capture time per segment file
+RECORD_QUEUE_SIZE = int(os.getenv("RECORD_QUEUE_SIZE", "16"))  # frames waiting for the writer, dropped when full
+
+# Prometheus metrics endpoint (/metrics): stage latencies, frame age, errors, queue depths
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = disabled
 
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -1,20 +1,53 @@
 """
-Roboflow-based Parking Space Detector using Inference SDK
+Parking Space Detector backed by a pluggable inference engine
 """
+import os
 import logging
-from typing import List, Dict, Any
+import threading
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
 from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor
 
-from inference_sdk import InferenceHTTPClient
+import numpy as np
 
 from config import (
     ROBOFLOW_API_KEY,
-    ROBOFLOW_PROJECT,
-    CONFIDENCE_THRESHOLD
+    CONFIDENCE_THRESHOLD,
+    INFERENCE_BACKEND,
+    INFERENCE_CACHE_ENABLED,
+    TILE_SIZE,
+    TILE_OVERLAP,
+    TILE_WORKERS,
+    TILE_NMS_IOU,
+    DISPATCH_ENABLED,
+    DISPATCH_CONCURRENCY
 )
+from backends import InferenceBackend, RoboflowBackend, create_backend
+from cache import InferenceCache
+from dispatcher import InferenceDispatcher, gather
 
 logger = logging.getLogger(__name__)
 
+# Adjust based on your model's class names
+EMPTY_CLASS_NAMES = ("empty", "available", "free", "space")
+
+
+@lru_cache(maxsize=None)
+def is_empty_class(class_name: str) -> bool:
+    """
+    Check if a class name denotes an empty space
+
+    Matches whole names ("empty", "free", ...) and hyphenated model class
+    names such as "space-empty", but never "space-occupied".
+    """
+    name = class_name.lower()
+    if name in EMPTY_CLASS_NAMES:
+        return True
+    tokens = set(name.replace("_", "-").split("-"))
+    return "occupied" not in tokens and bool(tokens & {"empty", "available", "free"})
+
 
 @dataclass
 class Detection:
@@ -29,8 +62,7 @@ class Detection:
     @property
     def is_empty(self) -> bool:
         """Check if the detected space is empty"""
-        # Adjust based on your model's class names
-        return self.class_name.lower() in ["empty", "available", "free", "space"]
+        return is_empty_class(self.class_name)
 
     @property
     def is_occupied(self) -> bool:
@@ -49,111 +81,519 @@ class Detection:
         }
 
 
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    Greedy non-maximum suppression
+
+    Args:
+        boxes: (N, 4) boxes as x1, y1, x2, y2
+        scores: (N,) scores
+        iou_threshold: Overlap above which the lower-scored box is removed
+
+    Returns:
+        Indices of kept boxes, highest score first
+    """
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind="stable")
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        ih = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = iw * ih
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-6)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+_prediction_columns = itemgetter("x", "y", "width", "height", "confidence")
+
+
+class DetectionBatch:
+    """
+    All detections of one frame as columns (struct of arrays)
+
+    Boxes are center based (x, y, width, height) in image pixels. Class
+    names live in a lookup table indexed by class id, so emptiness is
+    resolved once per class instead of once per box. Iterating yields
+    Detection objects for code that still wants them.
+    """
+
+    def __init__(
+        self,
+        boxes: np.ndarray,
+        confidences: np.ndarray,
+        class_ids: np.ndarray,
+        class_names: List[str]
+    ):
+        """
+        Initialize the batch
+
+        Args:
+            boxes: (N, 4) center x, center y, width, height
+            confidences: (N,) confidences
+            class_ids: (N,) int indices into class_names
+            class_names: Class name lookup table
+        """
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.confidences = np.asarray(confidences, dtype=np.float64)
+        self.class_ids = np.asarray(class_ids, dtype=np.int32)
+        self.class_names = list(class_names)
+        self._class_empty = np.array([is_empty_class(n) for n in self.class_names], dtype=bool)
+
+    @classmethod
+    def empty(cls) -> "DetectionBatch":
+        return cls(np.empty((0, 4)), np.empty(0), np.empty(0), [])
+
+    @classmethod
+    def from_predictions(cls, predictions: List[Dict[str, Any]]) -> "DetectionBatch":
+        """Build a batch from raw backend predictions (Roboflow format)"""
+        if not predictions:
+            return cls.empty()
+
+        class_index: Dict[str, int] = {}
+        class_ids = [class_index.setdefault(p["class"], len(class_index)) for p in predictions]
+        rows = np.array(list(map(_prediction_columns, predictions)), dtype=np.float64)
+        return cls(rows[:, :4], rows[:, 4], np.array(class_ids), list(class_index))
+
+    def __len__(self) -> int:
+        return len(self.confidences)
+
+    def __iter__(self) -> Iterator[Detection]:
+        ints = self.boxes.astype(np.int64).tolist()
+        for (x, y, w, h), conf, cid in zip(ints, self.confidences.tolist(), self.class_ids.tolist()):
+            yield Detection(class_name=self.class_names[cid], confidence=conf, x=x, y=y, width=w, height=h)
+
+    def __getitem__(self, index) -> "DetectionBatch":
+        """Select detections by boolean mask or index array"""
+        return DetectionBatch(self.boxes[index], self.confidences[index], self.class_ids[index], self.class_names)
+
+    @property
+    def empty_mask(self) -> np.ndarray:
+        """(N,) True where the detection is an empty space"""
+        return self._class_empty[self.class_ids]
+
+    @property
+    def occupied_mask(self) -> np.ndarray:
+        return ~self.empty_mask
+
+    @property
+    def xyxy(self) -> np.ndarray:
+        """(N, 4) corner boxes x1, y1, x2, y2"""
+        half = self.boxes[:, 2:] * 0.5
+        return np.concatenate((self.boxes[:, :2] - half, self.boxes[:, :2] + half), axis=1)
+
+    def filter_confidence(self, threshold: float) -> "DetectionBatch":
+        """Keep detections with confidence >= threshold"""
+        return self[self.confidences >= threshold]
+
+    def nms(self, iou_threshold: float, class_agnostic: bool = False) -> "DetectionBatch":
+        """
+        Remove overlapping duplicates
+
+        Args:
+            iou_threshold: Overlap above which the lower-confidence box is dropped
+            class_agnostic: Suppress across classes too
+
+        Returns:
+            New batch, highest confidence first
+        """
+        if len(self) < 2:
+            return self
+        boxes = self.xyxy
+        if not class_agnostic:
+            # Shift each class into its own region so boxes of different classes never overlap
+            offset = (boxes.max() + 1.0) * self.class_ids
+            boxes = boxes + offset[:, None]
+        return self[nms(boxes, self.confidences, iou_threshold)]
+
+    def summary(self) -> Dict[str, Any]:
+        """Counts of empty and occupied spaces"""
+        total = len(self)
+        empty = int(np.count_nonzero(self.empty_mask))
+        occupied = total - empty
+        return {
+            "total": total,
+            "empty": empty,
+            "occupied": occupied,
+            "occupancy_rate": occupied / total if total else 0
+        }
+
+    def to_payload(self) -> List[Dict[str, Any]]:
+        """Serialize to the backend detections payload in one pass"""
+        ints = self.boxes.astype(np.int64).tolist()
+        names = self.class_names
+        empty = self._class_empty.tolist()
+        return [
+            {
+                "class_name": names[cid],
+                "confidence": conf,
+                "x": x,
+                "y": y,
+                "width": w,
+                "height": h,
+                "is_empty": empty[cid]
+            }
+            for (x, y, w, h), conf, cid in zip(ints, self.confidences.tolist(), self.class_ids.tolist())
+        ]
+
+    def to_compact(self) -> Dict[str, Any]:
+        """Serialize for the ingest channel: class tables plus [class, conf, x, y, w, h] rows"""
+        rows = np.concatenate((self.class_ids[:, None], self.boxes.astype(np.int64)), axis=1).tolist()
+        for row, conf in zip(rows, self.confidences.tolist()):
+            row.insert(1, conf)
+        return {
+            "classes": list(self.class_names),
+            "empty_classes": self._class_empty.tolist(),
+            "detections": rows
+        }
+
+
+Detections = Union[DetectionBatch, List[Detection]]
+
+
+def _tile_axis(length: int, tile: int, overlap: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Tile starts/ends along one axis plus the span each tile owns"""
+    if length <= tile:
+        starts = np.zeros(1, dtype=np.int64)
+    else:
+        stride = tile - overlap
+        count = int(np.ceil((length - tile) / stride)) + 1
+        # The last tile is pulled back to end exactly at the frame border
+        starts = np.minimum(np.arange(count) * stride, length - tile)
+    ends = np.minimum(starts + tile, length)
+
+    # Overlaps are split down the middle so every pixel belongs to exactly one tile
+    own_lo = np.concatenate(([0.0], (starts[1:] + ends[:-1]) / 2.0))
+    own_hi = np.concatenate(((starts[1:] + ends[:-1]) / 2.0, [float(length)]))
+    return starts, ends, own_lo, own_hi
+
+
+def tile_grid(height: int, width: int, tile_size: int, overlap: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Overlapping tiles covering a frame
+
+    Args:
+        height: Frame height in pixels
+        width: Frame width in pixels
+        tile_size: Square tile side in pixels
+        overlap: Fraction of the tile shared with each neighbour (0-1)
+
+    Returns:
+        (T, 4) tiles as x0, y0, x1, y1 and (T, 4) owned regions in the same layout
+    """
+    overlap_px = int(round(tile_size * overlap))
+    xs, xe, x_lo, x_hi = _tile_axis(width, tile_size, overlap_px)
+    ys, ye, y_lo, y_hi = _tile_axis(height, tile_size, overlap_px)
+
+    yi, xi = np.meshgrid(np.arange(len(ys)), np.arange(len(xs)), indexing="ij")
+    yi, xi = yi.ravel(), xi.ravel()
+    tiles = np.stack((xs[xi], ys[yi], xe[xi], ye[yi]), axis=1)
+    owned = np.stack((x_lo[xi], y_lo[yi], x_hi[xi], y_hi[yi]), axis=1)
+    return tiles, owned
+
+
+@dataclass
+class TiledPayload:
+    """Prepared backend payloads of every tile of one frame"""
+    tiles: np.ndarray  # (T, 4) x0, y0, x1, y1
+    owned: np.ndarray  # (T, 4) region whose box centers each tile keeps
+    payloads: List[Any]
+
+
+@dataclass
+class RoiPayload:
+    """Payload (backend or TiledPayload) of a cropped and resized region of a frame"""
+    payload: Any
+    offset: Tuple[int, int]  # region origin in frame pixels
+    scale: float  # payload pixels per frame pixel
+
+    def to_frame(self, batch: DetectionBatch) -> DetectionBatch:
+        """Map a batch predicted on the payload back to frame pixels (in place)"""
+        if len(batch):
+            if self.scale != 1.0:
+                batch.boxes /= self.scale
+            batch.boxes[:, :2] += self.offset
+        return batch
+
+
+# Tile inference pool shared by every detector in the process
+_tile_executor: Optional[ThreadPoolExecutor] = None
+_tile_executor_lock = threading.Lock()
+
+
+def _get_tile_executor() -> ThreadPoolExecutor:
+    global _tile_executor
+    with _tile_executor_lock:
+        if _tile_executor is None:
+            _tile_executor = ThreadPoolExecutor(
+                max_workers=TILE_WORKERS or os.cpu_count() or 4,
+                thread_name_prefix="tile"
+            )
+        return _tile_executor
+
+
 class ParkingDetector:
     """
-    Parking space detector using Roboflow Inference SDK
+    Parking space detector running on a configurable inference backend
     """
 
-    def __init__(self, api_key: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        backend: InferenceBackend = None,
+        cache: InferenceCache = None,
+        dispatcher: InferenceDispatcher = None
+    ):
         """
-        Initialize the detector with Roboflow Inference client
+        Initialize the detector with an inference backend
 
         Args:
             api_key: Roboflow API key (uses config default if not provided)
+            backend: Inference backend to use (default: INFERENCE_BACKEND from config)
+            cache: Inference cache for image files (default: shared on-disk cache if enabled)
+            dispatcher: Runs inference calls concurrently with deadlines (default: one for the
+                configured remote backend if DISPATCH_ENABLED)
         """
         self.api_key = api_key or ROBOFLOW_API_KEY
         self.confidence_threshold = CONFIDENCE_THRESHOLD
-        
-        # Initialize Inference client
-        self.client = InferenceHTTPClient(
-            api_url="https://detect.roboflow.com",
-            api_key=self.api_key
-        )
-        
-        logger.info(f"Initialized Roboflow Inference client for project: {ROBOFLOW_PROJECT}")
 
-    def detect(self, image_path: str) -> List[Detection]:
+        if backend is None:
+            if INFERENCE_BACKEND.lower() == RoboflowBackend.name:
+                if DISPATCH_ENABLED and dispatcher is None:
+                    # One keep-alive connection per concurrent call
+                    backend = RoboflowBackend(api_key=self.api_key, pool_size=DISPATCH_CONCURRENCY)
+                    dispatcher = InferenceDispatcher(backend)
+                else:
+                    backend = RoboflowBackend(api_key=self.api_key)
+            else:
+                backend = create_backend(INFERENCE_BACKEND)
+        self.backend = backend
+        self.dispatcher = dispatcher
+
+        self.tile_size = TILE_SIZE
+        self.tile_overlap = TILE_OVERLAP
+
+        if cache is None and INFERENCE_CACHE_ENABLED:
+            cache = InferenceCache()
+        self.cache = cache
+
+        logger.info(f"Initialized {self.backend.name} inference backend for model: {self.backend.model_id}")
+
+    def detect(self, image_path: str, raise_errors: bool = False) -> DetectionBatch:
         """
         Detect parking spaces in an image
 
         Args:
             image_path: Path to the image file
+            raise_errors: Propagate inference errors instead of returning no detections
 
         Returns:
-            List of Detection objects
+            DetectionBatch (iterates as Detection objects)
         """
         try:
-            # Run inference using the Inference SDK
-            result = self.client.infer(image_path, model_id=ROBOFLOW_PROJECT)
-            
-            detections = []
-            predictions = result.get("predictions", [])
-            
-            for pred in predictions:
-                # Filter by confidence threshold
-                if pred["confidence"] >= self.confidence_threshold:
-                    detection = Detection(
-                        class_name=pred["class"],
-                        confidence=pred["confidence"],
-                        x=int(pred["x"]),
-                        y=int(pred["y"]),
-                        width=int(pred["width"]),
-                        height=int(pred["height"])
-                    )
-                    detections.append(detection)
+            if self.cache is not None:
+                # Raw predictions are cached, so threshold changes are served without re-inference
+                with open(image_path, "rb") as f:
+                    image_bytes = f.read()
+                predictions = self.cache.get_or_infer(
+                    image_bytes,
+                    self.backend.cache_namespace,
+                    lambda: self._infer_path(image_path)
+                )
+            else:
+                predictions = self._infer_path(image_path)
+            detections = self._to_detections(predictions)
 
             logger.info(f"Detected {len(detections)} parking spaces with confidence >= {self.confidence_threshold}")
             return detections
 
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Detection failed: {e}")
-            return []
+            return DetectionBatch.empty()
+
+    def _infer_path(self, image_path: str) -> List[Dict[str, Any]]:
+        if self.dispatcher is None:
+            return self.backend.infer(image_path)
+        return self.dispatcher.infer(self.backend.prepare_path(image_path))
+
+    def _infer_prepared(self, payload, camera_id=None) -> List[Dict[str, Any]]:
+        """Raw predictions of one backend payload, through the dispatcher when there is one"""
+        if self.dispatcher is None:
+            return self.backend.infer_prepared(payload)
+        return self.dispatcher.infer(payload, camera_id)
+
+    def _to_detections(self, predictions: List[Dict[str, Any]]) -> DetectionBatch:
+        """Convert raw backend predictions to a confidence-filtered batch"""
+        return DetectionBatch.from_predictions(predictions).filter_confidence(self.confidence_threshold)
 
-    def detect_from_frame(self, frame) -> List[Detection]:
+    def detect_from_frame(self, frame, tile_size: int = None, tile_overlap: float = None) -> DetectionBatch:
         """
         Detect parking spaces from a numpy array frame (OpenCV format)
 
         Args:
             frame: numpy array (BGR format from OpenCV)
+            tile_size: Split the frame into tiles of this size (default: TILE_SIZE, 0 disables)
+            tile_overlap: Fraction of overlap between neighbouring tiles (default: TILE_OVERLAP)
 
         Returns:
-            List of Detection objects
+            DetectionBatch (iterates as Detection objects)
         """
-        import cv2
-        import tempfile
-        import os
-
-        if self.model is None:
-            raise RuntimeError("Model not loaded")
+        if self.backend is None:
+            raise RuntimeError("Inference backend not initialized")
 
         try:
-            # Save frame to temporary file
-            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
-                tmp_path = tmp.name
-                cv2.imwrite(tmp_path, frame)
+            # Frames stay in memory: the backend encodes or consumes the array directly
+            if self._tiling(frame, tile_size) is None:
+                if self.dispatcher is None:
+                    return self._to_detections(self.backend.infer(frame))
+                return self._to_detections(self._infer_prepared(self.backend.prepare(frame)))
+            return self.detect_prepared(self.prepare_frame(frame, tile_size, tile_overlap))
 
-            # Run detection
-            detections = self.detect(tmp_path)
+        except Exception as e:
+            logger.error(f"Frame detection failed: {e}")
+            return DetectionBatch.empty()
 
-            # Clean up
-            os.unlink(tmp_path)
+    def _tiling(self, frame, tile_size: Optional[int]) -> Optional[int]:
+        """Effective tile size for a frame, or None when it fits in one tile"""
+        tile_size = self.tile_size if tile_size is None else tile_size
+        if not tile_size or max(frame.shape[:2]) <= tile_size:
+            return None
+        return tile_size
 
-            return detections
+    def prepare_frame(self, frame, tile_size: int = None, tile_overlap: float = None):
+        """
+        Run the CPU-side preparation (resize/encode) of a frame
+
+        Args:
+            frame: numpy array (BGR format from OpenCV)
+            tile_size: Split the frame into tiles of this size (default: TILE_SIZE, 0 disables)
+            tile_overlap: Fraction of overlap between neighbouring tiles (default: TILE_OVERLAP)
+
+        Returns:
+            Backend payload (or TiledPayload) for detect_prepared()
+        """
+        tile_size = self._tiling(frame, tile_size)
+        if tile_size is None:
+            return self.backend.prepare(frame)
+
+        overlap = self.tile_overlap if tile_overlap is None else tile_overlap
+        tiles, owned = tile_grid(frame.shape[0], frame.shape[1], tile_size, overlap)
+        views = [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in tiles.tolist()]
+        payloads = list(_get_tile_executor().map(self.backend.prepare, views))
+        return TiledPayload(tiles=tiles, owned=owned, payloads=payloads)
+
+    def detect_prepared(self, payload, raise_errors: bool = False) -> DetectionBatch:
+        """
+        Detect parking spaces from a payload returned by prepare_frame()
 
+        Args:
+            payload: Prepared backend payload
+            raise_errors: Propagate inference errors instead of returning no detections
+
+        Returns:
+            DetectionBatch (iterates as Detection objects)
+        """
+        try:
+            return self.predict_prepared(payload).filter_confidence(self.confidence_threshold)
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Frame detection failed: {e}")
-            return []
+            return DetectionBatch.empty()
 
-    def get_parking_summary(self, detections: List[Detection]) -> Dict[str, int]:
+    def predict_prepared(self, payload, camera_id=None) -> DetectionBatch:
+        """
+        All predictions for a payload returned by prepare_frame(), before the confidence threshold
+
+        Kept raw so recordings can be re-thresholded later; inference errors propagate.
+
+        Args:
+            payload: Prepared backend payload
+            camera_id: Camera the frame came from (for the dispatcher)
+
+        Returns:
+            DetectionBatch in frame pixels
+        """
+        if isinstance(payload, RoiPayload):
+            return payload.to_frame(self.predict_prepared(payload.payload, camera_id))
+        if self.dispatcher is not None:
+            return self.submit_prepared(payload, camera_id).result()
+        if isinstance(payload, TiledPayload):
+            results = list(_get_tile_executor().map(self.backend.infer_prepared, payload.payloads))
+            return self._merge_tiles(payload, results)
+        return DetectionBatch.from_predictions(self.backend.infer_prepared(payload))
+
+    def submit_prepared(self, payload, camera_id=None) -> Future:
+        """
+        Non-blocking predict_prepared() through the dispatcher
+
+        Tiles of one frame are dispatched as separate calls and merged when
+        the last one answers.
+
+        Returns:
+            Future of the DetectionBatch (fails with the inference error or DeadlineExceeded)
+        """
+        if self.dispatcher is None:
+            raise RuntimeError("Detector has no inference dispatcher")
+        if isinstance(payload, RoiPayload):
+            inner = self.submit_prepared(payload.payload, camera_id)
+            return gather([inner], lambda results: payload.to_frame(results[0]))
+        if isinstance(payload, TiledPayload):
+            futures = [self.dispatcher.submit(tile, camera_id) for tile in payload.payloads]
+            return gather(futures, lambda results: self._merge_tiles(payload, results))
+        future = self.dispatcher.submit(payload, camera_id)
+        return gather([future], lambda results: DetectionBatch.from_predictions(results[0]))
+
+    def payload_bytes(self, payload) -> int:
+        """Size of a payload returned by prepare_frame() as handed to the engine (all tiles)"""
+        if isinstance(payload, RoiPayload):
+            return self.payload_bytes(payload.payload)
+        if isinstance(payload, TiledPayload):
+            return sum(self.backend.payload_bytes(tile) for tile in payload.payloads)
+        return self.backend.payload_bytes(payload)
+
+    def _merge_tiles(self, tiled: TiledPayload, results: List[List[Dict[str, Any]]]) -> DetectionBatch:
+        """Merge per-tile predictions into frame coordinates"""
+        counts = np.fromiter((len(r) for r in results), dtype=np.int64, count=len(results))
+        batch = DetectionBatch.from_predictions([p for r in results for p in r])
+        if not len(batch):
+            return batch
+
+        tile_index = np.repeat(np.arange(len(results)), counts)
+        batch.boxes[:, :2] += tiled.tiles[tile_index, :2]
+
+        # A tile only keeps boxes centered in the part of the frame it owns;
+        # cut-off copies of the same car near tile borders are dropped here
+        centers = batch.boxes[:, :2]
+        owned = tiled.owned[tile_index]
+        keep = (
+            (centers[:, 0] >= owned[:, 0]) & (centers[:, 0] < owned[:, 2])
+            & (centers[:, 1] >= owned[:, 1]) & (centers[:, 1] < owned[:, 3])
+        )
+        # Objects larger than the overlap can still appear twice: one box per spot.
+        # Greedy NMS only lets higher scores suppress lower ones, so thresholding afterwards gives the same result
+        return batch[keep].nms(TILE_NMS_IOU, class_agnostic=True)
+
+    def get_parking_summary(self, detections: Detections) -> Dict[str, int]:
         """
         Get a summary of parking space status
 
         Args:
-            detections: List of Detection objects
+            detections: DetectionBatch or list of Detection objects
 
         Returns:
             Dictionary with counts of empty and occupied spaces
         """
+        if isinstance(detections, DetectionBatch):
+            return detections.summary()
+
         empty_count = sum(1 for d in detections if d.is_empty)
         occupied_count = sum(1 for d in detections if d.is_occupied)
 
@@ -164,13 +604,13 @@ class ParkingDetector:
             "occupancy_rate": occupied_count / len(detections) if detections else 0
         }
 
-    def visualize_detections(self, image_path: str, detections: List[Detection], output_path: str = None) -> str:
+    def visualize_detections(self, image_path: str, detections: Detections, output_path: str = None) -> str:
         """
         Draw bounding boxes on the image and save it
 
         Args:
             image_path: Path to the original image
-            detections: List of Detection objects
+            detections: DetectionBatch or list of Detection objects
             output_path: Path to save the result (default: adds _result suffix)
 
         Returns:
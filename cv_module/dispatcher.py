@@ -0,0 +1,413 @@
+"""
+Remote inference dispatcher
+Concurrent inference calls within a rate limit, with per-call deadlines and optional hedging
+"""
+import time
+import heapq
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from config import (
+    DISPATCH_CONCURRENCY,
+    DISPATCH_RATE,
+    DISPATCH_BURST,
+    DISPATCH_DEADLINE,
+    DISPATCH_HEDGE,
+    DISPATCH_HEDGE_DELAY
+)
+from backends import InferenceBackend
+from metrics import (
+    DISPATCH_CALLS_TOTAL,
+    DISPATCH_ATTEMPT_SECONDS,
+    DISPATCH_THROTTLE_SECONDS,
+    DISPATCH_HEDGES_TOTAL,
+    DISPATCH_IN_FLIGHT
+)
+
+logger = logging.getLogger(__name__)
+
+# Successful latencies kept for the adaptive hedge delay, and how many are needed first
+LATENCY_WINDOW = 256
+LATENCY_MIN_SAMPLES = 20
+
+
+class DeadlineExceeded(TimeoutError):
+    """An inference call did not finish within its deadline"""
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing rate calls per second with bursts up to capacity
+
+    Waiting callers reserve their token up front (the balance goes
+    negative), so they are served in arrival order without racing.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Initialize a full bucket
+
+        Args:
+            rate: Tokens added per second (0 = unlimited)
+            capacity: Maximum burst (default: one second worth of tokens, at least 1)
+        """
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is available right now"""
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self, timeout: float) -> bool:
+        """
+        Take a token, waiting for it at most timeout seconds
+
+        Returns:
+            False without waiting if the token would come too late
+        """
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+            if wait > timeout:
+                return False
+            self._tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+class _Call:
+    """One submitted inference call and its attempts"""
+
+    __slots__ = ("payload", "camera_id", "future", "expires", "attempts", "running", "hedged", "finished")
+
+    def __init__(self, payload: Any, camera_id: Any, expires: float):
+        self.payload = payload
+        self.camera_id = camera_id
+        self.future: Future = Future()
+        self.expires = expires
+        self.attempts = 0
+        self.running = 0
+        self.hedged = False
+        self.finished = False
+
+    @property
+    def done(self) -> bool:
+        return self.finished or self.future.cancelled()
+
+
+class InferenceDispatcher:
+    """
+    Runs backend inference calls concurrently for many cameras
+
+    Calls go to a pool of concurrency workers, one pooled keep-alive
+    connection each, after taking a token from a bucket sized to the plan
+    quota, so throughput is bound by the quota rather than by round trips
+    made one after another. Every call has a deadline covering the wait
+    for a worker, the wait for a token and the request itself; its future
+    fails with DeadlineExceeded when it passes, even if the request is
+    still running.
+
+    With hedging on, a call still running after the hedge delay (fixed,
+    or the recent p95 latency) gets a second attempt if a worker and a
+    token are free right away, and the first answer wins. A failed
+    attempt is retried the same way while the deadline allows.
+    """
+
+    def __init__(
+        self,
+        backend: InferenceBackend,
+        concurrency: int = None,
+        rate: float = None,
+        burst: int = None,
+        deadline: float = None,
+        hedge: bool = None,
+        hedge_delay: float = None
+    ):
+        """
+        Initialize the dispatcher and its worker pool
+
+        Args:
+            backend: Backend running infer_prepared() (give remote backends a pool of concurrency connections)
+            concurrency: Calls in flight at once (default: DISPATCH_CONCURRENCY)
+            rate: Calls per second allowed by the quota, 0 = unlimited (default: DISPATCH_RATE)
+            burst: Token bucket capacity (default: DISPATCH_BURST, 0 = one second of rate)
+            deadline: Default seconds per call (default: DISPATCH_DEADLINE)
+            hedge: Hedge slow calls and retry failed ones (default: DISPATCH_HEDGE)
+            hedge_delay: Seconds before hedging, 0 = recent p95 latency (default: DISPATCH_HEDGE_DELAY)
+        """
+        self.backend = backend
+        self.concurrency = concurrency or DISPATCH_CONCURRENCY
+        self.bucket = TokenBucket(DISPATCH_RATE if rate is None else rate, burst or DISPATCH_BURST or None)
+        self.deadline = deadline or DISPATCH_DEADLINE
+        self.hedge = DISPATCH_HEDGE if hedge is None else hedge
+        self.hedge_delay = DISPATCH_HEDGE_DELAY if hedge_delay is None else hedge_delay
+
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="dispatch")
+        self._lock = threading.Lock()
+        self._active = 0  # attempts queued or running on the pool
+        self._in_flight = 0
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._p95: Optional[float] = None
+
+        # Hedge and deadline timers share one thread: (when, sequence, kind, call)
+        self._timers: List = []
+        self._timer_seq = 0
+        self._timer_cond = threading.Condition(self._lock)
+        self._closed = False
+        self._timer_thread = threading.Thread(target=self._timer_loop, name="dispatch-timers", daemon=True)
+        self._timer_thread.start()
+
+        self.counters: Dict[str, int] = {
+            "submitted": 0, "ok": 0, "error": 0, "deadline": 0, "throttled": 0,
+            "hedged": 0, "hedge_won": 0, "retried": 0
+        }
+        self._calls = {result: DISPATCH_CALLS_TOTAL.labels(result) for result in ("ok", "error", "deadline")}
+        self._attempt_seconds = {
+            attempt: DISPATCH_ATTEMPT_SECONDS.labels(attempt) for attempt in ("primary", "hedge")
+        }
+        self._throttle_seconds = DISPATCH_THROTTLE_SECONDS.labels()
+        self._hedges = {outcome: DISPATCH_HEDGES_TOTAL.labels(outcome) for outcome in ("won", "lost")}
+        DISPATCH_IN_FLIGHT.labels().set_function(lambda: self._in_flight)
+
+        logger.info(
+            f"Inference dispatcher: {self.concurrency} concurrent calls, "
+            f"{self.bucket.rate or 'unlimited'} calls/sec, {self.deadline:.1f}s deadline"
+            + (", hedging" if self.hedge else "")
+        )
+
+    def submit(self, payload: Any, camera_id: Any = None, deadline: float = None) -> Future:
+        """
+        Start an inference call without waiting for it
+
+        Args:
+            payload: Backend payload from prepare()
+            camera_id: Camera the result belongs to (for logs)
+            deadline: Seconds the call may take (default: the dispatcher deadline)
+
+        Returns:
+            Future resolving to the raw predictions, or failing with the backend
+            error or DeadlineExceeded
+        """
+        call = _Call(payload, camera_id, time.monotonic() + (deadline or self.deadline))
+        with self._lock:
+            self.counters["submitted"] += 1
+            self._in_flight += 1
+            self._schedule(call.expires, "deadline", call)
+            if self.hedge:
+                delay = self._hedge_delay()
+                if delay is not None and time.monotonic() + delay < call.expires:
+                    self._schedule(time.monotonic() + delay, "hedge", call)
+            self._launch(call)
+        return call.future
+
+    def infer(self, payload: Any, camera_id: Any = None, deadline: float = None) -> List[Dict[str, Any]]:
+        """Blocking submit(): raw predictions, or the call's error"""
+        return self.submit(payload, camera_id, deadline).result()
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_delay > 0:
+            return self.hedge_delay
+        return self._p95
+
+    def _schedule(self, when: float, kind: str, call: _Call):
+        # Called with the lock held
+        self._timer_seq += 1
+        heapq.heappush(self._timers, (when, self._timer_seq, kind, call))
+        self._timer_cond.notify()
+
+    def _launch(self, call: _Call, hedge: bool = False):
+        # Called with the lock held
+        call.attempts += 1
+        call.running += 1
+        call.hedged = call.hedged or hedge
+        self._active += 1
+        self._executor.submit(self._attempt, call, hedge)
+
+    def _attempt(self, call: _Call, hedge: bool):
+        try:
+            remaining = call.expires - time.monotonic()
+            if call.done or remaining <= 0:
+                self._attempt_done(call, hedge, error=DeadlineExceeded("Expired while queued"))
+                return
+            # Hedges only run on a token that was free on the spot (taken before launch)
+            if not hedge:
+                waited = time.monotonic()
+                if not self.bucket.acquire(remaining):
+                    with self._lock:
+                        self.counters["throttled"] += 1
+                    self._attempt_done(call, hedge, error=DeadlineExceeded("Rate limit leaves no time for the call"))
+                    return
+                waited = time.monotonic() - waited
+                if waited > 0.001:
+                    self._throttle_seconds.observe(waited)
+                remaining = call.expires - time.monotonic()
+
+            started = time.monotonic()
+            predictions = self.backend.infer_prepared(call.payload, timeout=max(remaining, 0.001))
+            elapsed = time.monotonic() - started
+            self._attempt_seconds["hedge" if hedge else "primary"].observe(elapsed)
+            self._attempt_done(call, hedge, predictions=predictions, elapsed=elapsed)
+        except Exception as e:
+            if time.monotonic() >= call.expires:
+                # The request timed out on the time left to the call: report it as the deadline it is
+                e = DeadlineExceeded(f"Inference deadline exceeded: {e}")
+            self._attempt_done(call, hedge, error=e)
+
+    def _attempt_done(
+        self,
+        call: _Call,
+        hedge: bool,
+        predictions: List[Dict[str, Any]] = None,
+        error: Exception = None,
+        elapsed: float = None
+    ):
+        with self._lock:
+            self._active -= 1
+            call.running -= 1
+            if elapsed is not None:
+                self._latencies.append(elapsed)
+                if len(self._latencies) >= LATENCY_MIN_SAMPLES and len(self._latencies) % 16 == 0:
+                    self._p95 = float(np.percentile(self._latencies, 95))
+
+            if call.done:
+                return
+            if error is None:
+                if call.hedged:
+                    self._hedges["won" if hedge else "lost"].inc()
+                    if hedge:
+                        self.counters["hedge_won"] += 1
+                self._finish(call, "ok")
+            elif call.running:
+                # The other attempt may still answer
+                return
+            elif (
+                self.hedge and call.attempts < 2 and not isinstance(error, DeadlineExceeded)
+                and call.expires > time.monotonic()
+            ):
+                logger.debug(f"Camera {call.camera_id}: inference failed ({error}), retrying")
+                self.counters["retried"] += 1
+                self._launch(call)
+                return
+            else:
+                self._finish(call, "deadline" if isinstance(error, DeadlineExceeded) else "error")
+
+        # Outside the lock: done callbacks may submit new calls
+        self._settle(call, predictions, error)
+
+    def _finish(self, call: _Call, result: str):
+        # Called with the lock held; the future is settled after releasing it
+        call.finished = True
+        call.payload = None
+        self.counters[result] += 1
+        self._calls[result].inc()
+        self._in_flight -= 1
+
+    @staticmethod
+    def _settle(call: _Call, predictions: List[Dict[str, Any]] = None, error: Exception = None):
+        if call.future.cancelled():
+            return
+        if error is not None:
+            call.future.set_exception(error)
+        else:
+            call.future.set_result(predictions)
+
+    def _timer_loop(self):
+        while True:
+            expired = []
+            with self._lock:
+                while not self._closed:
+                    if not self._timers:
+                        self._timer_cond.wait()
+                        continue
+                    delay = self._timers[0][0] - time.monotonic()
+                    if delay > 0:
+                        self._timer_cond.wait(delay)
+                        continue
+                    break
+                if self._closed:
+                    return
+                while self._timers and self._timers[0][0] <= time.monotonic():
+                    _, _, kind, call = heapq.heappop(self._timers)
+                    if call.done:
+                        continue
+                    if kind == "deadline":
+                        self._finish(call, "deadline")
+                        expired.append(call)
+                    elif call.attempts < 2 and self._active < self.concurrency and self.bucket.try_acquire():
+                        # Only on spare capacity: a hedge must never delay another camera's first attempt
+                        self.counters["hedged"] += 1
+                        self._launch(call, hedge=True)
+            for call in expired:
+                logger.warning(f"Camera {call.camera_id}: inference missed its deadline")
+                self._settle(call, error=DeadlineExceeded("Inference deadline exceeded"))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["in_flight"] = self._in_flight
+            stats["hedge_delay_ms"] = (self._hedge_delay() or 0.0) * 1000
+            return stats
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._timer_cond.notify()
+        self._executor.shutdown(wait=False)
+        DISPATCH_IN_FLIGHT.remove()
+
+
+def gather(futures: List[Future], combine: Callable[[List[Any]], Any]) -> Future:
+    """
+    Future of combine(results) once all futures succeeded
+
+    Fails with the first error as soon as any future fails.
+    """
+    combined: Future = Future()
+    results: List[Any] = [None] * len(futures)
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(index: int, future: Future):
+        error = future.exception()
+        with lock:
+            if combined.done():
+                return
+            if error is not None:
+                combined.set_exception(error)
+                return
+            results[index] = future.result()
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        try:
+            combined.set_result(combine(results))
+        except Exception as e:
+            combined.set_exception(e)
+
+    if not futures:
+        combined.set_result(combine([]))
+    for index, future in enumerate(futures):
+        future.add_done_callback(lambda f, index=index: done(index, f))
+    return combined
@@ -0,0 +1,126 @@
+"""
+In-memory frame encoding for remote inference
+Downscales and JPEG-encodes OpenCV frames without touching the disk
+"""
+import math
+import base64
+import threading
+from typing import Tuple
+
+import cv2
+import numpy as np
+
+from config import FRAME_JPEG_QUALITY, FRAME_MAX_DIMENSION, PREPROCESS_MIN_QUALITY, PREPROCESS_MAX_QUALITY
+
+
+class FrameEncoder:
+    """
+    Downscale and JPEG-encode frames with resize buffers reused across calls
+
+    Buffers are kept per thread so one encoder can be shared by workers.
+    """
+
+    def __init__(self, jpeg_quality: int = None, max_dimension: int = None):
+        """
+        Initialize the encoder
+
+        Args:
+            jpeg_quality: JPEG quality 1-100 (default: FRAME_JPEG_QUALITY)
+            max_dimension: Longest side after downscaling, 0 disables (default: FRAME_MAX_DIMENSION)
+        """
+        self.jpeg_quality = jpeg_quality or FRAME_JPEG_QUALITY
+        self.max_dimension = FRAME_MAX_DIMENSION if max_dimension is None else max_dimension
+        self._params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        self._local = threading.local()
+
+    def resize(self, frame: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Downscale a frame so its longest side fits max_dimension
+
+        The returned array is reused by the next call on the same thread.
+
+        Returns:
+            (resized frame, scale factor applied)
+        """
+        height, width = frame.shape[:2]
+        longest = max(height, width)
+        if self.max_dimension <= 0 or longest <= self.max_dimension:
+            return frame, 1.0
+
+        scale = self.max_dimension / longest
+        size = (int(round(width * scale)), int(round(height * scale)))
+        shape = (size[1], size[0]) + frame.shape[2:]
+
+        buffer = getattr(self._local, "resized", None)
+        if buffer is None or buffer.shape != shape or buffer.dtype != frame.dtype:
+            buffer = np.empty(shape, dtype=frame.dtype)
+            self._local.resized = buffer
+
+        cv2.resize(frame, size, dst=buffer, interpolation=cv2.INTER_AREA)
+        return buffer, scale
+
+    def encode(self, frame: np.ndarray, quality: int = None) -> Tuple[np.ndarray, float]:
+        """
+        Downscale and JPEG-encode a frame in memory
+
+        Args:
+            frame: numpy array (BGR format from OpenCV)
+            quality: JPEG quality for this frame (default: the encoder's jpeg_quality)
+
+        Returns:
+            (JPEG bytes as a uint8 array, scale factor applied)
+        """
+        resized, scale = self.resize(frame)
+        params = self._params if quality is None else [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+        ok, jpeg = cv2.imencode(".jpg", resized, params)
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return jpeg, scale
+
+    def encode_base64(self, frame: np.ndarray, quality: int = None) -> Tuple[str, float]:
+        """Downscale and encode a frame as a base64 JPEG string"""
+        jpeg, scale = self.encode(frame, quality)
+        return base64.b64encode(jpeg.data).decode("ascii"), scale
+
+
+class AdaptiveQuality:
+    """
+    JPEG quality steered towards a payload size
+
+    Within the usual quality range JPEG size grows roughly exponentially with
+    quality, so each observed payload moves the quality by a step proportional
+    to log2(target / size). Sizes within a few percent of the target leave it
+    alone, so a steady scene settles on one value.
+    """
+
+    GAIN = 8.0  # quality points per factor of two off target
+    DEADBAND = 0.1  # log2 error ignored (about 7%)
+
+    def __init__(self, target_bytes: float, min_quality: int = None, max_quality: int = None, initial: int = None):
+        """
+        Initialize the controller
+
+        Args:
+            target_bytes: Payload size to aim for
+            min_quality: Lowest quality used (default: PREPROCESS_MIN_QUALITY)
+            max_quality: Highest quality used (default: PREPROCESS_MAX_QUALITY)
+            initial: Starting quality (default: FRAME_JPEG_QUALITY)
+        """
+        self.target_bytes = target_bytes
+        self.min_quality = min_quality or PREPROCESS_MIN_QUALITY
+        self.max_quality = max_quality or PREPROCESS_MAX_QUALITY
+        self._quality = float(min(max(initial or FRAME_JPEG_QUALITY, self.min_quality), self.max_quality))
+
+    @property
+    def quality(self) -> int:
+        """Quality to encode the next frame with"""
+        return int(round(self._quality))
+
+    def observe(self, nbytes: int):
+        """Adjust the quality after a frame encoded at the current one came out nbytes long"""
+        if nbytes <= 0:
+            return
+        error = math.log2(self.target_bytes / nbytes)
+        if abs(error) < self.DEADBAND:
+            return
+        self._quality = min(max(self._quality + self.GAIN * error, self.min_quality), self.max_quality)
@@ -0,0 +1,318 @@
+"""
+Local stand-ins for the remote services
+Fake Roboflow-compatible inference server and fake ParkVision backend for offline benchmarks
+"""
+import os
+import re
+import json
+import time
+import base64
+import random
+import socket
+import hashlib
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_SIZE = 16
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    """Keep-alive JSON handler without access logs or Nagle delays"""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; without this, delayed ACKs add ~40 ms per response
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload: Any):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _fingerprint(gray: np.ndarray) -> np.ndarray:
+    """Tiny normalized thumbnail used to recognise an image after re-encoding or resizing"""
+    thumb = cv2.resize(gray, (FINGERPRINT_SIZE, FINGERPRINT_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    return (thumb - thumb.mean()).ravel() / (thumb.std() + 1e-6)
+
+
+def synthetic_predictions(width: int, height: int, seed: int, rows: int = 4, cols: int = 8) -> List[Dict[str, Any]]:
+    """Deterministic grid of parking-space predictions for images without a recording"""
+    rng = np.random.default_rng(seed)
+    cell_w, cell_h = width / cols, height / rows
+    predictions = []
+    for row in range(rows):
+        for col in range(cols):
+            occupied = bool(rng.random() < 0.6)
+            predictions.append({
+                "x": (col + 0.5) * cell_w,
+                "y": (row + 0.5) * cell_h,
+                "width": cell_w * 0.8,
+                "height": cell_h * 0.8,
+                "confidence": float(rng.uniform(0.6, 0.99)),
+                "class": "space-occupied" if occupied else "space-empty"
+            })
+    return predictions
+
+
+def record_predictions(image_paths: List[str], backend, output_path: str) -> Dict[str, Any]:
+    """
+    Run a real backend once over images and save its raw predictions for replay
+
+    Args:
+        image_paths: Images to record
+        backend: Inference backend to record from
+        output_path: Recording JSON file
+
+    Returns:
+        The recording
+    """
+    recording = {"model_id": backend.model_id, "images": {}}
+    for path in image_paths:
+        image = cv2.imread(path)
+        recording["images"][os.path.basename(path)] = {
+            "width": image.shape[1],
+            "height": image.shape[0],
+            "predictions": backend.infer(path)
+        }
+        logger.info(f"Recorded {len(recording['images'][os.path.basename(path)]['predictions'])} predictions "
+                     f"for {path}")
+    with open(output_path, "w") as f:
+        json.dump(recording, f)
+    return recording
+
+
+class _InferenceHandler(_QuietHandler):
+    """POST /<project>/<version>?api_key=... with a base64 image body, like the hosted API"""
+
+    server: "FakeInferenceServer"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            response = self.server.predict(body)
+        except ValueError as e:
+            self._send(400, {"message": str(e)})
+            return
+        self._send(200, response)
+
+
+class FakeInferenceServer(ThreadingHTTPServer):
+    """
+    Replays recorded predictions with a configurable service time
+
+    Each posted image is matched to the closest known image by a small
+    thumbnail fingerprint, so frames that were re-encoded or downscaled on
+    the way still get their recording, scaled to the posted size. Images
+    missing from the recording get a deterministic synthetic layout.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        image_paths: List[str],
+        recording: Dict[str, Any] = None,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        port: int = 0
+    ):
+        """
+        Initialize the server (call start() to begin serving)
+
+        Args:
+            image_paths: Images the benchmark will send
+            recording: Output of record_predictions() (None for synthetic predictions only)
+            latency_ms: Fixed service time added to every request
+            jitter_ms: Extra uniformly random service time, up to this much
+            port: TCP port (0 picks a free one)
+        """
+        super().__init__(("127.0.0.1", port), _InferenceHandler)
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+
+        recorded = (recording or {}).get("images", {})
+        self.sizes: List[Tuple[int, int]] = []
+        self.predictions: List[List[Dict[str, Any]]] = []
+        fingerprints = []
+        for index, path in enumerate(image_paths):
+            gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            height, width = gray.shape
+            entry = recorded.get(os.path.basename(path))
+            self.sizes.append((width, height))
+            self.predictions.append(entry["predictions"] if entry else synthetic_predictions(width, height, index))
+            fingerprints.append(_fingerprint(gray))
+        self.fingerprints = np.stack(fingerprints)
+        missing = sum(1 for p in image_paths if os.path.basename(p) not in recorded)
+        if missing:
+            logger.warning(f"No recorded predictions for {missing}/{len(image_paths)} images, using synthetic ones")
+
+        # The same frame encodes to the same bytes: skip decoding repeats
+        self._matches: Dict[bytes, Tuple[int, float, float]] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def _match(self, body: bytes) -> Tuple[int, float, float]:
+        digest = hashlib.sha1(body).digest()
+        match = self._matches.get(digest)
+        if match is not None:
+            return match
+
+        try:
+            jpeg = np.frombuffer(base64.b64decode(body), dtype=np.uint8)
+        except ValueError:
+            raise ValueError("Body is not a base64 image")
+        gray = cv2.imdecode(jpeg, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise ValueError("Could not decode image")
+        index = int(np.argmin(((self.fingerprints - _fingerprint(gray)) ** 2).sum(axis=1)))
+        width, height = self.sizes[index]
+        match = (index, gray.shape[1] / width, gray.shape[0] / height)
+        with self._lock:
+            if len(self._matches) >= 4096:
+                self._matches.clear()
+            self._matches[digest] = match
+        return match
+
+    def predict(self, body: bytes) -> Dict[str, Any]:
+        """Response for one posted image, after the configured service time"""
+        started = time.perf_counter()
+        index, scale_x, scale_y = self._match(body)
+        predictions = [
+            dict(p, x=p["x"] * scale_x, y=p["y"] * scale_y, width=p["width"] * scale_x, height=p["height"] * scale_y)
+            for p in self.predictions[index]
+        ]
+        delay = self.latency + random.uniform(0, self.jitter) - (time.perf_counter() - started)
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            self.requests += 1
+        width, height = self.sizes[index]
+        return {
+            "time": time.perf_counter() - started,
+            "image": {"width": round(width * scale_x), "height": round(height * scale_y)},
+            "predictions": predictions
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-inference", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _BackendHandler(_QuietHandler):
+    """The CV-facing subset of the ParkVision API"""
+
+    server: "FakeBackendServer"
+    spot_route = re.compile(r"^/cv/parking-spots/(\d+)/status$")
+    lot_route = re.compile(r"^/cv/parking-lots/(\d+)/status$")
+
+    def _body(self) -> Dict[str, Any]:
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.count(self.command, self.path, len(data))
+        return json.loads(data) if data else {}
+
+    def _send(self, status: int, payload: Any):
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+        super()._send(status, payload)
+
+    def do_GET(self):
+        self._body()
+        if self.path == "/health":
+            self._send(200, {"status": "healthy"})
+        elif self.path.startswith("/parking-lots"):
+            self._send(200, [])
+        elif self.path.startswith("/cameras"):
+            self._send(200, [])
+        else:
+            self._send(404, {"detail": "Not Found"})
+
+    def do_PUT(self):
+        body = self._body()
+        path = self.path.split("?", 1)[0]
+        if path == "/cv/parking-spots/status":
+            updates = body.get("updates", [])
+            self._send(200, {"success": True, "updated": len(updates), "stale": [], "not_found": []})
+        elif self.lot_route.match(path) or self.spot_route.match(path):
+            self._send(200, {"success": True})
+        else:
+            self._send(404, {"detail": "Not Found"})
+
+    def do_POST(self):
+        body = self._body()
+        if self.path == "/cv/events":
+            self._send(200, {"success": True, "event_type": body.get("event_type")})
+        else:
+            self._send(404, {"detail": "Not Found"})
+
+
+class FakeBackendServer(ThreadingHTTPServer):
+    """
+    Accepts every CV update the real backend would, and only counts it
+
+    The ingest WebSocket is not offered, so clients use their HTTP path.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency_ms: float = 0.0, port: int = 0):
+        """
+        Initialize the server (call start() to begin serving)
+
+        Args:
+            latency_ms: Service time added to every request
+            port: TCP port (0 picks a free one)
+        """
+        super().__init__(("127.0.0.1", port), _BackendHandler)
+        self.latency = latency_ms / 1000.0
+        self.requests: Dict[str, int] = {}
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def count(self, method: str, path: str, size: int):
+        # Group per-id routes so the counts stay readable
+        route = method + " " + re.sub(r"/\d+", "/{id}", path.split("?", 1)[0])
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            self.bytes_received += size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": dict(self.requests), "bytes_received": self.bytes_received}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-backend", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,125 @@
+"""
+Frame-change gating
+Skips inference when the scene has not changed since the last inferred frame
+"""
+import time
+import logging
+
+import cv2
+import numpy as np
+
+from config import (
+    GATE_CHANGE_THRESHOLD,
+    GATE_PIXEL_DELTA,
+    GATE_REFRESH_INTERVAL,
+    GATE_WIDTH
+)
+
+logger = logging.getLogger(__name__)
+
+
+class FrameChangeGate:
+    """
+    Cheap pre-inference check on a downscaled grayscale thumbnail
+
+    A frame passes the gate when the fraction of thumbnail pixels whose
+    brightness moved by more than pixel_delta since the last inferred frame
+    reaches change_threshold, or when refresh_interval seconds passed since
+    the last inference. All buffers are allocated once per frame size.
+    """
+
+    def __init__(
+        self,
+        change_threshold: float = None,
+        pixel_delta: int = None,
+        refresh_interval: float = None,
+        width: int = None
+    ):
+        """
+        Initialize the gate
+
+        Args:
+            change_threshold: Fraction of changed pixels (0-1) that triggers inference
+            pixel_delta: Per-pixel brightness difference counted as a change (0-255)
+            refresh_interval: Seconds after which inference is forced anyway
+            width: Thumbnail width in pixels (height keeps the aspect ratio)
+        """
+        self.change_threshold = GATE_CHANGE_THRESHOLD if change_threshold is None else change_threshold
+        self.pixel_delta = GATE_PIXEL_DELTA if pixel_delta is None else pixel_delta
+        self.refresh_interval = GATE_REFRESH_INTERVAL if refresh_interval is None else refresh_interval
+        self.width = width or GATE_WIDTH
+
+        self._small = None
+        self._gray = None
+        self._reference = None
+        self._diff = None
+        self._last_inference = 0.0
+
+        self.inferred = 0
+        self.skipped = 0
+        self.last_change = 0.0
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        """Downscale + grayscale into reused buffers"""
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, int(round(height * self.width / width))))
+        if self._gray is None or self._gray.shape != (size[1], size[0]):
+            self._small = np.empty((size[1], size[0]) + frame.shape[2:], dtype=frame.dtype)
+            self._gray = np.empty((size[1], size[0]), dtype=np.uint8)
+            self._diff = np.empty_like(self._gray)
+            self._reference = None
+
+        cv2.resize(frame, size, dst=self._small, interpolation=cv2.INTER_AREA)
+        if self._small.ndim == 3:
+            cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        else:
+            self._gray[...] = self._small
+        return self._gray
+
+    def change_ratio(self, frame: np.ndarray) -> float:
+        """Fraction of thumbnail pixels that changed since the reference frame"""
+        gray = self._thumbnail(frame)
+        if self._reference is None:
+            return 1.0
+        cv2.absdiff(gray, self._reference, dst=self._diff)
+        return np.count_nonzero(self._diff > self.pixel_delta) / self._diff.size
+
+    def should_infer(self, frame: np.ndarray) -> bool:
+        """
+        Decide whether a frame needs inference
+
+        When it does, the frame becomes the new reference.
+
+        Args:
+            frame: numpy array (BGR format from OpenCV)
+
+        Returns:
+            True if inference should run, False to reuse previous detections
+        """
+        now = time.monotonic()
+        self.last_change = self.change_ratio(frame)
+
+        if (
+            self.last_change < self.change_threshold
+            and now - self._last_inference < self.refresh_interval
+        ):
+            self.skipped += 1
+            return False
+
+        if self._reference is None:
+            self._reference = self._gray.copy()
+        else:
+            self._reference[...] = self._gray
+        self._last_inference = now
+        self.inferred += 1
+        return True
+
+    def stats(self) -> dict:
+        """Skipped/inferred counters"""
+        total = self.inferred + self.skipped
+        return {
+            "inferred": self.inferred,
+            "skipped": self.skipped,
+            "skip_rate": self.skipped / total if total else 0.0,
+            "last_change": self.last_change
+        }
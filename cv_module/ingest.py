@@ -0,0 +1,225 @@
+"""
+Streaming ingest channel to the backend
+One long-lived WebSocket carrying msgpack frames with sequence numbers and acknowledgements
+"""
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import (
+    BACKEND_API_URL,
+    BACKEND_API_KEY,
+    INGEST_WINDOW,
+    INGEST_ACK_TIMEOUT,
+    INGEST_RECONNECT_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+# Frame types understood by the backend's /cv/ingest endpoint
+LOT_STATUS_FRAME = "lot_status"
+SPOT_BATCH_FRAME = "spot_batch"
+
+
+class IngestChannel:
+    """
+    Persistent connection to the backend ingest endpoint
+
+    Each frame gets a sequence number and is held until the backend acks
+    it. At most window frames are in flight; a sender that finds the window
+    full waits up to ack_timeout before the connection is declared dead.
+    When the connection drops, every frame still unacknowledged is handed
+    to the fallback it was sent with (the HTTP path), so nothing is lost.
+    Reconnects are attempted lazily, at most once per reconnect_interval.
+    """
+
+    def __init__(
+        self,
+        base_url: str = None,
+        api_key: str = None,
+        window: int = None,
+        ack_timeout: float = None,
+        reconnect_interval: float = None
+    ):
+        """
+        Initialize the channel (no connection is made until the first send)
+
+        Args:
+            base_url: Backend API URL (http(s) is mapped to ws(s))
+            api_key: Optional API key for authentication
+            window: Maximum unacknowledged frames
+            ack_timeout: Seconds to wait for window space before giving up on the connection
+            reconnect_interval: Minimum seconds between connection attempts
+        """
+        base_url = (base_url or BACKEND_API_URL).rstrip("/")
+        scheme, _, rest = base_url.partition("://")
+        self.url = f"{'wss' if scheme == 'https' else 'ws'}://{rest}/cv/ingest"
+        self.api_key = api_key or BACKEND_API_KEY
+        self.window = window or INGEST_WINDOW
+        self.ack_timeout = ack_timeout or INGEST_ACK_TIMEOUT
+        self.reconnect_interval = reconnect_interval or INGEST_RECONNECT_INTERVAL
+
+        self._connection = None
+        self._receiver: Optional[threading.Thread] = None
+        self._seq = 0
+        self._unacked: Dict[int, Tuple[Dict[str, Any], Callable[[], Any]]] = {}
+        self._lock = threading.Lock()
+        self._window_free = threading.Condition(self._lock)
+        self._last_attempt = 0.0
+        self._available = True
+
+        self.sent = 0
+        self.acked = 0
+        self.rejected = 0
+        self.fallbacks = 0
+        self.bytes_sent = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._connection is not None
+
+    def _connect(self) -> bool:
+        """Open the connection unless an attempt was made too recently"""
+        now = time.monotonic()
+        if not self._available or now - self._last_attempt < self.reconnect_interval:
+            return False
+        self._last_attempt = now
+
+        try:
+            import msgpack
+            from websockets.sync.client import connect
+        except ImportError as e:
+            logger.warning(f"Ingest channel disabled, using HTTP ({e})")
+            self._available = False
+            return False
+
+        headers = {"X-API-Key": self.api_key} if self.api_key else None
+        try:
+            connection = connect(self.url, additional_headers=headers, open_timeout=5, max_size=2 ** 20)
+        except Exception as e:
+            logger.warning(f"Ingest channel {self.url} unavailable, using HTTP: {e}")
+            return False
+
+        self._packb = msgpack.packb
+        self._unpackb = msgpack.unpackb
+        self._connection = connection
+        self._receiver = threading.Thread(
+            target=self._receive_loop, args=(connection,), name="ingest-acks", daemon=True
+        )
+        self._receiver.start()
+        logger.info(f"Ingest channel connected to {self.url}")
+        return True
+
+    def _receive_loop(self, connection):
+        """Release acknowledged frames until the connection ends"""
+        try:
+            for data in connection:
+                ack = self._unpackb(data)
+                with self._lock:
+                    self._unacked.pop(ack.get("ack"), None)
+                    self.acked += 1
+                    self._window_free.notify_all()
+                if ack.get("error"):
+                    # Rejected frames would be rejected over HTTP too: drop them
+                    self.rejected += 1
+                    logger.error(f"Ingest frame #{ack.get('ack')} rejected: {ack['error']}")
+                elif ack.get("not_found"):
+                    logger.warning(f"Unknown spots in batch: {ack['not_found']}")
+        except Exception as e:
+            logger.warning(f"Ingest channel lost: {e}")
+        self._disconnect(connection)
+
+    def _disconnect(self, connection):
+        """Drop a connection and re-deliver its unacknowledged frames over the fallback path"""
+        with self._lock:
+            if self._connection is not connection:
+                return
+            self._connection = None
+            lost = list(self._unacked.values())
+            self._unacked.clear()
+            self._window_free.notify_all()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+        if lost:
+            logger.warning(f"Re-sending {len(lost)} unacknowledged frame(s) over HTTP")
+        for _, fallback in lost:
+            self.fallbacks += 1
+            try:
+                fallback()
+            except Exception as e:
+                logger.error(f"Fallback delivery failed: {e}")
+
+    def send(self, frame: Dict[str, Any], fallback: Callable[[], Any]) -> bool:
+        """
+        Send one frame
+
+        Args:
+            frame: Message body (a "seq" field is added)
+            fallback: Delivers the same update another way if the frame is never acknowledged
+
+        Returns:
+            True if the frame went out on the channel; False means the caller
+            should deliver it itself (fallback is not called in that case)
+        """
+        if self._connection is None and not self._connect():
+            return False
+
+        with self._lock:
+            connection = self._connection
+            if connection is None:
+                return False
+            # Backpressure: a backend that stopped acking must not grow our memory unbounded
+            if not self._window_free.wait_for(
+                lambda: len(self._unacked) < self.window or self._connection is not connection,
+                timeout=self.ack_timeout
+            ):
+                stalled = True
+            else:
+                stalled = False
+                if self._connection is not connection:
+                    return False
+                self._seq += 1
+                frame["seq"] = self._seq
+                data = self._packb(frame)
+                self._unacked[self._seq] = (frame, fallback)
+                try:
+                    connection.send(data)
+                except Exception as e:
+                    logger.warning(f"Ingest send failed: {e}")
+                    self._unacked.pop(self._seq)
+                    stalled = True
+                else:
+                    self.sent += 1
+                    self.bytes_sent += len(data)
+
+        if stalled:
+            logger.warning(f"Ingest channel stalled ({len(self._unacked)} unacknowledged), reconnecting")
+            self._disconnect(connection)
+            return False
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "connected": self.connected,
+            "sent": self.sent,
+            "acked": self.acked,
+            "rejected": self.rejected,
+            "fallbacks": self.fallbacks,
+            "in_flight": len(self._unacked),
+            "bytes_sent": self.bytes_sent
+        }
+
+    def close(self):
+        """Close the connection, waiting briefly for outstanding acks"""
+        connection = self._connection
+        if connection is None:
+            return
+        with self._lock:
+            self._window_free.wait_for(lambda: not self._unacked, timeout=self.ack_timeout)
+        self._disconnect(connection)
+        if self._receiver is not None:
+            self._receiver.join(timeout=2)
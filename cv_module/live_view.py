@@ -0,0 +1,300 @@
+"""
+Live annotated MJPEG view for operators
+Per-camera HTTP streams rendered only while someone is watching
+"""
+import re
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import LIVE_VIEW_HOST, LIVE_VIEW_JPEG_QUALITY, LIVE_VIEW_MAX_FPS, LIVE_VIEW_SNAPSHOT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+BOUNDARY = "parkvisionframe"
+
+
+def draw_detections(image: np.ndarray, detections, summary: Dict[str, Any] = None) -> np.ndarray:
+    """
+    Draw detection boxes and the lot summary onto an image in place
+
+    Args:
+        image: BGR image
+        detections: DetectionBatch or list of Detection objects
+        summary: Lot summary for the header line (optional)
+
+    Returns:
+        The same image
+    """
+    for det in detections:
+        # Calculate bounding box corners
+        x1 = int(det.x - det.width / 2)
+        y1 = int(det.y - det.height / 2)
+        x2 = int(det.x + det.width / 2)
+        y2 = int(det.y + det.height / 2)
+
+        # Color based on status (green=empty, red=occupied)
+        color = (0, 255, 0) if det.is_empty else (0, 0, 255)
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, 2)
+
+        label = f"{det.class_name} ({det.confidence:.2f})"
+        cv2.putText(image, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+    if summary:
+        summary_text = f"Empty: {summary['empty']} | Occupied: {summary['occupied']} | Total: {summary['total']}"
+        cv2.putText(image, summary_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    return image
+
+
+class LiveFeed:
+    """
+    Latest annotated frame of one camera, shared by all of its viewers
+
+    publish() returns immediately while nobody watches, so an idle camera
+    pays nothing. With viewers, it keeps a copy of the raw frame and its
+    detections; drawing and JPEG encoding happen lazily in the first
+    viewer thread that asks for the new frame, and every other viewer
+    gets the same encoded bytes.
+    """
+
+    def __init__(self, camera_id: int, jpeg_quality: int = None, max_fps: float = None):
+        """
+        Initialize the feed
+
+        Args:
+            camera_id: Camera this feed belongs to
+            jpeg_quality: JPEG quality 1-100 (default: LIVE_VIEW_JPEG_QUALITY)
+            max_fps: Frames accepted per second while watched (default: LIVE_VIEW_MAX_FPS)
+        """
+        self.camera_id = camera_id
+        self._params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality or LIVE_VIEW_JPEG_QUALITY]
+        self.min_period = 1.0 / (max_fps or LIVE_VIEW_MAX_FPS)
+
+        self._cond = threading.Condition()
+        self._viewers = 0
+        self._version = 0
+        self._frame: Optional[np.ndarray] = None
+        self._detections = None
+        self._summary = None
+        self._published_at = 0.0
+        self._rendering = False
+        self._jpeg: Optional[bytes] = None
+        self._jpeg_version = 0
+
+        self.published = 0
+        self.rendered = 0
+        self.encode_seconds = 0.0
+        self.last_encode_ms = 0.0
+
+    @property
+    def viewers(self) -> int:
+        return self._viewers
+
+    @contextmanager
+    def viewer(self):
+        """Register a viewer for the duration of the block"""
+        with self._cond:
+            self._viewers += 1
+        logger.info(f"Camera {self.camera_id}: viewer connected ({self._viewers} watching)")
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self._viewers -= 1
+                if not self._viewers:
+                    # Nobody left: release the frame instead of holding it until the next viewer
+                    self._frame = self._detections = self._jpeg = None
+            logger.info(f"Camera {self.camera_id}: viewer disconnected ({self._viewers} watching)")
+
+    def publish(self, frame: np.ndarray, detections, summary: Dict[str, Any] = None):
+        """
+        Offer a processed frame to the viewers
+
+        Args:
+            frame: BGR frame (copied only if someone is watching)
+            detections: Detections to draw on it
+            summary: Lot summary for the header line
+        """
+        if not self._viewers:
+            return
+        now = time.monotonic()
+        if now - self._published_at < self.min_period:
+            return
+        # Capture buffers are reused by the grabber: keep our own copy
+        frame = frame.copy()
+        with self._cond:
+            self._frame, self._detections, self._summary = frame, detections, summary
+            self._published_at = now
+            self._version += 1
+            self.published += 1
+            self._cond.notify_all()
+
+    def _render(self, frame: np.ndarray, detections, summary) -> bytes:
+        started = time.perf_counter()
+        if detections is not None:
+            draw_detections(frame, detections, summary)
+        ok, jpeg = cv2.imencode(".jpg", frame, self._params)
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        elapsed = time.perf_counter() - started
+        self.rendered += 1
+        self.encode_seconds += elapsed
+        self.last_encode_ms = elapsed * 1000
+        return jpeg.tobytes()
+
+    def next_jpeg(self, after: int, timeout: float = 5.0) -> Tuple[int, Optional[bytes]]:
+        """
+        Wait for a frame newer than version after and return it encoded
+
+        Returns:
+            (version, JPEG bytes), or (after, None) on timeout
+        """
+        with self._cond:
+            # A feed that went idle dropped its frame: wait for the next one
+            if not self._cond.wait_for(lambda: self._version > after and self._frame is not None, timeout):
+                return after, None
+            while self._jpeg_version != self._version:
+                if self._rendering:
+                    # Another viewer is encoding this frame; share its result
+                    self._cond.wait(timeout)
+                    continue
+                self._rendering = True
+                version, frame, detections, summary = self._version, self._frame, self._detections, self._summary
+                self._cond.release()
+                try:
+                    jpeg = self._render(frame, detections, summary)
+                finally:
+                    self._cond.acquire()
+                    self._rendering = False
+                    self._cond.notify_all()
+                self._jpeg, self._jpeg_version = jpeg, version
+            return self._jpeg_version, self._jpeg
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "viewers": self._viewers,
+            "published": self.published,
+            "rendered": self.rendered,
+            "encode_ms_avg": self.encode_seconds * 1000 / self.rendered if self.rendered else 0.0,
+            "encode_ms_last": self.last_encode_ms
+        }
+
+
+class _LiveViewHandler(BaseHTTPRequestHandler):
+    """Routes: /cameras/<id>.mjpg (stream), /cameras/<id>.jpg (snapshot), /stats"""
+
+    server: "LiveViewServer"
+    route = re.compile(r"^/cameras/(\d+)\.(mjpg|jpg)$")
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/stats":
+            body = json.dumps(self.server.stats()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        match = self.route.match(path)
+        feed = self.server.feeds.get(int(match.group(1))) if match else None
+        if feed is None:
+            self.send_error(404, "Unknown camera")
+            return
+        if match.group(2) == "jpg":
+            self._snapshot(feed)
+        else:
+            self._stream(feed)
+
+    def _snapshot(self, feed: LiveFeed):
+        # Nothing is kept while nobody watches: wait for the camera's next processed frame
+        with feed.viewer():
+            _, jpeg = feed.next_jpeg(0, timeout=self.server.snapshot_timeout)
+        if jpeg is None:
+            self.send_error(503, "No frame available")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(jpeg)))
+        self.end_headers()
+        self.wfile.write(jpeg)
+
+    def _stream(self, feed: LiveFeed):
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-cache, private")
+        self.send_header("Pragma", "no-cache")
+        self.end_headers()
+
+        version = 0
+        with feed.viewer():
+            try:
+                while not self.server.closing:
+                    version, jpeg = feed.next_jpeg(version)
+                    if jpeg is None:
+                        continue
+                    self.wfile.write(
+                        f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode()
+                    )
+                    self.wfile.write(jpeg)
+                    self.wfile.write(b"\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+
+class LiveViewServer(ThreadingHTTPServer):
+    """
+    HTTP server for the live feeds of all cameras in this process
+
+    Runs on a background thread; each connected viewer holds one handler
+    thread. There is no authentication, so it binds to localhost unless
+    told otherwise.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port: int, host: str = None, snapshot_timeout: float = None):
+        """
+        Initialize the server (call start() to begin serving)
+
+        Args:
+            port: TCP port to listen on
+            host: Interface to bind (default: LIVE_VIEW_HOST)
+            snapshot_timeout: Seconds a snapshot waits for the next frame (default: LIVE_VIEW_SNAPSHOT_TIMEOUT)
+        """
+        super().__init__((host or LIVE_VIEW_HOST, port), _LiveViewHandler)
+        self.snapshot_timeout = LIVE_VIEW_SNAPSHOT_TIMEOUT if snapshot_timeout is None else snapshot_timeout
+        self.feeds: Dict[int, LiveFeed] = {}
+        self.closing = False
+        self._thread: Optional[threading.Thread] = None
+
+    def feed(self, camera_id: int) -> LiveFeed:
+        """The feed of a camera, created on first use"""
+        feed = self.feeds.get(camera_id)
+        if feed is None:
+            feed = self.feeds[camera_id] = LiveFeed(camera_id)
+        return feed
+
+    def stats(self) -> Dict[int, Dict[str, Any]]:
+        return {camera_id: feed.stats() for camera_id, feed in self.feeds.items()}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="live-view", daemon=True)
+        self._thread.start()
+        logger.info(f"Live view on http://{self.server_address[0]}:{self.server_address[1]}/cameras/<id>.mjpg")
+
+    def stop(self):
+        self.closing = True
+        self.shutdown()
+        self.server_close()
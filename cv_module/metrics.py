@@ -0,0 +1,357 @@
+"""
+Prometheus metrics for the CV processor
+Cheap in-process counters and histograms, rendered in the text exposition format only when scraped
+"""
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers sub-millisecond gating up to slow remote inference
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """A named metric family with one child per label combination"""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: "Registry" = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Child for one label combination (resolve once, keep it for the hot path)"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def remove(self, *values):
+        """Drop a label combination (e.g. a camera that left the fleet)"""
+        with self._lock:
+            self._children.pop(tuple(str(v) for v in values), None)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines += self._samples()
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in list(self._children.items())
+        ]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value from function at scrape time (costs nothing between scrapes)"""
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def _samples(self) -> List[str]:
+        samples = []
+        for key, child in list(self._children.items()):
+            try:
+                value = child.get()
+            except Exception as e:
+                logger.debug(f"Gauge {self.name}{key} unavailable: {e}")
+                continue
+            samples.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return samples
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of the block in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed buckets"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        registry: "Registry" = None
+    ):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def _samples(self) -> List[str]:
+        samples = []
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                samples.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            samples.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            samples.append(f"{self.name}_count{labels} {cumulative}")
+        return samples
+
+
+class Registry:
+    """The metric families exposed by one endpoint"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+# Per-camera processing
+STAGE_SECONDS = Histogram(
+    "parkvision_stage_seconds", "Time spent per processing stage", ["camera", "stage"]
+)
+FRAME_AGE_SECONDS = Histogram(
+    "parkvision_frame_age_seconds", "Capture to processed result latency", ["camera"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+FRAMES_TOTAL = Counter(
+    "parkvision_frames_total", "Frames handled, by outcome (processed, gated, classified, error)", ["camera", "outcome"]
+)
+INFERENCE_TOTAL = Counter(
+    "parkvision_inference_total", "Inference calls, by result (ok, error)", ["camera", "result"]
+)
+QUEUE_DEPTH = Gauge(
+    "parkvision_queue_depth", "Items waiting in a processing queue", ["camera", "queue"]
+)
+PAYLOAD_BYTES = Histogram(
+    "parkvision_inference_payload_bytes", "Bytes handed to the inference engine per frame, tiles included",
+    ["camera"], buckets=(8192, 16384, 32768, 65536, 131072, 262144, 524288, 1048576, 2097152, 4194304)
+)
+
+# Backend client
+BACKEND_REQUEST_SECONDS = Histogram(
+    "parkvision_backend_request_seconds", "Backend API request time, retries included", ["endpoint"]
+)
+BACKEND_REQUESTS_TOTAL = Counter(
+    "parkvision_backend_requests_total", "Backend API requests, by status class (2xx ... 5xx, error)",
+    ["endpoint", "status"]
+)
+BACKEND_QUEUE_DEPTH = Gauge(
+    "parkvision_backend_queue_depth", "Updates waiting to be delivered to the backend", ["queue"]
+)
+
+# Remote inference dispatcher
+DISPATCH_CALLS_TOTAL = Counter(
+    "parkvision_dispatch_calls_total", "Dispatched inference calls, by result (ok, error, deadline)", ["result"]
+)
+DISPATCH_ATTEMPT_SECONDS = Histogram(
+    "parkvision_dispatch_attempt_seconds", "Remote inference request time, by attempt (primary, hedge)", ["attempt"]
+)
+DISPATCH_THROTTLE_SECONDS = Histogram(
+    "parkvision_dispatch_throttle_seconds", "Time calls waited for a rate limit token"
+)
+DISPATCH_HEDGES_TOTAL = Counter(
+    "parkvision_dispatch_hedges_total", "Hedged attempts, by whether they answered first (won, lost)", ["outcome"]
+)
+DISPATCH_IN_FLIGHT = Gauge(
+    "parkvision_dispatch_in_flight", "Inference calls submitted and not finished"
+)
+
+# Multi-process fleet
+SHARD_RESTARTS_TOTAL = Counter(
+    "parkvision_shard_restarts_total", "Capture and processing worker process restarts", ["worker"]
+)
+RING_FRAMES = Gauge(
+    "parkvision_ring_frames", "Frames through a camera's shared-memory ring (written, dropped)", ["camera", "state"]
+)
+
+
+class CameraMetrics:
+    """Label-resolved metric children of one camera, so the hot path does no lookups"""
+
+    STAGES = ("capture", "gate", "classify", "encode", "infer", "match", "publish")
+
+    def __init__(self, camera_id):
+        self.camera = str(camera_id)
+        self._stages = {stage: STAGE_SECONDS.labels(self.camera, stage) for stage in self.STAGES}
+        self._frame_age = FRAME_AGE_SECONDS.labels(self.camera)
+        self._frames = {outcome: FRAMES_TOTAL.labels(self.camera, outcome) for outcome in ("processed", "gated", "classified", "error")}
+        self._inference = {result: INFERENCE_TOTAL.labels(self.camera, result) for result in ("ok", "error")}
+        self._payload_bytes = PAYLOAD_BYTES.labels(self.camera)
+
+    def stage(self, name: str):
+        """Context manager timing one stage"""
+        return self._stages[name].time()
+
+    def observe_stage(self, name: str, seconds: float):
+        self._stages[name].observe(seconds)
+
+    def decoded(self, seconds: float):
+        """Capture stage: grab and decode time only, not the wait for the next sampled frame"""
+        self._stages["capture"].observe(seconds)
+
+    def frame(self, outcome: str, captured_at: float = None):
+        """Count a finished frame and, when known, its age"""
+        self._frames[outcome].inc()
+        if captured_at:
+            self._frame_age.observe(time.time() - captured_at)
+
+    def inference(self, ok: bool):
+        self._inference["ok" if ok else "error"].inc()
+
+    def payload(self, nbytes: int):
+        self._payload_bytes.observe(nbytes)
+
+    def queue(self, name: str, depth: Callable[[], float]):
+        """Report a queue's depth, read only when scraped"""
+        QUEUE_DEPTH.labels(self.camera, name).set_function(depth)
+
+    def remove_queue(self, name: str):
+        QUEUE_DEPTH.remove(self.camera, name)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    server: "MetricsServer"
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Serves /metrics on a background thread"""
+
+    daemon_threads = True
+
+    def __init__(self, port: int, host: str = "0.0.0.0", registry: Registry = None):
+        super().__init__((host, port), _MetricsHandler)
+        self.registry = registry or REGISTRY
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        logger.info(f"Metrics on http://{self.server_address[0]}:{self.server_address[1]}/metrics")
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
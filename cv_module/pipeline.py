@@ -0,0 +1,330 @@
+"""
+ParkVision Async CV Pipeline
+Capture -> encode -> infer -> diff -> publish as overlapping asyncio stages
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from dataclasses import dataclass, field
+
+from config import (
+    PROCESSING_INTERVAL,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_INFER_WORKERS,
+    PIPELINE_REPORT_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FrameItem:
+    """A sampled frame travelling through the pipeline"""
+    seq: int
+    captured_at: float
+    frame: Any = None
+    payload: Any = None
+    detections: Any = None
+    spot_features: Any = None
+    summary: Optional[Dict] = None
+    status_changed: bool = False
+    spot_changes: List = field(default_factory=list)
+
+
+class DropOldestQueue(asyncio.Queue):
+    """
+    Bounded queue that never blocks producers
+
+    When full, the oldest item is discarded to make room: a newer frame
+    always supersedes an older one that has not been processed yet. In
+    lossless mode (replays) producers wait instead, so no frame is lost.
+    """
+
+    def __init__(self, name: str, maxsize: int, lossless: bool = False):
+        super().__init__(maxsize=maxsize)
+        self.name = name
+        self.lossless = lossless
+        self.dropped = 0
+
+    def put_latest(self, item):
+        """
+        Enqueue an item, dropping the oldest one if the queue is full
+
+        Returns:
+            The dropped item, or None
+        """
+        dropped = None
+        if self.full():
+            dropped = self.get_nowait()
+            self.task_done()
+            self.dropped += 1
+        self.put_nowait(item)
+        return dropped
+
+    async def offer(self, item):
+        """
+        Enqueue an item: waits for room in lossless mode, otherwise put_latest()
+
+        Returns:
+            The dropped item, or None
+        """
+        if self.lossless:
+            await self.put(item)
+            return None
+        return self.put_latest(item)
+
+
+class CVPipeline:
+    """
+    Staged detection pipeline for one camera
+
+    Each stage runs as its own task and hands work to the next through a
+    bounded drop-oldest queue, so a slow backend only delays publishing
+    instead of the capture/inference loop. Blocking OpenCV, inference and
+    HTTP calls are offloaded to threads.
+    """
+
+    def __init__(
+        self,
+        processor,
+        streamer,
+        interval: float = None,
+        queue_size: int = None,
+        infer_workers: int = None,
+        lossless: bool = False
+    ):
+        """
+        Initialize the pipeline
+
+        Args:
+            processor: ParkingProcessor providing the detector, API client and lot id
+            streamer: VideoStreamer to sample frames from
+            interval: Seconds between sampled frames
+            queue_size: Capacity of each inter-stage queue
+            infer_workers: Number of concurrent inference tasks
+            lossless: Block on full queues instead of dropping frames (for replays)
+        """
+        self.processor = processor
+        self.streamer = streamer
+        self.interval = PROCESSING_INTERVAL if interval is None else interval
+        self.queue_size = queue_size or PIPELINE_QUEUE_SIZE
+        self.infer_workers = infer_workers or PIPELINE_INFER_WORKERS
+        self.lossless = lossless
+
+        self.queues: Dict[str, DropOldestQueue] = {}
+        self.counters: Dict[str, int] = {
+            "captured": 0, "gated": 0, "classified": 0, "encoded": 0, "encode_failed": 0,
+            "inferred": 0, "unchanged": 0, "stale": 0, "published": 0
+        }
+        self.running = False
+        self._last_seq = -1
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Current number of items waiting in each queue"""
+        return {name: q.qsize() for name, q in self.queues.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        """Stage counters, queue depths and drops"""
+        return {
+            "counters": dict(self.counters),
+            "queue_depths": self.queue_depths(),
+            "queue_dropped": {name: q.dropped for name, q in self.queues.items()},
+            "frames_dropped_at_capture": self.streamer.dropped_frames,
+            "frames_skipped_undecoded": self.streamer.skipped_frames
+        }
+
+    async def _capture(self, max_frames: int = None):
+        gate = self.processor.gate
+        metrics = self.processor.metrics
+        seq = 0
+        while self.running:
+            started = time.monotonic()
+            frame, captured_at = await asyncio.to_thread(self.streamer.read_latest, 1.0)
+            if frame is None:
+                if self.streamer.finished:
+                    logger.info("Video source exhausted")
+                    self.running = False
+                    break
+                continue
+
+            self.counters["captured"] += 1
+            # Live view shows every captured frame with the newest detections available
+            self.processor.show_frame(frame)
+            if gate is not None and not self._gate(frame):
+                # Static scene: previous detections still hold
+                self.counters["gated"] += 1
+                metrics.frame("gated", captured_at)
+            else:
+                skip, features = self.processor.screen_spots(frame, captured_at)
+                if skip:
+                    # Every spot confidently unchanged
+                    self.counters["classified"] += 1
+                else:
+                    # The grabber reuses its buffers; the pipeline needs its own copy
+                    await self.queues["encode"].offer(FrameItem(
+                        seq=seq, captured_at=captured_at, frame=frame.copy(), spot_features=features
+                    ))
+            seq += 1
+            if max_frames and seq >= max_frames:
+                break
+
+            delay = self.interval - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    def _gate(self, frame) -> bool:
+        with self.processor.metrics.stage("gate"):
+            return self.processor.gate.should_infer(frame)
+
+    async def _encode(self):
+        processor = self.processor
+        while True:
+            item = await self.queues["encode"].get()
+            if processor.replay is None:
+                try:
+                    item.payload = await asyncio.to_thread(processor.encode_frame, item.frame)
+                except Exception as e:
+                    # A frame that cannot be encoded is dropped; the stage keeps serving the queue
+                    logger.error(f"Frame encoding failed: {e}")
+                    processor.metrics.frame("error", item.captured_at)
+                    self.counters["encode_failed"] += 1
+                    self.queues["encode"].task_done()
+                    continue
+            if processor.recorder is None:
+                item.frame = None
+            # Done only once handed on, so draining the queues in order loses nothing
+            await self.queues["infer"].offer(item)
+            self.queues["encode"].task_done()
+            self.counters["encoded"] += 1
+
+    async def _infer(self):
+        processor = self.processor
+        detector = processor.detector
+        metrics = processor.metrics
+        while True:
+            item = await self.queues["infer"].get()
+            try:
+                with metrics.stage("infer"):
+                    if processor.replay is not None:
+                        raw = processor.replay.detections(item.captured_at)
+                    else:
+                        raw = await asyncio.to_thread(detector.predict_prepared, item.payload, processor.camera_id)
+                metrics.inference(ok=True)
+                if item.frame is not None:
+                    processor.record(item.frame, item.captured_at, raw)
+            except Exception as e:
+                # No result is not an empty lot: drop the frame
+                processor.inference_failed(e, item.captured_at)
+                self.queues["infer"].task_done()
+                continue
+            item.detections = raw.filter_confidence(detector.confidence_threshold)
+            item.frame = item.payload = None
+            await self.queues["diff"].offer(item)
+            self.queues["infer"].task_done()
+            self.counters["inferred"] += 1
+
+    async def _diff(self):
+        while True:
+            item = await self.queues["diff"].get()
+            try:
+                await self._diff_item(item)
+            finally:
+                self.queues["diff"].task_done()
+
+    async def _diff_item(self, item: FrameItem):
+        """Match one frame's detections and queue its changes for publishing"""
+        # Concurrent inference can finish out of order; never publish an older frame
+        if item.seq <= self._last_seq:
+            self.counters["stale"] += 1
+            return
+        self._last_seq = item.seq
+
+        with self.processor.metrics.stage("match"):
+            item.spot_changes = self.processor._spot_changes(item.detections, item.spot_features)
+            item.summary = self.processor._summarize(item.detections)
+        self.processor.metrics.frame("processed", item.captured_at)
+        self.processor.last_detections, self.processor.last_summary = item.detections, item.summary
+        item.spot_features = None
+        item.status_changed = self.processor._status_changed(item.summary)
+        if not item.status_changed and not item.spot_changes:
+            self.counters["unchanged"] += 1
+            return
+        if item.status_changed:
+            self.processor.last_status = item.summary
+
+        # A dropped publish must not lose its changes: the diff state already moved on
+        dropped = await self.queues["publish"].offer(item)
+        if dropped is not None:
+            item.status_changed = item.status_changed or dropped.status_changed
+            newer = {change[0] for change in item.spot_changes}
+            item.spot_changes = [c for c in dropped.spot_changes if c[0] not in newer] + item.spot_changes
+
+    async def _publish(self):
+        processor = self.processor
+        while True:
+            item = await self.queues["publish"].get()
+            summary = item.summary
+            with processor.metrics.stage("publish"):
+                if item.status_changed:
+                    await asyncio.to_thread(
+                        processor.api_client.publish_lot_status,
+                        processor.parking_lot_id,
+                        item.detections,
+                        summary,
+                        observed_at=item.captured_at
+                    )
+                if item.spot_changes:
+                    await asyncio.to_thread(processor._publish_spot_changes, item.spot_changes, item.captured_at)
+            self.queues["publish"].task_done()
+            self.counters["published"] += 1
+            logger.debug(f"Published frame {item.seq}, end-to-end {time.time() - item.captured_at:.2f}s")
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(PIPELINE_REPORT_INTERVAL)
+            stats = self.stats()
+            logger.info(f"Pipeline counters: {stats['counters']}, queue depths: {stats['queue_depths']}, "
+                        f"queue drops: {stats['queue_dropped']}")
+
+    async def run(self, max_frames: int = None):
+        """
+        Run all stages until the source ends, max_frames are captured or stop() is called
+
+        Args:
+            max_frames: Maximum number of frames to capture (None for infinite)
+        """
+        self.queues = {
+            name: DropOldestQueue(name, self.queue_size, self.lossless)
+            for name in ("encode", "infer", "diff", "publish")
+        }
+        for name, queue in self.queues.items():
+            self.processor.metrics.queue(name, queue.qsize)
+        self.running = True
+
+        workers = [
+            asyncio.create_task(self._encode()),
+            asyncio.create_task(self._diff()),
+            asyncio.create_task(self._publish()),
+            asyncio.create_task(self._report()),
+        ]
+        workers += [asyncio.create_task(self._infer()) for _ in range(self.infer_workers)]
+
+        try:
+            await self._capture(max_frames)
+            # Let in-flight frames drain through the remaining stages
+            for name in ("encode", "infer", "diff", "publish"):
+                await self.queues[name].join()
+        finally:
+            self.running = False
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            for name in self.queues:
+                self.processor.metrics.remove_queue(name)
+
+        logger.info(f"Pipeline finished: {self.stats()}")
+
+    def stop(self):
+        """Ask the capture stage to stop; queued frames still drain"""
+        self.running = False
@@ -0,0 +1,404 @@
+"""
+ParkVision Pipeline Benchmark
+Offline throughput, per-stage latency and memory of the CV processor against local fake services
+
+Usage:
+    python pipeline_benchmark.py --images ../parkresim --modes image video fleet --latency-ms 80 --json bench.json
+    python pipeline_benchmark.py --images ../parkresim --record ../parkresim/predictions.json
+"""
+import os
+
+# Runs are isolated from the host and reproducible: no cache hits, no spool
+# files, HTTP-only backend, fixed fleet intervals and every frame decoded
+# (capture decimation would otherwise cap what is measured)
+os.environ.setdefault("INFERENCE_CACHE_ENABLED", "false")
+os.environ.setdefault("SPOOL_ENABLED", "false")
+os.environ.setdefault("INGEST_ENABLED", "false")
+os.environ.setdefault("SCHEDULER_ADAPTIVE", "false")
+os.environ.setdefault("CAPTURE_TARGET_FPS", "0")
+
+import sys
+import json
+import math
+import time
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import functools
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+import cv2
+import numpy as np
+
+from config import CAPTURE_TARGET_FPS, LOG_LEVEL
+from backends import RoboflowBackend, create_backend
+from detector import ParkingDetector
+from dispatcher import InferenceDispatcher
+from api_client import BackendClient
+from streamer import VideoStreamer
+from spots import load_spot_layout
+from processor import ParkingProcessor, FleetProcessor, CameraConfig
+from batch import find_images
+from benchmark import summarize_latencies
+from fakes import FakeInferenceServer, FakeBackendServer, record_predictions
+
+logging.basicConfig(
+    level=getattr(logging, LOG_LEVEL),
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+VIDEO_FPS = 25.0
+
+
+def latency_percentiles(samples: List[float]) -> Dict[str, float]:
+    """Latency distribution of one stage in milliseconds"""
+    values = np.asarray(samples) * 1000.0
+    p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99]).tolist()
+    return {
+        "count": len(samples),
+        "mean_ms": float(values.mean()),
+        "p50_ms": p50,
+        "p90_ms": p90,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "max_ms": float(values.max())
+    }
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the process so far in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimer:
+    """Collects per-stage durations by wrapping methods of live pipeline objects"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.samples = defaultdict(list)
+
+    def wrap(self, obj: Any, attr: str, stage: str):
+        """Time every call of obj.attr (instance-level, the class is left alone)"""
+        method = getattr(obj, attr)
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+
+        setattr(obj, attr, timed)
+
+    def wrap_frames(self, processor: ParkingProcessor):
+        """Time process_frame and the capture-to-result age of each frame"""
+        method = processor.process_frame
+
+        @functools.wraps(method)
+        def timed(frame, captured_at: float = None):
+            started = time.perf_counter()
+            try:
+                return method(frame, captured_at)
+            finally:
+                self.record("frame", time.perf_counter() - started)
+                if captured_at:
+                    self.record("frame_age", time.time() - captured_at)
+
+        processor.process_frame = timed
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {stage: latency_percentiles(samples) for stage, samples in self.samples.items() if samples}
+
+
+def instrument(timer: StageTimer, detector: ParkingDetector, api_client: BackendClient):
+    """Wrap the stages shared by every processor of a run"""
+    timer.wrap(detector.backend, "prepare", "encode")
+    timer.wrap(detector.backend, "_infer_base64", "infer")
+    timer.wrap(api_client, "publish_lot_status", "publish")
+    timer.wrap(api_client, "update_spot_statuses", "publish_spots")
+
+
+def instrument_processor(timer: StageTimer, processor: ParkingProcessor):
+    """Wrap the per-camera stages of a processor"""
+    timer.wrap(processor, "_spot_changes", "match")
+    if processor.gate is not None:
+        timer.wrap(processor.gate, "should_infer", "gate")
+    timer.wrap_frames(processor)
+
+
+def write_video(image_paths: List[str], path: str, hold: int, min_seconds: float = 0.0) -> int:
+    """
+    Build a test video from still images
+
+    Each image is held for hold frames (so gating sees static scenes) and the
+    sequence repeats until the video lasts at least min_seconds.
+
+    Returns:
+        Number of frames written
+    """
+    frames = [cv2.imread(p) for p in image_paths]
+    height, width = frames[0].shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), VIDEO_FPS, (width, height))
+    cycles = max(1, math.ceil(min_seconds * VIDEO_FPS / (hold * len(frames))))
+    written = 0
+    for _ in range(cycles):
+        for frame in frames:
+            if frame.shape[:2] != (height, width):
+                frame = cv2.resize(frame, (width, height))
+            for _ in range(hold):
+                writer.write(frame)
+                written += 1
+    writer.release()
+    return written
+
+
+def measure(run: Callable[[], Dict[str, Any]], timer: StageTimer, trace_memory: bool) -> Dict[str, Any]:
+    """Run one mode and attach its stage latencies and memory use"""
+    timer.reset()
+    if trace_memory:
+        tracemalloc.start()
+    rss_start = rss_mb()
+    result = run()
+    result["stages"] = timer.summary()
+    result["memory"] = {"rss_mb_start": rss_start, "rss_mb_end": rss_mb(), "rss_mb_peak": peak_rss_mb()}
+    if trace_memory:
+        result["memory"]["python_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result
+
+
+def bench_image(processor: ParkingProcessor, image_paths: List[str], iterations: int, warmup: int,
+                timer: StageTimer) -> Dict[str, Any]:
+    """process_image() over the image set"""
+    for _ in range(warmup):
+        for path in image_paths:
+            processor.process_image(path)
+    timer.reset()
+
+    latencies = []
+    for _ in range(iterations):
+        for path in image_paths:
+            started = time.perf_counter()
+            processor.process_image(path)
+            latencies.append(time.perf_counter() - started)
+    return {"throughput": summarize_latencies(latencies)}
+
+
+def bench_video(processor: ParkingProcessor, video_path: str, timer: StageTimer) -> Dict[str, Any]:
+    """Decode and process every frame of a video as fast as possible"""
+    streamer = VideoStreamer(video_path, threaded=False, target_fps=0)
+    timer.wrap(streamer, "get_frame", "capture")
+    frames = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            frame = streamer.get_frame()
+            if frame is None:
+                break
+            processor.process_frame(frame, streamer.last_timestamp)
+            frames += 1
+    finally:
+        streamer.release()
+        processor.api_client.flush()
+    elapsed = time.perf_counter() - started
+    return {
+        "frames": frames,
+        "elapsed_s": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "gate_skipped": processor.gate.skipped if processor.gate else 0
+    }
+
+
+def bench_fleet(fleet: FleetProcessor, duration: float) -> Dict[str, Any]:
+    """Run a fleet of cameras for a fixed time"""
+    started = time.perf_counter()
+    fleet.run(duration=duration)
+    elapsed = time.perf_counter() - started
+    frames = sum(stats.frames for stats in fleet.stats.values())
+    captured = sum(streamer.captured_frames for streamer in fleet.streamers.values())
+    return {
+        "cameras": len(fleet.cameras),
+        "workers": fleet.workers,
+        "elapsed_s": elapsed,
+        "frames": frames,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "capture_fps": captured / elapsed if elapsed > 0 else 0.0,
+        "errors": sum(stats.errors for stats in fleet.stats.values()),
+        "per_camera_frames": {cid: stats.frames for cid, stats in fleet.stats.items()}
+    }
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="ParkVision offline pipeline benchmark")
+    parser.add_argument("--images", "-i", type=str, default="../parkresim",
+                        help="Image directory, glob pattern or file")
+    parser.add_argument("--modes", nargs="+", choices=["image", "video", "fleet"], default=["image", "video", "fleet"],
+                        help="Processor modes to measure")
+    parser.add_argument("--recording", type=str, help="Recorded predictions to replay (default: synthetic)")
+    parser.add_argument("--record", type=str,
+                        help="Record predictions of the configured real backend to this file and exit")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fake inference service time")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Random extra inference service time")
+    parser.add_argument("--backend-latency-ms", type=float, default=2.0, help="Fake backend service time")
+    parser.add_argument("--iterations", "-n", type=int, default=5, help="Image mode: measured passes")
+    parser.add_argument("--warmup", type=int, default=1, help="Image mode: unmeasured passes")
+    parser.add_argument("--hold", type=int, default=10, help="Video frames per still image")
+    parser.add_argument("--cameras", type=int, default=4, help="Fleet mode: number of cameras")
+    parser.add_argument("--workers", "-w", type=int, default=4, help="Fleet mode: worker pool size")
+    parser.add_argument("--interval", type=float, default=0.1, help="Fleet mode: seconds between frames per camera")
+    parser.add_argument("--duration", type=float, default=10.0, help="Fleet mode: seconds to run")
+    parser.add_argument("--dispatch", type=int, default=0,
+                        help="Fleet mode: concurrent inference calls through the dispatcher (0 = call from workers)")
+    parser.add_argument("--dispatch-rate", type=float, default=0.0,
+                        help="Fleet mode: dispatcher quota in calls/sec (0 = unlimited)")
+    parser.add_argument("--calibration", type=str, help="Spot ROI calibration JSON (enables per-spot stages)")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report peak Python allocations per mode")
+    parser.add_argument("--json", type=str, help="Write results as JSON to this path (default: stdout)")
+
+    args = parser.parse_args()
+
+    image_paths = find_images(args.images)
+    if not image_paths:
+        logger.error(f"No images found at: {args.images}")
+        sys.exit(1)
+
+    if args.record:
+        record_predictions(image_paths, create_backend("roboflow"), args.record)
+        logger.info(f"Saved recording of {len(image_paths)} images to: {args.record}")
+        return
+
+    recording = None
+    if args.recording:
+        with open(args.recording) as f:
+            recording = json.load(f)
+
+    inference = FakeInferenceServer(image_paths, recording, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    backend = FakeBackendServer(latency_ms=args.backend_latency_ms)
+    inference.start()
+    backend.start()
+    workdir = tempfile.TemporaryDirectory(prefix="parkvision-bench-")
+    timer = StageTimer()
+    spot_layout = load_spot_layout(path=args.calibration) if args.calibration else None
+
+    def make_shared(pool_size: int, dispatch: int = 0):
+        if dispatch:
+            inference_backend = RoboflowBackend(api_url=inference.url, pool_size=dispatch)
+            dispatcher = InferenceDispatcher(inference_backend, concurrency=dispatch, rate=args.dispatch_rate)
+            detector = ParkingDetector(backend=inference_backend, dispatcher=dispatcher)
+        else:
+            detector = ParkingDetector(backend=RoboflowBackend(api_url=inference.url, pool_size=pool_size))
+        api_client = BackendClient(base_url=backend.url, pool_size=pool_size)
+        instrument(timer, detector, api_client)
+        return detector, api_client
+
+    def make_processor(parking_lot_id: int = 1) -> ParkingProcessor:
+        detector, api_client = make_shared(pool_size=1)
+        processor = ParkingProcessor(
+            parking_lot_id=parking_lot_id, detector=detector, api_client=api_client, spot_layout=spot_layout
+        )
+        instrument_processor(timer, processor)
+        return processor
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__
+        },
+        "config": {
+            "images": len(image_paths),
+            "recorded": recording is not None,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "backend_latency_ms": args.backend_latency_ms,
+            "dispatch": args.dispatch,
+            "dispatch_rate": args.dispatch_rate,
+            "capture_target_fps": CAPTURE_TARGET_FPS
+        },
+        "modes": {}
+    }
+
+    try:
+        if "image" in args.modes:
+            logger.info(f"Benchmarking image mode: {args.iterations} passes over {len(image_paths)} images")
+            processor = make_processor()
+            report["modes"]["image"] = measure(
+                lambda: bench_image(processor, image_paths, args.iterations, args.warmup, timer),
+                timer, args.tracemalloc
+            )
+            processor.api_client.close()
+
+        if "video" in args.modes:
+            video_path = os.path.join(workdir.name, "video.avi")
+            frames = write_video(image_paths, video_path, args.hold)
+            logger.info(f"Benchmarking video mode: {frames} frames")
+            processor = make_processor()
+            report["modes"]["video"] = measure(lambda: bench_video(processor, video_path, timer), timer, args.tracemalloc)
+            processor.api_client.close()
+
+        if "fleet" in args.modes:
+            video_path = os.path.join(workdir.name, "fleet.avi")
+            # Streams must outlast the run; the grabbers replay files in real time
+            write_video(image_paths, video_path, args.hold, min_seconds=args.duration + 1)
+            logger.info(f"Benchmarking fleet mode: {args.cameras} cameras, {args.workers} workers, {args.duration:.0f} s")
+            detector, api_client = make_shared(pool_size=args.workers, dispatch=args.dispatch)
+            cameras = [
+                CameraConfig(camera_id=i + 1, parking_lot_id=i + 1, source=video_path, calibration=args.calibration)
+                for i in range(args.cameras)
+            ]
+            fleet = FleetProcessor(
+                cameras, workers=args.workers, interval=args.interval, detector=detector, api_client=api_client
+            )
+            for processor in fleet.processors.values():
+                instrument_processor(timer, processor)
+            report["modes"]["fleet"] = measure(lambda: bench_fleet(fleet, args.duration), timer, args.tracemalloc)
+            if detector.dispatcher is not None:
+                report["modes"]["fleet"]["dispatcher"] = detector.dispatcher.stats()
+                detector.dispatcher.close()
+    finally:
+        report["fake_inference"] = {"requests": inference.requests}
+        report["fake_backend"] = backend.stats()
+        inference.stop()
+        backend.stop()
+        workdir.cleanup()
+
+    output = json.dumps(report, indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(output)
+        logger.info(f"Saved results to: {args.json}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
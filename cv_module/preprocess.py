@@ -0,0 +1,217 @@
+"""
+Upload-size reduction before inference
+Crops frames to a camera's spot ROIs, blanks everything else and downsizes to the model input
+"""
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from config import (
+    PREPROCESS_INPUT_SIZE,
+    PREPROCESS_MASK,
+    PREPROCESS_MARGIN,
+    PREPROCESS_TARGET_KB
+)
+from detector import ParkingDetector, RoiPayload
+from encoding import AdaptiveQuality
+from spots import SpotLayout
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Geometry:
+    """Crop, resize and mask of one frame size"""
+    region: Tuple[int, int, int, int]  # x0, y0, x1, y1 in frame pixels
+    scale: float  # payload pixels per frame pixel
+    size: Tuple[int, int]  # payload width, height
+    mask: Optional[np.ndarray]  # (height, width) uint8, 255 where pixels are kept; None keeps all
+
+
+class FramePreprocessor:
+    """
+    Per-camera reduction of what is sent to inference
+
+    Frames are cropped to the union of the spot ROIs (grown by a margin so
+    cars overhanging a spot stay whole), pixels outside the grown ROIs are
+    blanked so they compress to almost nothing, and the crop is downscaled
+    to the model input size into a buffer reused across frames. For engines
+    that take JPEG, the quality follows a payload size target. Detections
+    come back in frame pixels through RoiPayload.
+
+    Without a spot layout the whole frame is kept and only resized.
+    """
+
+    def __init__(
+        self,
+        layout: SpotLayout = None,
+        input_size: int = None,
+        mask: bool = None,
+        margin: float = None,
+        target_kb: float = None
+    ):
+        """
+        Initialize the preprocessor
+
+        Args:
+            layout: Spot ROIs of the camera (None keeps the whole frame)
+            input_size: Longest payload side in pixels, 0 disables resizing (default: PREPROCESS_INPUT_SIZE)
+            mask: Blank pixels outside the spot ROIs (default: PREPROCESS_MASK)
+            margin: ROI growth as a fraction of the median spot size (default: PREPROCESS_MARGIN)
+            target_kb: Payload size the JPEG quality aims for, 0 keeps the encoder's (default: PREPROCESS_TARGET_KB)
+        """
+        self.layout = layout if layout is not None and len(layout) else None
+        self.input_size = PREPROCESS_INPUT_SIZE if input_size is None else input_size
+        self.mask = PREPROCESS_MASK if mask is None else mask
+        self.margin = PREPROCESS_MARGIN if margin is None else margin
+        target_kb = PREPROCESS_TARGET_KB if target_kb is None else target_kb
+        self.quality = AdaptiveQuality(target_kb * 1024) if target_kb > 0 else None
+
+        self._regions: Dict[Tuple[int, int], Tuple[int, int, int, int]] = {}
+        self._geometries: Dict[Tuple[int, int, bool], _Geometry] = {}
+        self._local = threading.local()
+
+    def _margin_px(self) -> float:
+        boxes = self.layout.boxes
+        sizes = np.concatenate((boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]))
+        return self.margin * float(np.median(sizes))
+
+    def region(self, height: int, width: int) -> Tuple[int, int, int, int]:
+        """Part of a frame that is sent: x0, y0, x1, y1"""
+        region = self._regions.get((height, width))
+        if region is not None:
+            return region
+        if self.layout is None:
+            region = (0, 0, width, height)
+        else:
+            margin = self._margin_px()
+            boxes = self.layout.boxes
+            x0 = int(np.clip(np.floor(boxes[:, 0].min() - margin), 0, width - 1))
+            y0 = int(np.clip(np.floor(boxes[:, 1].min() - margin), 0, height - 1))
+            x1 = int(np.clip(np.ceil(boxes[:, 2].max() + margin), x0 + 1, width))
+            y1 = int(np.clip(np.ceil(boxes[:, 3].max() + margin), y0 + 1, height))
+            region = (x0, y0, x1, y1)
+        self._regions[(height, width)] = region
+        return region
+
+    def _geometry(self, height: int, width: int, resize: bool) -> _Geometry:
+        """Crop/resize/mask for a frame size, computed once per size"""
+        key = (height, width, resize)
+        geometry = self._geometries.get(key)
+        if geometry is not None:
+            return geometry
+
+        x0, y0, x1, y1 = region = self.region(height, width)
+        longest = max(x1 - x0, y1 - y0)
+        scale = 1.0
+        if resize and 0 < self.input_size < longest:
+            scale = self.input_size / longest
+        size = (max(1, int(round((x1 - x0) * scale))), max(1, int(round((y1 - y0) * scale))))
+
+        mask = None
+        if self.mask and self.layout is not None:
+            mask = np.zeros((size[1], size[0]), dtype=np.uint8)
+            if self.layout.polygons is not None:
+                polygons = self.layout.polygons
+            else:
+                b = self.layout.boxes
+                polygons = np.stack((b[:, [0, 1]], b[:, [2, 1]], b[:, [2, 3]], b[:, [0, 3]]), axis=1)
+            points = np.round((polygons - (x0, y0)) * scale).astype(np.int32)
+            cv2.fillPoly(mask, list(points), 255)
+
+            radius = int(round(self._margin_px() * scale))
+            if radius > 0:
+                kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+                mask = cv2.dilate(mask, kernel)
+            if mask.all():
+                mask = None
+
+        geometry = _Geometry(region=region, scale=scale, size=size, mask=mask)
+        self._geometries[key] = geometry
+
+        kept = 1.0 if mask is None else float(np.count_nonzero(mask)) / mask.size
+        logger.info(
+            f"Preprocessing {width}x{height} frames: region {region}, "
+            f"{(x1 - x0) * (y1 - y0) / (width * height):.0%} of the frame, "
+            f"{kept:.0%} of it kept, sent at {size[0]}x{size[1]}"
+        )
+        return geometry
+
+    def _buffer(self, shape: Tuple[int, ...], dtype) -> np.ndarray:
+        """Per-thread output array reused across frames"""
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self._local.buffer = buffer
+        return buffer
+
+    def apply(self, frame: np.ndarray, resize: bool = True, reuse: bool = False) -> Tuple[np.ndarray, RoiPayload]:
+        """
+        Crop, resize and mask a frame
+
+        Args:
+            frame: numpy array (BGR format from OpenCV)
+            resize: Downscale to the input size
+            reuse: Write into the per-thread buffer, overwritten by the next call
+
+        Returns:
+            (processed image, RoiPayload without payload for mapping detections back)
+        """
+        geometry = self._geometry(frame.shape[0], frame.shape[1], resize)
+        x0, y0, x1, y1 = geometry.region
+        image = frame[y0:y1, x0:x1]
+
+        resized = geometry.scale != 1.0
+        if resized or geometry.mask is not None:
+            shape = (geometry.size[1], geometry.size[0]) + frame.shape[2:]
+            out = self._buffer(shape, frame.dtype) if reuse else None
+            if resized:
+                image = cv2.resize(image, geometry.size, dst=out, interpolation=cv2.INTER_AREA)
+            if geometry.mask is not None:
+                image = cv2.bitwise_and(image, image, mask=geometry.mask, dst=image if resized else out)
+
+        return image, RoiPayload(payload=None, offset=(x0, y0), scale=geometry.scale)
+
+    def prepare(
+        self,
+        frame: np.ndarray,
+        detector: ParkingDetector,
+        tile_size: int = None,
+        tile_overlap: float = None
+    ) -> RoiPayload:
+        """
+        Preprocessed payload of a frame for detector.predict_prepared()
+
+        Regions still larger than the tile size are tiled at full resolution
+        instead of being downscaled.
+
+        Args:
+            frame: numpy array (BGR format from OpenCV)
+            detector: Detector whose backend prepares the payload
+            tile_size: Tile size of the camera (default: the detector's)
+            tile_overlap: Overlap fraction between tiles (default: the detector's)
+
+        Returns:
+            RoiPayload wrapping the backend payload (or TiledPayload)
+        """
+        x0, y0, x1, y1 = self.region(*frame.shape[:2])
+        backend = detector.backend
+
+        if detector._tiling(frame[y0:y1, x0:x1], tile_size) is not None:
+            image, roi = self.apply(frame, resize=False)
+            roi.payload = detector.prepare_frame(image, tile_size, tile_overlap)
+            return roi
+
+        # Local engines keep the array until inference, so only encoders may share the buffer
+        image, roi = self.apply(frame, reuse=backend.encodes_frames)
+        if self.quality is None or not backend.encodes_frames:
+            roi.payload = backend.prepare(image)
+            return roi
+
+        roi.payload = backend.prepare(image, quality=self.quality.quality)
+        self.quality.observe(backend.payload_bytes(roi.payload))
+        return roi
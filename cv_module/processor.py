@@ -4,22 +4,56 @@ Main processing pipeline for parking space detection
 """
 import os
 import sys
+import json
 import time
+import asyncio
 import logging
 import argparse
 from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+from dataclasses import dataclass, field
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import cv2
 
 from config import (
     PROCESSING_INTERVAL,
     VIDEO_SOURCE,
+    CAPTURE_THREADED,
+    CAPTURE_TARGET_FPS,
     LOG_LEVEL,
-    BACKEND_API_URL
+    BACKEND_API_URL,
+    CAMERAS_CONFIG,
+    FLEET_WORKERS,
+    FLEET_REPORT_INTERVAL,
+    SHARD_PROCESSES,
+    GATE_ENABLED,
+    PREPROCESS_ENABLED,
+    SPOT_CLASSIFIER_ENABLED,
+    STATUS_CONFIRM_FRAMES,
+    SCHEDULER_ADAPTIVE,
+    SCHEDULER_LOT_REFRESH,
+    BATCH_WORKERS,
+    BATCH_POOL,
+    BATCH_OUTPUT,
+    LIVE_VIEW_PORT,
+    METRICS_PORT,
+    RECORD_ENABLED,
+    RECORD_DIR
 )
-from detector import ParkingDetector, Detection
-from api_client import BackendClient
+from detector import ParkingDetector, DetectionBatch
+from api_client import BackendClient, DryRunClient
 from streamer import VideoStreamer
+from gating import FrameChangeGate
+from preprocess import FramePreprocessor
+from spots import SpotLayout, SpotStateTracker, load_spot_layout
+from spot_classifier import SpotClassifier, SpotFeatures
+from pipeline import CVPipeline
+from scheduler import AdaptiveScheduler
+from batch import BatchProcessor
+from live_view import LiveFeed, LiveViewServer, draw_detections
+from metrics import CameraMetrics, MetricsServer, QUEUE_DEPTH
+from recording import Recorder, ReplaySource, ReplayBackend
 
 # Setup logging
 logging.basicConfig(
@@ -38,7 +72,16 @@ class ParkingProcessor:
         self,
         parking_lot_id: int = 1,
         source: str = None,
-        backend_url: str = None
+        backend_url: str = None,
+        detector: ParkingDetector = None,
+        api_client: BackendClient = None,
+        spot_layout: SpotLayout = None,
+        tile_size: int = None,
+        tile_overlap: float = None,
+        live_feed: LiveFeed = None,
+        camera_id: int = 0,
+        recorder: Recorder = None,
+        replay: ReplaySource = None
     ):
         """
         Initialize the processor
@@ -47,6 +90,15 @@ class ParkingProcessor:
             parking_lot_id: ID of the parking lot being monitored
             source: Video/image source (file path, URL, or camera index)
             backend_url: Backend API URL
+            detector: Shared detector (created if not provided)
+            api_client: Shared backend client (created if not provided)
+            spot_layout: Spot ROI calibration of the camera (enables per-spot status)
+            tile_size: Tiled inference tile size for this camera (default: TILE_SIZE, 0 disables)
+            tile_overlap: Overlap fraction between tiles (default: TILE_OVERLAP)
+            live_feed: Operator live view of this camera (optional)
+            camera_id: Camera label for metrics (0 for the single-camera modes)
+            recorder: Frame and prediction recorder (default: one per camera if RECORD_ENABLED)
+            replay: Recording to process instead of the live source, without inference
         """
         self.parking_lot_id = parking_lot_id
         self.source = source or VIDEO_SOURCE
@@ -54,11 +106,57 @@ class ParkingProcessor:
 
         # Initialize components
         logger.info("Initializing ParkVision CV Processor...")
-        self.detector = ParkingDetector()
-        self.api_client = BackendClient(base_url=self.backend_url)
+        self.detector = detector or ParkingDetector()
+        self.api_client = api_client or BackendClient(base_url=self.backend_url)
+
+        # Skip inference on frames that did not change
+        self.gate = FrameChangeGate() if GATE_ENABLED else None
+
+        # High-resolution cameras can be split into overlapping tiles
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+
+        # Calibrated cameras only send their parking area, at the model's input size; uncalibrated
+        # ones keep the encoder's FRAME_MAX_DIMENSION resize so their accuracy does not change
+        self.preprocessor = None
+        if PREPROCESS_ENABLED and spot_layout is not None and len(spot_layout):
+            self.preprocessor = FramePreprocessor(spot_layout)
+
+        # Per-spot status driven by detections matched to calibrated ROIs,
+        # smoothed so only committed transitions are pushed
+        self.spot_layout = spot_layout
+        self.spot_tracker = SpotStateTracker(len(spot_layout)) if spot_layout is not None else None
+        self.spot_states: Dict[int, str] = {}
+        # Cheap per-spot check that only calls the detector when a spot may have flipped
+        self.spot_classifier = None
+        if spot_layout is not None and len(spot_layout) and SPOT_CLASSIFIER_ENABLED:
+            self.spot_classifier = SpotClassifier(spot_layout)
+
+        # Annotated live view; frames are only rendered while someone watches
+        self.live_feed = live_feed
+        self.last_detections: Optional[DetectionBatch] = None
+        self.last_summary = None
+
+        # Per-stage latency, frame age and error metrics
+        self.camera_id = camera_id
+        self.metrics = CameraMetrics(camera_id)
+
+        # Sampled frames with their raw predictions, for incident replay and stricter thresholds.
+        # A replay brings its own predictions and is never recorded again
+        self.replay = replay
+        self.recorder = None
+        if recorder is not None:
+            self.start_recording(recorder=recorder)
+        elif RECORD_ENABLED and replay is None:
+            self.start_recording()
 
         # State tracking
         self.last_status = None
+        # How much the last processed frame changed: 0 static ... 1 status pushed
+        self.last_activity = 1.0
+        self.inference_errors = 0
+        self._pending_status = None
+        self._pending_count = 0
         self.running = False
 
     def process_image(self, image_path: str) -> dict:
@@ -75,24 +173,15 @@ class ParkingProcessor:
 
         # Run detection
         detections = self.detector.detect(image_path)
-        summary = self.detector.get_parking_summary(detections)
-
-        # Send to backend
-        success = self.api_client.update_parking_lot_status(
-            parking_lot_id=self.parking_lot_id,
-            total_spots=summary["total"],
-            empty_spots=summary["empty"],
-            occupied_spots=summary["occupied"],
-            detections=[d.to_dict() for d in detections]
-        )
+        spot_changes = self._spot_changes(detections)
+        summary = self._summarize(detections)
 
-        # Send WebSocket event
-        if success:
-            self.api_client.send_detection_event(
-                parking_lot_id=self.parking_lot_id,
-                event_type="status_update",
-                data=summary
-            )
+        # Send to backend (status and WebSocket event in one message)
+        success = self.api_client.publish_lot_status(self.parking_lot_id, detections, summary)
+
+        # Push per-spot status if the camera is calibrated (single image: no point waiting for a batch)
+        self._publish_spot_changes(spot_changes)
+        self.api_client.flush()
 
         # Log results
         logger.info(
@@ -103,7 +192,8 @@ class ParkingProcessor:
         return {
             "success": success,
             "summary": summary,
-            "detections": [d.to_dict() for d in detections]
+            "detections": detections.to_payload(),
+            "spots": dict(self.spot_states)
         }
 
     def process_video(self, max_frames: int = None):
@@ -113,14 +203,8 @@ class ParkingProcessor:
         Args:
             max_frames: Maximum number of frames to process (None for infinite)
         """
-        logger.info(f"Starting video processing from: {self.source}")
-
-        # Determine source type
-        source = self.source
-        if source.isdigit():
-            source = int(source)
-
-        streamer = VideoStreamer(source)
+        streamer = self._open_streamer(CAPTURE_THREADED)
+        logger.info(f"Starting video processing from: {streamer.source}")
         self.running = True
         frame_count = 0
 
@@ -128,54 +212,309 @@ class ParkingProcessor:
             while self.running:
                 frame = streamer.get_frame()
                 if frame is None:
+                    if streamer.finished:
+                        logger.info("Video source exhausted")
+                        break
                     logger.warning("No frame received, retrying...")
                     time.sleep(1)
                     continue
 
-                # Run detection on frame
-                detections = self.detector.detect_from_frame(frame)
-                summary = self.detector.get_parking_summary(detections)
-
-                # Only update if status changed
-                if self._status_changed(summary):
-                    self.api_client.update_parking_lot_status(
-                        parking_lot_id=self.parking_lot_id,
-                        total_spots=summary["total"],
-                        empty_spots=summary["empty"],
-                        occupied_spots=summary["occupied"],
-                        detections=[d.to_dict() for d in detections]
-                    )
-                    self.last_status = summary
-
-                    # Broadcast via WebSocket
-                    self.api_client.send_detection_event(
-                        parking_lot_id=self.parking_lot_id,
-                        event_type="status_update",
-                        data=summary
-                    )
+                logger.debug(
+                    f"Frame age: {streamer.frame_age*1000:.0f} ms, "
+                    f"dropped: {streamer.dropped_frames}/{streamer.captured_frames}, "
+                    f"skipped undecoded: {streamer.skipped_frames}"
+                    + (f", gate: {self.gate.stats()}" if self.gate else "")
+                    + (f", spot classifier: {self.spot_classifier.stats()}" if self.spot_classifier else "")
+                )
+
+                self.process_frame(frame, streamer.last_timestamp)
 
                 frame_count += 1
                 if max_frames and frame_count >= max_frames:
                     break
 
-                # Wait before next frame
-                time.sleep(PROCESSING_INTERVAL)
+                # Wait before next frame (replays are paced by their own clock)
+                if self.replay is None:
+                    time.sleep(PROCESSING_INTERVAL)
 
         except KeyboardInterrupt:
             logger.info("Processing stopped by user")
         finally:
             streamer.release()
+            self.api_client.flush()
             self.running = False
 
+    def run_pipeline(self, max_frames: int = None):
+        """
+        Process the video stream with the asyncio staged pipeline
+
+        Capture, encode, inference, diff and publish overlap, so throughput
+        is bound by the slowest stage rather than their sum.
+
+        Args:
+            max_frames: Maximum number of frames to process (None for infinite)
+        """
+        streamer = self._open_streamer(threaded=True)
+        logger.info(f"Starting pipelined video processing from: {streamer.source}")
+        self.running = True
+        try:
+            if self.replay is not None:
+                # Replays are paced by their own clock and must not drop frames, so runs are repeatable
+                pipeline = CVPipeline(self, streamer, interval=0, infer_workers=1, lossless=True)
+            else:
+                pipeline = CVPipeline(self, streamer)
+            asyncio.run(pipeline.run(max_frames))
+        except KeyboardInterrupt:
+            logger.info("Processing stopped by user")
+        finally:
+            streamer.release()
+            self.api_client.flush()
+            self.running = False
+
+    def _open_streamer(self, threaded: bool):
+        """The replay if one is set, otherwise a capture of the configured source"""
+        if self.replay is not None:
+            return self.replay
+        source = self.source
+        if source.isdigit():
+            source = int(source)
+        return VideoStreamer(source, threaded=threaded, target_fps=CAPTURE_TARGET_FPS, on_decode=self.metrics.decoded)
+
+    def process_frame(self, frame, captured_at: float = None) -> dict:
+        """
+        Run detection on a frame and push the result if the status changed
+
+        Args:
+            frame: numpy array (BGR format from OpenCV)
+            captured_at: Capture time of the frame, epoch seconds (default: now)
+
+        Returns:
+            Detection summary
+        """
+        # Static scene or unchanged spots: previous detections still hold, nothing to push
+        if self.gated(frame, captured_at):
+            return self.last_status
+        skip, features = self.screen_spots(frame, captured_at)
+        if skip:
+            return self.last_status
+
+        try:
+            if self.replay is not None:
+                with self.metrics.stage("infer"):
+                    raw = self.replay.detections(captured_at)
+            else:
+                payload = self.encode_frame(frame)
+                with self.metrics.stage("infer"):
+                    raw = self.detector.predict_prepared(payload, self.camera_id)
+        except Exception as e:
+            self.inference_failed(e, captured_at)
+            return self.last_status
+        return self.complete_frame(frame, captured_at, raw, features)
+
+    def gated(self, frame, captured_at: float = None) -> bool:
+        """Run the frame-change gate; True when the frame is static and needs no inference"""
+        if self.gate is None:
+            return False
+        with self.metrics.stage("gate"):
+            changed = self.gate.should_infer(frame)
+        if changed:
+            return False
+        self.last_activity = 0.0
+        self.show_frame(frame)
+        self.metrics.frame("gated", captured_at)
+        return True
+
+    def screen_spots(self, frame, captured_at: float = None) -> Tuple[bool, Optional[SpotFeatures]]:
+        """
+        Run the per-spot classifier on a frame that passed the gate
+
+        Returns:
+            (True when every spot confidently keeps its committed state and inference
+            can be skipped, spot features to learn from once the frame is detected)
+        """
+        if self.spot_classifier is None:
+            return False, None
+        with self.metrics.stage("classify"):
+            features = self.spot_classifier.features(frame)
+            estimate = self.spot_classifier.classify(features, self.spot_tracker.state)
+        if estimate.needs_detection:
+            return False, features
+        self.last_activity = 0.0
+        self.show_frame(frame)
+        self.metrics.frame("classified", captured_at)
+        return True, None
+
+    def encode_frame(self, frame):
+        """Backend payload of a frame (cropped/resized/encoded, tiled if configured)"""
+        with self.metrics.stage("encode"):
+            if self.preprocessor is not None:
+                payload = self.preprocessor.prepare(frame, self.detector, self.tile_size, self.tile_overlap)
+            else:
+                payload = self.detector.prepare_frame(frame, self.tile_size, self.tile_overlap)
+        self.metrics.payload(self.detector.payload_bytes(payload))
+        return payload
+
+    def inference_failed(self, error: Exception, captured_at: float = None):
+        """Skip a frame without detections; publishing it would report an empty lot"""
+        logger.error(f"Frame detection failed: {error}")
+        self.inference_errors += 1
+        self.metrics.inference(ok=False)
+        self.metrics.frame("error", captured_at)
+
+    def complete_frame(
+        self,
+        frame,
+        captured_at: float,
+        raw: DetectionBatch,
+        spot_features: SpotFeatures = None
+    ) -> dict:
+        """
+        Match a frame's detections to the lot and push the result if the status changed
+
+        Args:
+            frame: The frame the detections belong to
+            captured_at: Capture time of the frame, epoch seconds
+            raw: Detections before the confidence threshold
+            spot_features: Spot classifier features of the frame, learned from the detections
+
+        Returns:
+            Detection summary
+        """
+        metrics = self.metrics
+        metrics.inference(ok=True)
+        self.record(frame, captured_at, raw)
+        detections = raw.filter_confidence(self.detector.confidence_threshold)
+
+        with metrics.stage("match"):
+            spot_changes = self._spot_changes(detections, spot_features)
+            summary = self._summarize(detections)
+        self.last_detections, self.last_summary = detections, summary
+        self.show_frame(frame)
+        status_changed = self._status_changed(summary)
+        # Scene moved without a committed change still counts as some activity
+        self.last_activity = 1.0 if status_changed or spot_changes else 0.25
+
+        with metrics.stage("publish"):
+            # Only update if status changed
+            if status_changed:
+                # Status update and WebSocket broadcast travel together
+                self.api_client.publish_lot_status(self.parking_lot_id, detections, summary, observed_at=captured_at)
+                self.last_status = summary
+
+            self._publish_spot_changes(spot_changes, captured_at)
+
+        metrics.frame("processed", captured_at)
+        return summary
+
+    def start_recording(self, directory: str = None, recorder: Recorder = None):
+        """
+        Record sampled frames of this camera from now on
+
+        Args:
+            directory: Segment directory (default: RECORD_DIR)
+            recorder: Use this recorder instead of creating one
+        """
+        if recorder is None:
+            recorder = Recorder(self.camera_id, directory, metadata={
+                "model": self.detector.backend.cache_namespace,
+                "parking_lot_id": self.parking_lot_id
+            })
+        self.recorder = recorder
+        self.metrics.queue("recorder", lambda: recorder.pending)
+
+    def record(self, frame, captured_at: float, raw: DetectionBatch):
+        """Hand a frame and its raw (unthresholded) detections to the recorder, if recording"""
+        if self.recorder is not None:
+            self.recorder.record(frame, captured_at, raw)
+
+    def close(self):
+        """Write out pending recordings"""
+        if self.recorder is not None:
+            self.recorder.close()
+            self.metrics.remove_queue("recorder")
+            logger.info(f"Recorder: {self.recorder.stats()}")
+            self.recorder = None
+
+    def show_frame(self, frame):
+        """Offer a frame, annotated with the latest detections, to live viewers"""
+        if self.live_feed is not None:
+            self.live_feed.publish(frame, self.last_detections, self.last_summary)
+
+    def _summarize(self, detections: DetectionBatch) -> dict:
+        """Lot summary: committed spot states when calibrated, raw detections otherwise"""
+        if self.spot_tracker is not None:
+            return self.spot_tracker.summary()
+        return self.detector.get_parking_summary(detections)
+
+    def _spot_changes(
+        self,
+        detections: DetectionBatch,
+        spot_features: SpotFeatures = None
+    ) -> List[Tuple[int, str, float]]:
+        """
+        Match detections to the spot layout and return committed spot transitions
+
+        Spots without a matching detection keep their previous state; a
+        new state is committed only once the smoothed evidence crosses the
+        hysteresis band (see SpotStateTracker). With spot_features, the spot
+        classifier learns from the matches.
+
+        Returns:
+            List of (spot_id, status, confidence) for changed spots
+        """
+        if self.spot_layout is None:
+            return []
+
+        match = self.spot_layout.match_detections(detections)
+        flipped = self.spot_tracker.update(match)
+        if spot_features is not None and self.spot_classifier is not None:
+            self.spot_classifier.learn(spot_features, match, self.spot_tracker.state)
+        changes = []
+        for index in flipped.tolist():
+            spot_id = int(match.spot_ids[index])
+            status = "occupied" if self.spot_tracker.state[index] == 1 else "empty"
+            self.spot_states[spot_id] = status
+            changes.append((spot_id, status, float(match.confidence[index])))
+        return changes
+
+    def _publish_spot_changes(self, changes: List[Tuple[int, str, float]], observed_at: float = None):
+        """Queue changed spot states for the next bulk update"""
+        for spot_id, status, confidence in changes:
+            self.api_client.queue_spot_status(spot_id, status, confidence, observed_at)
+        if changes:
+            logger.info(f"Queued {len(changes)} spot update(s) for parking lot {self.parking_lot_id}")
+
     def _status_changed(self, new_summary: dict) -> bool:
-        """Check if parking status has changed"""
+        """
+        Check if parking status has changed
+
+        With a spot layout the summary is already debounced per spot. Without
+        one, new counts must repeat for STATUS_CONFIRM_FRAMES frames in a row
+        so detector jitter does not turn into a stream of updates.
+        """
         if self.last_status is None:
             return True
 
-        return (
-            self.last_status["empty"] != new_summary["empty"] or
-            self.last_status["occupied"] != new_summary["occupied"]
-        )
+        counts = (new_summary["empty"], new_summary["occupied"])
+        if counts == (self.last_status["empty"], self.last_status["occupied"]):
+            self._pending_status = None
+            self._pending_count = 0
+            return False
+
+        if self.spot_tracker is not None:
+            return True
+
+        if counts == self._pending_status:
+            self._pending_count += 1
+        else:
+            self._pending_status = counts
+            self._pending_count = 1
+
+        if self._pending_count >= STATUS_CONFIRM_FRAMES:
+            self._pending_status = None
+            self._pending_count = 0
+            return True
+        return False
 
     def visualize_detections(
         self,
@@ -200,34 +539,8 @@ class ParkingProcessor:
         # Run detection
         detections = self.detector.detect(image_path)
 
-        # Draw detections
-        for det in detections:
-            # Calculate bounding box corners
-            x1 = int(det.x - det.width / 2)
-            y1 = int(det.y - det.height / 2)
-            x2 = int(det.x + det.width / 2)
-            y2 = int(det.y + det.height / 2)
-
-            # Color based on status (green=empty, red=occupied)
-            color = (0, 255, 0) if det.is_empty else (0, 0, 255)
-
-            # Draw rectangle
-            cv2.rectangle(image, (x1, y1), (x2, y2), color, 2)
-
-            # Draw label
-            label = f"{det.class_name} ({det.confidence:.2f})"
-            cv2.putText(
-                image, label, (x1, y1 - 10),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2
-            )
-
-        # Add summary text
-        summary = self.detector.get_parking_summary(detections)
-        summary_text = f"Empty: {summary['empty']} | Occupied: {summary['occupied']} | Total: {summary['total']}"
-        cv2.putText(
-            image, summary_text, (10, 30),
-            cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2
-        )
+        # Draw detections and summary
+        draw_detections(image, detections, self.detector.get_parking_summary(detections))
 
         # Save if output path provided
         if output_path:
@@ -243,19 +556,380 @@ class ParkingProcessor:
         return image
 
 
+@dataclass
+class CameraConfig:
+    """A camera monitored in fleet mode"""
+    camera_id: int
+    parking_lot_id: int
+    source: str
+    calibration: Optional[str] = None  # spot ROI file (default: SPOT_CALIBRATION_DIR/camera_<id>.json)
+    tile_size: Optional[int] = None  # tiled inference (default: TILE_SIZE)
+    tile_overlap: Optional[float] = None
+
+
+@dataclass
+class CameraStats:
+    """Per-camera counters for fleet reporting"""
+    frames: int = 0
+    errors: int = 0
+    last_frame_age: float = 0.0  # capture -> result, seconds
+    last_lag: float = 0.0  # scheduled -> started, seconds
+    window_frames: int = 0
+    window_start: float = field(default_factory=time.monotonic)
+
+
+def load_cameras(config_path: str = None, api_client: BackendClient = None) -> List[CameraConfig]:
+    """
+    Load the camera list from a JSON file or from the backend
+
+    The file holds a list of objects with "id", "parking_lot_id" and
+    "stream_url" (or "source"), the same shape GET /cameras/ returns, plus
+    an optional "calibration" path to the camera's spot ROI file and optional
+    "tile_size"/"tile_overlap" for tiled inference on high-resolution cameras.
+
+    Args:
+        config_path: Path to a JSON camera list (optional)
+        api_client: Backend client used when no file is given
+
+    Returns:
+        Active cameras
+    """
+    if config_path:
+        with open(config_path) as f:
+            entries = json.load(f)
+    else:
+        entries = api_client.get_cameras()
+
+    cameras = []
+    for entry in entries:
+        if not entry.get("is_active", True):
+            continue
+        cameras.append(CameraConfig(
+            camera_id=entry["id"],
+            parking_lot_id=entry["parking_lot_id"],
+            source=str(entry.get("source") or entry["stream_url"]),
+            calibration=entry.get("calibration"),
+            tile_size=entry.get("tile_size"),
+            tile_overlap=entry.get("tile_overlap")
+        ))
+    return cameras
+
+
+class FleetProcessor:
+    """
+    Runs many camera streams in one process on a shared worker pool
+
+    All cameras share one detector and one backend client (one HTTP
+    connection pool). Each camera has its own threaded grabber; a scheduler
+    submits at most one in-flight detection per camera to the pool, at an
+    interval adapted to the camera's activity (or a fixed processing
+    interval), and skips cameras of inactive parking lots.
+    """
+
+    def __init__(
+        self,
+        cameras: List[CameraConfig],
+        backend_url: str = None,
+        workers: int = None,
+        interval: float = None,
+        live_view: LiveViewServer = None,
+        detector: ParkingDetector = None,
+        api_client: BackendClient = None,
+        budget: float = None
+    ):
+        """
+        Initialize the fleet
+
+        Args:
+            cameras: Cameras to monitor
+            backend_url: Backend API URL
+            workers: Size of the shared inference worker pool
+            interval: Seconds between detections per camera when scheduling is not adaptive
+            live_view: Server for per-camera annotated live streams (optional)
+            detector: Shared detector (created if not provided)
+            api_client: Shared backend client (created if not provided)
+            budget: Inferences per second of the adaptive scheduler (default: SCHEDULER_BUDGET)
+        """
+        self.cameras = cameras
+        self.workers = workers or FLEET_WORKERS
+        self.interval = PROCESSING_INTERVAL if interval is None else interval
+
+        logger.info(f"Initializing fleet of {len(cameras)} cameras on {self.workers} workers...")
+        self.detector = detector or ParkingDetector()
+        self.api_client = api_client or BackendClient(base_url=backend_url or BACKEND_API_URL, pool_size=self.workers)
+
+        self.processors: Dict[int, ParkingProcessor] = {
+            cam.camera_id: ParkingProcessor(
+                parking_lot_id=cam.parking_lot_id,
+                source=cam.source,
+                detector=self.detector,
+                api_client=self.api_client,
+                spot_layout=load_spot_layout(cam.camera_id, cam.calibration),
+                tile_size=cam.tile_size,
+                tile_overlap=cam.tile_overlap,
+                live_feed=live_view.feed(cam.camera_id) if live_view is not None else None,
+                camera_id=cam.camera_id
+            )
+            for cam in cameras
+        }
+        self.streamers: Dict[int, VideoStreamer] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.stats: Dict[int, CameraStats] = {cam.camera_id: CameraStats() for cam in cameras}
+
+        camera_ids = [cam.camera_id for cam in cameras]
+        lot_ids = [cam.parking_lot_id for cam in cameras]
+        if SCHEDULER_ADAPTIVE:
+            self.scheduler = AdaptiveScheduler(camera_ids, lot_ids, budget=budget)
+        else:
+            self.scheduler = AdaptiveScheduler(
+                camera_ids, lot_ids, budget=0, min_interval=self.interval, max_interval=self.interval
+            )
+        self.running = False
+        self.last_loop = 0.0  # epoch seconds of the scheduling loop's last pass, for liveness checks
+
+    def _process_camera(self, cam: CameraConfig, due: float) -> Optional[Future]:
+        """
+        Worker task: detect on the newest frame of one camera
+
+        Returns:
+            Future of the rest of the work when inference was handed to the dispatcher
+        """
+        stats = self.stats[cam.camera_id]
+        stats.last_lag = max(0.0, time.monotonic() - due)
+
+        processor = self.processors[cam.camera_id]
+        frame, captured_at = self.streamers[cam.camera_id].read_latest(timeout=0)
+        if frame is None:
+            return None
+
+        try:
+            if self.detector.dispatcher is not None:
+                return self._dispatch_camera(cam, frame, captured_at)
+            errors = processor.inference_errors
+            processor.process_frame(frame, captured_at)
+        except Exception as e:
+            self._camera_failed(cam, captured_at, e)
+            return None
+        self._camera_done(cam, captured_at, failed=processor.inference_errors > errors)
+        return None
+
+    def _dispatch_camera(self, cam: CameraConfig, frame, captured_at: float) -> Optional[Future]:
+        """
+        Gate, screen and encode a frame, then free the worker while the dispatcher runs inference
+
+        The result comes back to this camera's processor on the worker pool;
+        the camera stays busy (no new frame is read) until then.
+        """
+        processor = self.processors[cam.camera_id]
+        if processor.gated(frame, captured_at):
+            self._camera_done(cam, captured_at)
+            return None
+        skip, features = processor.screen_spots(frame, captured_at)
+        if skip:
+            self._camera_done(cam, captured_at)
+            return None
+
+        payload = processor.encode_frame(frame)
+        submitted = time.perf_counter()
+        inference = self.detector.submit_prepared(payload, cam.camera_id)
+        finished: Future = Future()
+
+        def complete(future: Future):
+            try:
+                self._executor.submit(
+                    self._complete_camera, cam, frame, captured_at, future, submitted, finished, features
+                )
+            except RuntimeError:
+                # Pool already shut down
+                finished.set_result(None)
+
+        inference.add_done_callback(complete)
+        return finished
+
+    def _complete_camera(
+        self,
+        cam: CameraConfig,
+        frame,
+        captured_at: float,
+        inference: Future,
+        submitted: float,
+        finished: Future,
+        spot_features: SpotFeatures = None
+    ):
+        """Worker task: match and publish a dispatched inference result"""
+        processor = self.processors[cam.camera_id]
+        try:
+            processor.metrics.observe_stage("infer", time.perf_counter() - submitted)
+            error = inference.exception()
+            if error is not None:
+                processor.inference_failed(error, captured_at)
+                self._camera_done(cam, captured_at, failed=True)
+                return
+            processor.complete_frame(frame, captured_at, inference.result(), spot_features)
+            self._camera_done(cam, captured_at)
+        except Exception as e:
+            self._camera_failed(cam, captured_at, e)
+        finally:
+            finished.set_result(None)
+
+    def _camera_done(self, cam: CameraConfig, captured_at: float, failed: bool = False):
+        """Account a handled frame (failed: its inference failed and it was skipped)"""
+        stats = self.stats[cam.camera_id]
+        self.scheduler.observe(cam.camera_id, self.processors[cam.camera_id].last_activity)
+        stats.frames += 1
+        stats.window_frames += 1
+        stats.last_frame_age = time.time() - captured_at
+        if failed:
+            stats.errors += 1
+
+    def _camera_failed(self, cam: CameraConfig, captured_at: float, error: Exception):
+        self.stats[cam.camera_id].errors += 1
+        self.processors[cam.camera_id].metrics.frame("error", captured_at)
+        logger.error(f"Camera {cam.camera_id} processing failed: {error}")
+
+    @staticmethod
+    def _busy(future: Optional[Future]) -> bool:
+        """A camera's task, or the dispatched inference it handed off, is still running"""
+        if future is None:
+            return False
+        if not future.done():
+            return True
+        handed_off = future.result() if future.exception() is None else None
+        return handed_off is not None and not handed_off.done()
+
+    def refresh_lot_states(self):
+        """Pause cameras of parking lots deactivated in the backend"""
+        lots = self.api_client.get_parking_lots()
+        if lots:
+            self.scheduler.set_lot_states({lot["id"]: lot.get("is_active", True) for lot in lots})
+
+    def report(self) -> Dict[int, dict]:
+        """
+        Per-camera FPS and lag since the previous report
+
+        Returns:
+            Dictionary keyed by camera id
+        """
+        now = time.monotonic()
+        report = {}
+        for cam in self.cameras:
+            stats = self.stats[cam.camera_id]
+            streamer = self.streamers.get(cam.camera_id)
+            gate = self.processors[cam.camera_id].gate
+            classifier = self.processors[cam.camera_id].spot_classifier
+            elapsed = now - stats.window_start
+            report[cam.camera_id] = {
+                "parking_lot_id": cam.parking_lot_id,
+                "fps": stats.window_frames / elapsed if elapsed > 0 else 0.0,
+                "frames": stats.frames,
+                "errors": stats.errors,
+                "frame_age_ms": stats.last_frame_age * 1000,
+                "lag_ms": stats.last_lag * 1000,
+                "dropped": streamer.dropped_frames if streamer else 0,
+                "gate_skipped": gate.skipped if gate else 0,
+                "classifier_skipped": classifier.skipped if classifier else 0,
+                "interval_s": self.scheduler.interval(cam.camera_id)
+            }
+            stats.window_frames = 0
+            stats.window_start = now
+        return report
+
+    def run(self, duration: float = None):
+        """
+        Process all cameras until stopped
+
+        Args:
+            duration: Seconds to run (None for infinite)
+        """
+        for cam in self.cameras:
+            if cam.camera_id in self.streamers:
+                # Provided by the caller (e.g. a shared-memory ring of a sharded fleet)
+                continue
+            source = int(cam.source) if cam.source.isdigit() else cam.source
+            self.streamers[cam.camera_id] = VideoStreamer(
+                source,
+                threaded=True,
+                target_fps=CAPTURE_TARGET_FPS,
+                on_decode=self.processors[cam.camera_id].metrics.decoded
+            )
+
+        executor = self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fleet")
+        in_flight = {}
+        # Cameras submitted to the pool and not finished (queued, running or waiting on inference)
+        QUEUE_DEPTH.labels("fleet", "inference_pool").set_function(
+            lambda: sum(1 for future in list(in_flight.values()) if self._busy(future))
+        )
+        start = time.monotonic()
+        next_report = start + FLEET_REPORT_INTERVAL
+        next_lot_refresh = start
+        self.running = True
+
+        try:
+            while self.running:
+                self.last_loop = time.time()
+                now = time.monotonic()
+                if duration and now - start >= duration:
+                    break
+
+                if now >= next_lot_refresh:
+                    # Off the scheduling thread: a slow backend must not delay cameras
+                    executor.submit(self.refresh_lot_states)
+                    next_lot_refresh = now + SCHEDULER_LOT_REFRESH
+
+                for cam in self.cameras:
+                    if self._busy(in_flight.get(cam.camera_id)):
+                        continue
+                    if self.scheduler.is_due(cam.camera_id, now):
+                        due = self.scheduler.advance(cam.camera_id, now)
+                        in_flight[cam.camera_id] = executor.submit(self._process_camera, cam, due)
+
+                if now >= next_report:
+                    for camera_id, row in self.report().items():
+                        logger.info(
+                            f"Camera {camera_id} (lot {row['parking_lot_id']}): {row['fps']:.2f} fps, "
+                            f"lag {row['lag_ms']:.0f} ms, frame age {row['frame_age_ms']:.0f} ms, "
+                            f"dropped {row['dropped']}, gate skipped {row['gate_skipped']}, errors {row['errors']}, "
+                            f"interval {row['interval_s']:.1f} s"
+                        )
+                    logger.info(f"Scheduler: {self.scheduler.stats()}")
+                    if self.detector.dispatcher is not None:
+                        logger.info(f"Dispatcher: {self.detector.dispatcher.stats()}")
+                    next_report = now + FLEET_REPORT_INTERVAL
+
+                wakeup = self.scheduler.next_wakeup()
+                delay = wakeup - time.monotonic() if wakeup is not None else 0.1
+                time.sleep(max(0.01, min(delay, 0.1)))
+
+        except KeyboardInterrupt:
+            logger.info("Fleet processing stopped by user")
+        finally:
+            self.running = False
+            # Let dispatched calls come back (each ends by its deadline) before closing the pool
+            wait_until = time.monotonic() + (self.detector.dispatcher.deadline if self.detector.dispatcher else 0)
+            while any(self._busy(f) for f in in_flight.values()) and time.monotonic() < wait_until:
+                time.sleep(0.05)
+            executor.shutdown(wait=True)
+            for streamer in self.streamers.values():
+                streamer.release()
+            for processor in self.processors.values():
+                processor.close()
+            self.api_client.close()
+            QUEUE_DEPTH.remove("fleet", "inference_pool")
+
+
 def main():
     """Main entry point"""
     parser = argparse.ArgumentParser(description="ParkVision CV Processor")
     parser.add_argument(
         "--mode", "-m",
-        choices=["image", "video", "stream"],
+        choices=["image", "video", "stream", "pipeline", "fleet", "batch"],
         default="image",
         help="Processing mode"
     )
     parser.add_argument(
         "--source", "-s",
         type=str,
-        help="Image/video path or camera index/URL"
+        help="Image/video path or camera index/URL (batch: image directory or glob)"
     )
     parser.add_argument(
         "--parking-lot-id", "-p",
@@ -272,7 +946,7 @@ def main():
     parser.add_argument(
         "--output", "-o",
         type=str,
-        help="Output path for visualization"
+        help="Output path for visualization (batch: JSONL results file)"
     )
     parser.add_argument(
         "--visualize", "-v",
@@ -280,14 +954,153 @@ def main():
         help="Show visualization window"
     )
 
+    parser.add_argument(
+        "--calibration",
+        type=str,
+        help="Spot ROI calibration JSON for per-spot status"
+    )
+    parser.add_argument(
+        "--cameras", "-c",
+        type=str,
+        default=CAMERAS_CONFIG,
+        help="Camera list JSON for fleet mode (default: fetch from backend)"
+    )
+    parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        help=f"Worker pool size for fleet/batch mode (default: {FLEET_WORKERS} / {BATCH_WORKERS})"
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=SHARD_PROCESSES,
+        help="Fleet mode: run cameras in this many processing processes fed by capture processes "
+             "(0/1 = single process); shard i serves live views on --live-port + i and metrics on --metrics-port + 1 + i"
+    )
+    parser.add_argument(
+        "--live-port",
+        type=int,
+        default=LIVE_VIEW_PORT,
+        help="Serve annotated MJPEG streams at http://<host>:<port>/cameras/<id>.mjpg (0 = off; "
+             "single-camera modes use camera id 0)"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=METRICS_PORT,
+        help="Serve Prometheus metrics at http://<host>:<port>/metrics (0 = off)"
+    )
+    parser.add_argument(
+        "--record",
+        nargs="?",
+        const=RECORD_DIR,
+        metavar="DIR",
+        help=f"Record sampled frames and raw predictions to DIR (default: {RECORD_DIR})"
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        metavar="RECORDING",
+        help="Video/pipeline mode: process a recording (segment, directory or glob) with its recorded "
+             "predictions instead of inferring; results are only logged unless --publish is given"
+    )
+    parser.add_argument(
+        "--publish",
+        action="store_true",
+        help="Replay: push the replayed lot and spot states to --backend-url (overwrites its live state)"
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="Replay speed relative to capture time (0 = as fast as possible)"
+    )
+    parser.add_argument(
+        "--pool",
+        choices=["thread", "process"],
+        default=BATCH_POOL,
+        help="Worker pool type for batch mode"
+    )
+
     args = parser.parse_args()
 
+    if args.metrics_port:
+        MetricsServer(args.metrics_port).start()
+
+    sharded = args.mode == "fleet" and args.shards > 1
+    live_view = None
+    if args.live_port and args.mode in ["video", "stream", "pipeline", "fleet"] and not sharded:
+        live_view = LiveViewServer(args.live_port)
+        live_view.start()
+
+    if args.mode == "fleet":
+        workers = args.workers or FLEET_WORKERS
+        if sharded:
+            # Only lists the cameras: each shard spools to its own file through its own client
+            api_client = BackendClient(base_url=args.backend_url, durable=False)
+        else:
+            # Shared with the fleet, so a spool left by a previous run is replayed once
+            api_client = BackendClient(base_url=args.backend_url, pool_size=workers)
+        cameras = load_cameras(args.cameras, api_client)
+        if sharded:
+            api_client.close()
+        if not cameras:
+            logger.error("No active cameras to monitor")
+            sys.exit(1)
+        if sharded:
+            # Imported here: the shard processes import this module
+            from sharding import ShardSupervisor
+
+            if args.record:
+                logger.warning("Recording is not supported with --shards, ignoring --record")
+            ShardSupervisor(
+                cameras, shards=args.shards, backend_url=args.backend_url, workers=args.workers,
+                metrics_port=args.metrics_port, live_port=args.live_port
+            ).run()
+            return
+        fleet = FleetProcessor(cameras, workers=workers, live_view=live_view, api_client=api_client)
+        if args.record:
+            for processor in fleet.processors.values():
+                if processor.recorder is None:
+                    processor.start_recording(args.record)
+        fleet.run()
+        if live_view is not None:
+            live_view.stop()
+        return
+
+    if args.mode == "batch":
+        if not args.source:
+            logger.error("Image directory or glob required for batch mode")
+            sys.exit(1)
+        batch = BatchProcessor(args.output or BATCH_OUTPUT, workers=args.workers or BATCH_WORKERS, pool=args.pool)
+        manifest = batch.run(args.source)
+        print(f"\nBatch: {manifest['completed']}/{manifest['total']} images, "
+              f"{manifest['images_per_sec']:.1f} images/sec, {manifest['failed']} failed")
+        return
+
+    replay = detector = api_client = None
+    if args.replay:
+        replay = ReplaySource(args.replay, speed=args.replay_speed)
+        detector = ParkingDetector(backend=ReplayBackend(replay))
+        # Historical states must not overwrite the live lot by accident
+        if args.publish:
+            logger.warning(f"Publishing replayed results to {args.backend_url or BACKEND_API_URL}")
+        else:
+            api_client = DryRunClient()
+
     # Initialize processor
     processor = ParkingProcessor(
         parking_lot_id=args.parking_lot_id,
         source=args.source,
-        backend_url=args.backend_url
+        backend_url=args.backend_url,
+        detector=detector,
+        api_client=api_client,
+        spot_layout=load_spot_layout(path=args.calibration) if args.calibration else None,
+        live_feed=live_view.feed(0) if live_view is not None else None,
+        replay=replay
     )
+    if args.record and replay is None and processor.recorder is None:
+        processor.start_recording(args.record)
 
     if args.mode == "image":
         if not args.source:
@@ -304,9 +1117,21 @@ def main():
             result = processor.process_image(args.source)
             print(f"\nResults: {result['summary']}")
 
+        if processor.detector.cache is not None:
+            logger.info(f"Inference cache: {processor.detector.cache.stats()}")
+
     elif args.mode in ["video", "stream"]:
         processor.process_video()
 
+    elif args.mode == "pipeline":
+        processor.run_pipeline()
+
+    processor.close()
+    if api_client is not None:
+        api_client.close()
+    if live_view is not None:
+        live_view.stop()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,533 @@
+"""
+Frame and prediction recording for incident replay
+Append-only indexed segment files, and a replay source that feeds them back through the processor
+"""
+import os
+import glob
+import json
+import time
+import queue
+import struct
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import (
+    RECORD_DIR,
+    RECORD_INTERVAL,
+    RECORD_JPEG_QUALITY,
+    RECORD_SEGMENT_SECONDS,
+    RECORD_QUEUE_SIZE
+)
+from detector import DetectionBatch
+from backends import InferenceBackend
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".pvr"
+INDEX_SUFFIX = ".idx"
+
+# Segment layout: file header, then entries back to back:
+#   magic, metadata length, metadata JSON
+#   per entry: entry header, JPEG bytes, prediction bytes
+FILE_MAGIC = b"PVREC001"
+_FILE_HEADER = struct.Struct("<8sI")
+ENTRY_MAGIC = b"PVRF"
+_ENTRY_HEADER = struct.Struct("<4sdII")  # magic, captured_at, JPEG size, predictions size
+
+# Predictions: row count and class table size, class table ("\n" joined),
+# uint16 class ids, float32 rows of x, y, width, height, confidence
+_PREDICTIONS_HEADER = struct.Struct("<II")
+
+# Sidecar index, one fixed-size row per entry, for random access without scanning
+INDEX_DTYPE = np.dtype([
+    ("offset", "<u8"),
+    ("timestamp", "<f8"),
+    ("jpeg_size", "<u4"),
+    ("predictions_size", "<u4")
+])
+
+
+def encode_predictions(detections: DetectionBatch) -> bytes:
+    """Serialize a detection batch (unfiltered, in frame pixels) to the segment format"""
+    classes = "\n".join(detections.class_names).encode()
+    rows = np.empty((len(detections), 5), dtype="<f4")
+    rows[:, :4] = detections.boxes
+    rows[:, 4] = detections.confidences
+    return b"".join((
+        _PREDICTIONS_HEADER.pack(len(detections), len(classes)),
+        classes,
+        detections.class_ids.astype("<u2").tobytes(),
+        rows.tobytes()
+    ))
+
+
+def decode_predictions(data: bytes) -> DetectionBatch:
+    """Inverse of encode_predictions()"""
+    count, classes_size = _PREDICTIONS_HEADER.unpack_from(data)
+    offset = _PREDICTIONS_HEADER.size
+    classes = data[offset:offset + classes_size].decode().split("\n") if classes_size else []
+    offset += classes_size
+    class_ids = np.frombuffer(data, dtype="<u2", count=count, offset=offset)
+    offset += 2 * count
+    rows = np.frombuffer(data, dtype="<f4", count=count * 5, offset=offset).reshape(count, 5)
+    return DetectionBatch(rows[:, :4], rows[:, 4], class_ids, classes)
+
+
+def segment_paths(path: str) -> List[str]:
+    """Segment files of a recording: a segment, a directory of segments or a glob, in time order"""
+    if os.path.isdir(path):
+        paths = glob.glob(os.path.join(path, "*" + SEGMENT_SUFFIX))
+    elif os.path.isfile(path):
+        paths = [path]
+    else:
+        paths = glob.glob(path)
+    # Segment names end in their UTC start time, so names sort chronologically per camera
+    return sorted(p for p in paths if p.endswith(SEGMENT_SUFFIX))
+
+
+def _read_header(f) -> Tuple[Dict[str, Any], int]:
+    header = f.read(_FILE_HEADER.size)
+    if len(header) < _FILE_HEADER.size:
+        raise ValueError("Truncated segment header")
+    magic, size = _FILE_HEADER.unpack(header)
+    if magic != FILE_MAGIC:
+        raise ValueError("Not a ParkVision recording segment")
+    return json.loads(f.read(size)), _FILE_HEADER.size + size
+
+
+def _recover_index(path: str, data_start: int) -> np.ndarray:
+    """
+    Entries of a segment, from its index plus a scan of anything the index missed
+
+    Index rows pointing past the end of the data (the data write was torn)
+    are dropped; complete entries appended after the last indexed one (the
+    index write was lost) are found by walking their headers.
+    """
+    size = os.path.getsize(path)
+    index_path = path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+    index = np.fromfile(index_path, dtype=INDEX_DTYPE) if os.path.exists(index_path) else np.empty(0, INDEX_DTYPE)
+    if len(index):
+        ends = index["offset"] + _ENTRY_HEADER.size + index["jpeg_size"] + index["predictions_size"]
+        index = index[ends <= size]
+    if len(index):
+        last = index[-1]
+        position = int(last["offset"]) + _ENTRY_HEADER.size + int(last["jpeg_size"]) + int(last["predictions_size"])
+    else:
+        position = data_start
+
+    found = []
+    with open(path, "rb") as f:
+        f.seek(position)
+        while True:
+            header = f.read(_ENTRY_HEADER.size)
+            if len(header) < _ENTRY_HEADER.size:
+                break
+            magic, timestamp, jpeg_size, predictions_size = _ENTRY_HEADER.unpack(header)
+            end = position + _ENTRY_HEADER.size + jpeg_size + predictions_size
+            if magic != ENTRY_MAGIC or end > size:
+                break
+            found.append((position, timestamp, jpeg_size, predictions_size))
+            position = end
+            f.seek(position)
+    if found:
+        logger.info(f"Recovered {len(found)} unindexed entries in {path}")
+        index = np.concatenate((index, np.array(found, dtype=INDEX_DTYPE)))
+    return index
+
+
+class SegmentWriter:
+    """
+    Appends entries to one segment file and its index
+
+    Reopening an existing segment continues it: a torn tail left by a
+    crash is cut off and the index is repaired before the first append.
+    """
+
+    def __init__(self, path: str, metadata: Dict[str, Any] = None):
+        """
+        Open or create a segment
+
+        Args:
+            path: Segment file (.pvr)
+            metadata: Stored in the header of a new segment (camera, model, ...)
+        """
+        self.path = path
+        self.index_path = path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.entries = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                self.metadata, data_start = _read_header(f)
+            index = _recover_index(path, data_start)
+            end = data_start
+            if len(index):
+                last = index[-1]
+                end = int(last["offset"]) + _ENTRY_HEADER.size + int(last["jpeg_size"]) + int(last["predictions_size"])
+            with open(path, "r+b") as f:
+                f.truncate(end)
+            index.tofile(self.index_path)
+            self.entries = len(index)
+            self._file = open(path, "ab")
+        else:
+            self.metadata = dict(metadata or {}, created=time.time())
+            meta = json.dumps(self.metadata).encode()
+            self._file = open(path, "wb")
+            self._file.write(_FILE_HEADER.pack(FILE_MAGIC, len(meta)) + meta)
+            self._file.flush()
+            open(self.index_path, "wb").close()
+        self._index = open(self.index_path, "ab")
+
+    @property
+    def size(self) -> int:
+        return self._file.tell()
+
+    def append(self, timestamp: float, jpeg: bytes, predictions: bytes):
+        """
+        Append one entry
+
+        Args:
+            timestamp: Capture time, epoch seconds
+            jpeg: Encoded frame
+            predictions: Output of encode_predictions()
+        """
+        offset = self._file.tell()
+        self._file.write(_ENTRY_HEADER.pack(ENTRY_MAGIC, timestamp, len(jpeg), len(predictions)))
+        self._file.write(jpeg)
+        self._file.write(predictions)
+        self._file.flush()
+        # The index row goes last: a crash in between only costs a rescan of this entry
+        self._index.write(np.array([(offset, timestamp, len(jpeg), len(predictions))], dtype=INDEX_DTYPE).tobytes())
+        self._index.flush()
+        self.entries += 1
+
+    def close(self):
+        for f in (self._file, self._index):
+            if not f.closed:
+                os.fsync(f.fileno())
+                f.close()
+
+
+@dataclass
+class RecordedFrame:
+    """One recorded entry, decoded on demand"""
+    timestamp: float
+    jpeg: bytes
+    predictions_data: bytes
+
+    def decode(self, flags: int = cv2.IMREAD_COLOR) -> Optional[np.ndarray]:
+        return cv2.imdecode(np.frombuffer(self.jpeg, dtype=np.uint8), flags)
+
+    @property
+    def detections(self) -> DetectionBatch:
+        """Raw detections of the frame, before the confidence threshold"""
+        return decode_predictions(self.predictions_data)
+
+
+class SegmentReader:
+    """Random access to the entries of one segment"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self.metadata, data_start = _read_header(self._file)
+        self.index = _recover_index(path, data_start)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self.index["timestamp"]
+
+    def search(self, timestamp: float) -> int:
+        """Position of the first entry captured at or after timestamp"""
+        return int(np.searchsorted(self.timestamps, timestamp, side="left"))
+
+    def __getitem__(self, position: int) -> RecordedFrame:
+        offset, timestamp, jpeg_size, predictions_size = self.index[position].tolist()
+        self._file.seek(offset + _ENTRY_HEADER.size)
+        data = self._file.read(jpeg_size + predictions_size)
+        return RecordedFrame(timestamp=timestamp, jpeg=data[:jpeg_size], predictions_data=data[jpeg_size:])
+
+    def close(self):
+        self._file.close()
+
+
+class Recorder:
+    """
+    Records sampled frames of one camera with their raw predictions
+
+    record() only checks the sampling interval and hands a copy of the
+    frame to a writer thread, which JPEG-encodes it and appends it to the
+    current segment; a full queue drops the frame instead of stalling
+    processing. Segments are rotated every RECORD_SEGMENT_SECONDS of
+    capture time and named camera_<id>_<UTC start>.pvr.
+    """
+
+    def __init__(
+        self,
+        camera_id: int = 0,
+        directory: str = None,
+        interval: float = None,
+        jpeg_quality: int = None,
+        segment_seconds: float = None,
+        queue_size: int = None,
+        metadata: Dict[str, Any] = None
+    ):
+        """
+        Initialize the recorder and start its writer thread
+
+        Args:
+            camera_id: Camera being recorded
+            directory: Directory for segment files (default: RECORD_DIR)
+            interval: Minimum capture-time seconds between recorded frames (default: RECORD_INTERVAL, 0 = all)
+            jpeg_quality: JPEG quality 1-100 (default: RECORD_JPEG_QUALITY)
+            segment_seconds: Capture-time span of one segment (default: RECORD_SEGMENT_SECONDS)
+            queue_size: Frames waiting for the writer (default: RECORD_QUEUE_SIZE)
+            metadata: Extra segment header fields (e.g. the model id)
+        """
+        self.camera_id = camera_id
+        self.directory = directory or RECORD_DIR
+        self.interval = RECORD_INTERVAL if interval is None else interval
+        self._params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality or RECORD_JPEG_QUALITY]
+        self.segment_seconds = segment_seconds or RECORD_SEGMENT_SECONDS
+        self.metadata = dict(metadata or {}, camera_id=camera_id)
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size or RECORD_QUEUE_SIZE)
+        self._last_recorded = float("-inf")
+        self._writer: Optional[SegmentWriter] = None
+        self._segment_start = 0.0
+
+        self.recorded = 0
+        self.dropped = 0
+        self.bytes_written = 0
+
+        self._thread = threading.Thread(target=self._run, name=f"recorder-{camera_id}", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def record(self, frame: np.ndarray, captured_at: float, detections: DetectionBatch) -> bool:
+        """
+        Record a frame if the sampling interval has passed
+
+        Args:
+            frame: BGR frame (copied when sampled)
+            captured_at: Capture time, epoch seconds
+            detections: Raw detections of the frame, before the confidence threshold
+
+        Returns:
+            True if the frame was queued for writing
+        """
+        captured_at = captured_at or time.time()
+        if captured_at - self._last_recorded < self.interval:
+            return False
+        try:
+            self._queue.put_nowait((frame.copy(), captured_at, detections))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self._last_recorded = captured_at
+        return True
+
+    def _segment(self, captured_at: float) -> SegmentWriter:
+        if self._writer is not None and captured_at - self._segment_start < self.segment_seconds:
+            return self._writer
+        if self._writer is not None:
+            self._writer.close()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(captured_at))
+        path = os.path.join(self.directory, f"camera_{self.camera_id}_{stamp}{SEGMENT_SUFFIX}")
+        self._writer = SegmentWriter(path, self.metadata)
+        self._segment_start = captured_at
+        logger.info(f"Camera {self.camera_id}: recording to {path}")
+        return self._writer
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            frame, captured_at, detections = item
+            try:
+                ok, jpeg = cv2.imencode(".jpg", frame, self._params)
+                if not ok:
+                    raise ValueError("JPEG encoding failed")
+                predictions = encode_predictions(detections)
+                self._segment(captured_at).append(captured_at, jpeg.tobytes(), predictions)
+                self.recorded += 1
+                self.bytes_written += len(jpeg) + len(predictions) + _ENTRY_HEADER.size
+            except Exception as e:
+                logger.error(f"Camera {self.camera_id}: recording failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "pending": self.pending,
+            "bytes_written": self.bytes_written
+        }
+
+    def close(self):
+        """Write out queued frames and close the current segment"""
+        self._queue.put(None)
+        self._thread.join()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class ReplaySource:
+    """
+    Plays a recording back in place of a VideoStreamer
+
+    Frames come out in capture order with their original capture times,
+    either paced like the recording (speed 1.0 = real time, 2.0 = twice
+    as fast) or as fast as they are consumed (speed 0). The recorded
+    predictions of a handed-out frame are looked up by its capture time
+    with detections(), so replays need no inference at all.
+    """
+
+    # Same surface as VideoStreamer
+    threaded = False
+    is_file = True
+    dropped_frames = 0
+    skipped_frames = 0
+
+    def __init__(self, path: str, speed: float = 1.0, start: float = None, end: float = None):
+        """
+        Open a recording
+
+        Args:
+            path: Segment file, directory of segments or glob
+            speed: Playback speed relative to capture time (0 = as fast as possible)
+            start: Skip frames captured before this epoch time
+            end: Stop before frames captured at or after this epoch time
+        """
+        self.source = path
+        self.speed = speed
+        self.readers = [SegmentReader(p) for p in segment_paths(path)]
+        if not self.readers:
+            raise FileNotFoundError(f"No recording segments found at {path}")
+
+        # (reader, first position, end position) per segment, limited to the requested window
+        self._spans = []
+        for reader in self.readers:
+            lo = reader.search(start) if start is not None else 0
+            hi = reader.search(end) if end is not None else len(reader)
+            if hi > lo:
+                self._spans.append((reader, lo, hi))
+        self.total_frames = sum(hi - lo for _, lo, hi in self._spans)
+        self._entries = ((reader, position) for reader, lo, hi in self._spans for position in range(lo, hi))
+
+        # Predictions of frames handed out and not yet looked up (bounded: pipelines may drop frames)
+        self._detections: "OrderedDict[float, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._clock_start: Optional[Tuple[float, float]] = None
+        self._handed_out_at = None
+
+        self.finished = False
+        self.captured_frames = 0
+        self.last_timestamp = None
+        logger.info(f"Replaying {self.total_frames} frames from {len(self._spans)} segment(s) of {path}")
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.readers[0].metadata
+
+    def _pace(self, timestamp: float):
+        if self.speed <= 0:
+            return
+        now = time.monotonic()
+        if self._clock_start is None:
+            self._clock_start = (now, timestamp)
+            return
+        started, first = self._clock_start
+        delay = started + (timestamp - first) / self.speed - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def read_latest(self, timeout: float = 1.0):
+        """
+        Next recorded frame, paced by the playback speed
+
+        Returns:
+            (frame, capture timestamp) or (None, None) at the end of the recording
+        """
+        for reader, position in self._entries:
+            entry = reader[position]
+            frame = entry.decode()
+            if frame is None:
+                logger.warning(f"Skipping undecodable frame at {entry.timestamp} in {reader.path}")
+                continue
+            self._pace(entry.timestamp)
+            with self._lock:
+                self._detections[entry.timestamp] = entry.predictions_data
+                while len(self._detections) > 64:
+                    self._detections.popitem(last=False)
+            self.captured_frames += 1
+            self.last_timestamp = entry.timestamp
+            self._handed_out_at = time.time()
+            return frame, entry.timestamp
+        self.finished = True
+        return None, None
+
+    def get_frame(self):
+        frame, _ = self.read_latest()
+        return frame
+
+    def detections(self, captured_at: float) -> DetectionBatch:
+        """
+        Recorded raw detections of a frame handed out by this source
+
+        Args:
+            captured_at: Capture time returned with the frame
+
+        Returns:
+            DetectionBatch before the confidence threshold
+        """
+        with self._lock:
+            data = self._detections.pop(captured_at, None)
+        if data is None:
+            raise KeyError(f"No replayed frame captured at {captured_at}")
+        return decode_predictions(data)
+
+    @property
+    def frame_age(self) -> float:
+        """Seconds since the last frame was handed out (capture times are historical)"""
+        if self._handed_out_at is None:
+            return 0.0
+        return time.time() - self._handed_out_at
+
+    def release(self):
+        self.finished = True
+        for reader in self.readers:
+            reader.close()
+
+
+class ReplayBackend(InferenceBackend):
+    """
+    Placeholder backend for processors fed by a ReplaySource
+
+    Replayed frames carry their recorded predictions, so nothing may reach
+    an inference engine; any call here is a wiring error.
+    """
+
+    name = "replay"
+
+    def __init__(self, source: ReplaySource):
+        super().__init__(source.metadata.get("model", "unknown"))
+        self.source = source
+
+    def infer(self, image) -> List[Dict[str, Any]]:
+        raise RuntimeError("Replays use recorded predictions; inference is not available")
@@ -0,0 +1,211 @@
+"""
+Adaptive per-camera scheduling
+Sampling intervals follow each camera's activity within a global inference budget
+"""
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import (
+    SCHEDULER_BUDGET,
+    SCHEDULER_MIN_INTERVAL,
+    SCHEDULER_MAX_INTERVAL,
+    SCHEDULER_ACTIVITY_ALPHA,
+    SCHEDULER_PROFILE
+)
+
+logger = logging.getLogger(__name__)
+
+
+def parse_profile(spec: str) -> np.ndarray:
+    """
+    Parse an hour-of-day multiplier profile
+
+    Args:
+        spec: Comma separated "start-end:multiplier" ranges, e.g. "0-6:0.25,7-9:1.5"
+              (hours inclusive, unlisted hours default to 1.0)
+
+    Returns:
+        (24,) multipliers indexed by hour
+    """
+    profile = np.ones(24)
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        hours, multiplier = part.split(":")
+        start, _, end = hours.partition("-")
+        profile[int(start):int(end or start) + 1] = float(multiplier)
+    return profile
+
+
+def fair_share(demand: np.ndarray, budget: float) -> np.ndarray:
+    """
+    Max-min fair split of a budget (water filling)
+
+    Cameras asking for less than an equal share get what they ask for; the
+    remainder is split equally among the rest.
+
+    Args:
+        demand: (N,) requested rates
+        budget: Total rate available (<= 0 means unlimited)
+
+    Returns:
+        (N,) granted rates
+    """
+    if budget <= 0 or demand.sum() <= budget:
+        return demand.copy()
+
+    order = np.argsort(demand, kind="stable")
+    sorted_demand = demand[order]
+    n = len(demand)
+    satisfied = np.concatenate(([0.0], np.cumsum(sorted_demand)[:-1]))
+    # Equal share left for camera k onward if every cheaper camera is fully served
+    level = (budget - satisfied) / (n - np.arange(n))
+    k = int(np.argmax(sorted_demand >= level))
+
+    granted = np.empty(n)
+    granted[order] = np.minimum(sorted_demand, level[k])
+    return granted
+
+
+class AdaptiveScheduler:
+    """
+    Decides when each camera of a fleet is sampled next
+
+    Each camera reports an activity score (0 = nothing moved, 1 = spot or lot
+    status changed) after every run. Activity is tracked as an EMA and as a
+    learned 24-hour profile, so a lot that is usually busy at 8:00 is sampled
+    fast then even if the last frames were quiet. Activity maps to a rate
+    between 1/max_interval and 1/min_interval, scaled by the configured
+    hour-of-day profile, and the global budget is split max-min fairly.
+    Cameras whose lot is inactive are not scheduled at all.
+    """
+
+    def __init__(
+        self,
+        camera_ids: List[int],
+        lot_ids: List[int],
+        budget: float = None,
+        min_interval: float = None,
+        max_interval: float = None,
+        alpha: float = None,
+        profile: str = None
+    ):
+        """
+        Initialize the scheduler
+
+        Args:
+            camera_ids: Cameras to schedule
+            lot_ids: Parking lot of each camera
+            budget: Global inferences per second (0 for unlimited)
+            min_interval: Shortest interval for a fully active camera, seconds
+            max_interval: Longest interval for an idle camera, seconds
+            alpha: Weight of the newest activity observation
+            profile: Hour-of-day multiplier spec (see parse_profile)
+        """
+        self.camera_ids = list(camera_ids)
+        self.lot_ids = np.asarray(lot_ids, dtype=np.int64)
+        self.budget = SCHEDULER_BUDGET if budget is None else budget
+        self.min_interval = min_interval or SCHEDULER_MIN_INTERVAL
+        self.max_interval = max(max_interval or SCHEDULER_MAX_INTERVAL, self.min_interval)
+        self.alpha = alpha or SCHEDULER_ACTIVITY_ALPHA
+        self.profile = parse_profile(SCHEDULER_PROFILE if profile is None else profile)
+
+        n = len(self.camera_ids)
+        self._index: Dict[int, int] = {cid: i for i, cid in enumerate(self.camera_ids)}
+        # Unknown cameras start busy so they are sampled quickly until they settle
+        self.activity = np.ones(n)
+        self.hourly = np.full((n, 24), np.nan)
+        self.active = np.ones(n, dtype=bool)
+        self.rates = np.zeros(n)
+
+        now = time.monotonic()
+        # Stagger first runs so cameras do not hit the pool in lockstep
+        self.next_due = now + self.min_interval * np.arange(n) / max(n, 1)
+        self._lock = threading.Lock()
+        self._reallocate()
+
+    def _reallocate(self, hour: int = None):
+        """Recompute every camera's granted rate"""
+        hour = datetime.now().hour if hour is None else hour
+        learned = np.nan_to_num(self.hourly[:, hour], nan=0.0)
+        activity = np.maximum(self.activity, learned)
+
+        low, high = 1.0 / self.max_interval, 1.0 / self.min_interval
+        demand = np.clip((low + (high - low) * activity) * self.profile[hour], low, high)
+        demand[~self.active] = 0.0
+        self.rates = fair_share(demand, self.budget)
+
+    def observe(self, camera_id: int, activity: float):
+        """
+        Record how much a camera's scene changed in its last run
+
+        Args:
+            camera_id: Camera that just ran
+            activity: 0 (static) to 1 (status changed)
+        """
+        i = self._index[camera_id]
+        hour = datetime.now().hour
+        with self._lock:
+            self.activity[i] += self.alpha * (activity - self.activity[i])
+            previous = self.hourly[i, hour]
+            # Hour profile learns slowly: one busy frame should not mark the hour busy for days
+            self.hourly[i, hour] = activity if np.isnan(previous) else previous + 0.1 * (activity - previous)
+            self._reallocate(hour)
+
+    def set_lot_states(self, lot_states: Dict[int, bool]):
+        """
+        Update which lots are active; cameras of inactive lots stop being scheduled
+
+        Args:
+            lot_states: Parking lot id -> is_active (lots not listed keep their state)
+        """
+        with self._lock:
+            known = np.array([lot in lot_states for lot in self.lot_ids.tolist()], dtype=bool)
+            states = np.array([lot_states.get(lot, True) for lot in self.lot_ids.tolist()], dtype=bool)
+            reactivated = known & states & ~self.active
+            deactivated = known & ~states & self.active
+            self.active = np.where(known, states, self.active)
+            self.next_due[reactivated] = time.monotonic()
+            if reactivated.any() or deactivated.any():
+                logger.info(f"Scheduling {int(self.active.sum())}/{len(self.active)} cameras "
+                            f"({int((~self.active).sum())} in inactive lots)")
+            self._reallocate()
+
+    def interval(self, camera_id: int) -> float:
+        """Current sampling interval of a camera (inf when paused)"""
+        rate = self.rates[self._index[camera_id]]
+        return 1.0 / float(rate) if rate > 0 else float("inf")
+
+    def is_due(self, camera_id: int, now: float) -> bool:
+        i = self._index[camera_id]
+        return bool(self.active[i] and now >= self.next_due[i])
+
+    def advance(self, camera_id: int, now: float) -> float:
+        """
+        Schedule a camera's next run after it was started
+
+        Returns:
+            The time the run was due (for lag reporting)
+        """
+        i = self._index[camera_id]
+        with self._lock:
+            due = float(self.next_due[i])
+            # Never queue up a backlog for a camera that fell behind
+            self.next_due[i] = max(due + self.interval(camera_id), now)
+        return due
+
+    def next_wakeup(self) -> Optional[float]:
+        """Earliest due time of any active camera"""
+        due = self.next_due[self.active]
+        return float(due.min()) if len(due) else None
+
+    def stats(self) -> Dict[str, float]:
+        """Granted rates against the budget"""
+        return {
+            "active_cameras": int(self.active.sum()),
+            "granted_rate": float(self.rates.sum()),
+            "budget": self.budget
+        }
@@ -0,0 +1,703 @@
+"""
+Multi-process camera sharding
+Capture processes decode into shared-memory frame rings that processing shards read zero-copy
+"""
+import os
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+
+from config import (
+    CAPTURE_TARGET_FPS,
+    INFERENCE_BACKEND,
+    DISPATCH_ENABLED,
+    DISPATCH_CONCURRENCY,
+    DISPATCH_RATE,
+    DISPATCH_BURST,
+    SCHEDULER_BUDGET,
+    SPOOL_ENABLED,
+    SPOOL_PATH,
+    FLEET_WORKERS,
+    FLEET_REPORT_INTERVAL,
+    SHARD_PROCESSES,
+    SHARD_CAPTURE_PROCESSES,
+    SHARD_MAX_FRAME,
+    SHARD_HEARTBEAT_TIMEOUT,
+    SHARD_RESTART_BACKOFF
+)
+from metrics import MetricsServer, RING_FRAMES, SHARD_RESTARTS_TOTAL
+from streamer import VideoStreamer
+
+logger = logging.getLogger(__name__)
+
+RING_MAGIC = b"PVRING01"
+RING_SLOTS = 3  # one being written, the newest, one held by the reader
+NO_SLOT = -1
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("capacity", "<i8"),  # bytes per slot
+    ("latest_slot", "<i8"),
+    ("latest_seq", "<i8"),
+    ("read_seq", "<i8"),  # newest frame handed to the reader
+    ("pinned_slot", "<i8"),  # slot the reader is using
+    ("written", "<i8"),
+    ("dropped", "<i8"),  # frames replaced before the reader got them
+    ("finished", "<i8"),  # the source ended
+    ("heartbeat", "<f8"),  # writer's last sign of life, epoch seconds
+    ("needed", "<i8"),  # bytes of the largest frame refused for not fitting a slot
+    ("retired", "<i8"),  # replaced by a larger ring of the same name
+    ("slot_seq", "<i8", (RING_SLOTS,)),
+    ("slot_time", "<f8", (RING_SLOTS,)),
+    ("slot_shape", "<i8", (RING_SLOTS, 3)),
+])
+DATA_OFFSET = (HEADER_DTYPE.itemsize + 63) // 64 * 64
+
+
+def ring_name(camera_id: int) -> str:
+    """Shared memory name of a camera's ring, unique per supervisor process"""
+    return f"pv_{os.getpid()}_cam{camera_id}"
+
+
+def shard_spool_path(index: int, path: str = None) -> str:
+    """Spool file of one shard, so each process replays only the updates it spooled"""
+    root, ext = os.path.splitext(path or SPOOL_PATH)
+    return f"{root}.shard{index}{ext}"
+
+
+def max_frame_bytes(spec: str = None) -> int:
+    """Slot capacity for a "WIDTHxHEIGHT" BGR frame"""
+    width, height = (int(v) for v in (spec or SHARD_MAX_FRAME).lower().split("x"))
+    return width * height * 3
+
+
+def probe_frame_bytes(source: str) -> Optional[int]:
+    """Size of a source's first decoded frame, or None if it cannot be read"""
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    try:
+        ok, frame = capture.read()
+        return frame.nbytes if ok and frame is not None else None
+    finally:
+        capture.release()
+
+
+class FrameRing:
+    """
+    Triple-buffered frames of one camera in shared memory
+
+    One writer and one reader, in any processes. The lock only guards the
+    slot handoff, never the pixel copy: the writer always fills a slot that
+    is neither the newest frame nor the one the reader holds, so a frame
+    handed to the reader stays intact until the reader asks for the next one.
+    A process killed inside the handoff leaves the lock taken; recover()
+    frees it before the process is replaced.
+
+    Frames too large for a slot are refused and their size recorded; the
+    owner then replaces the ring with a larger one of the same name
+    (resize()), which the writer and the reader switch to on their own.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, lock, owner: bool = False):
+        self.shm = shm
+        self.lock = lock
+        self.owner = owner
+        self.header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=shm.buf)
+        self.capacity = int(self.header["capacity"][0])
+
+    @classmethod
+    def create(cls, name: str, capacity: int, lock) -> "FrameRing":
+        """Allocate a ring (the creator unlinks it)"""
+        shm = shared_memory.SharedMemory(name=name, create=True, size=DATA_OFFSET + RING_SLOTS * capacity)
+        header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=shm.buf)
+        header[0] = np.zeros((), dtype=HEADER_DTYPE)
+        header["capacity"] = capacity
+        header["latest_slot"] = NO_SLOT
+        header["pinned_slot"] = NO_SLOT
+        # Last, so a process attaching by name never sees a half-initialized ring
+        header["magic"] = RING_MAGIC
+        del header
+        return cls(shm, lock, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, lock) -> "FrameRing":
+        """Open a ring created by another process"""
+        shm = shared_memory.SharedMemory(name=name)
+        ring = cls(shm, lock)
+        if bytes(ring.header["magic"][0]) != RING_MAGIC:
+            ring.close()
+            raise ValueError(f"Not a frame ring: {name}")
+        return ring
+
+    def _follow(self):
+        """Switch to the ring that replaced this retired one, once it exists"""
+        try:
+            shm = shared_memory.SharedMemory(name=self.shm.name)
+        except FileNotFoundError:
+            return
+        header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=shm.buf)
+        if bytes(header["magic"][0]) != RING_MAGIC or header["retired"][0]:
+            del header
+            shm.close()
+            return
+        old = self.shm
+        self.shm, self.header, self.capacity = shm, header, int(header["capacity"][0])
+        try:
+            old.close()
+        except BufferError:
+            # A frame view of the old ring is still alive; the mapping goes away with it
+            pass
+
+    def resize(self, capacity: int):
+        """Replace the ring by an empty one with larger slots (owner only)"""
+        name = self.shm.name
+        self.header["retired"] = 1
+        self.close()
+        ring = FrameRing.create(name, capacity, self.lock)
+        self.shm, self.header, self.capacity = ring.shm, ring.header, ring.capacity
+
+    def _view(self, slot: int, shape: Tuple[int, ...]) -> np.ndarray:
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=DATA_OFFSET + slot * self.capacity)
+
+    def write(self, frame: np.ndarray, captured_at: float):
+        """
+        Publish a frame as the newest one
+
+        Raises:
+            ValueError: The frame does not fit a slot. Frames are never
+                resized: spot layouts and regions are in native pixels.
+        """
+        if self.header["retired"][0]:
+            self._follow()
+        if frame.ndim == 2:
+            frame = frame[:, :, None]
+        if frame.nbytes > self.capacity:
+            self.header["needed"] = max(int(self.header["needed"][0]), frame.nbytes)
+            raise ValueError(f"{frame.shape[1]}x{frame.shape[0]} frame exceeds the ring slot of {self.capacity} bytes")
+
+        header = self.header
+        with self.lock:
+            busy = {int(header["latest_slot"][0]), int(header["pinned_slot"][0])}
+            slot = next(s for s in range(RING_SLOTS) if s not in busy)
+        np.copyto(self._view(slot, frame.shape), frame)
+
+        with self.lock:
+            seq = int(header["latest_seq"][0]) + 1
+            if header["latest_slot"][0] != NO_SLOT and header["read_seq"][0] < seq - 1:
+                header["dropped"] += 1
+            header["slot_seq"][0, slot] = seq
+            header["slot_time"][0, slot] = captured_at
+            header["slot_shape"][0, slot] = frame.shape
+            header["latest_slot"] = slot
+            header["latest_seq"] = seq
+            header["written"] += 1
+
+    def read(self) -> Tuple[Optional[np.ndarray], Optional[float]]:
+        """
+        Take the newest frame not read before
+
+        Returns:
+            (view into shared memory, valid until the next read; capture time)
+            or (None, None) when there is no new frame
+        """
+        if self.header["retired"][0]:
+            self._follow()
+        header = self.header
+        with self.lock:
+            seq = int(header["latest_seq"][0])
+            if seq <= header["read_seq"][0] or header["latest_slot"][0] == NO_SLOT:
+                return None, None
+            slot = int(header["latest_slot"][0])
+            header["pinned_slot"] = slot
+            header["read_seq"] = seq
+            shape = tuple(int(v) for v in header["slot_shape"][0, slot])
+            captured_at = float(header["slot_time"][0, slot])
+        view = self._view(slot, shape)
+        return (view[:, :, 0] if shape[2] == 1 else view), captured_at
+
+    def recover(self, timeout: float = 1.0) -> bool:
+        """
+        Free the lock if a dead process left it taken
+
+        The handoff holds the lock for microseconds, so a lock that stays
+        taken for the timeout belongs to a process that died holding it.
+
+        Returns:
+            Whether the lock had to be freed
+        """
+        if self.lock.acquire(timeout=timeout):
+            self.lock.release()
+            return False
+        self.lock.release()
+        return True
+
+    @property
+    def needed(self) -> int:
+        return int(self.header["needed"][0])
+
+    def beat(self):
+        self.header["heartbeat"] = time.time()
+
+    def finish(self):
+        self.header["finished"] = 1
+
+    @property
+    def finished(self) -> bool:
+        return bool(self.header["finished"][0])
+
+    def stats(self) -> Dict[str, Any]:
+        """Frame counters and age of the newest frame"""
+        header = self.header
+        slot = int(header["latest_slot"][0])
+        return {
+            "written": int(header["written"][0]),
+            "dropped": int(header["dropped"][0]),
+            "frame_age": time.time() - float(header["slot_time"][0, slot]) if slot != NO_SLOT else None,
+            "heartbeat_age": time.time() - float(header["heartbeat"][0]) if header["heartbeat"][0] else None
+        }
+
+    def close(self):
+        """Unmap the ring (and remove it if this process created it)"""
+        self.header = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Frame views still alive; the mapping goes away with them
+            pass
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class RingReader:
+    """
+    VideoStreamer stand-in that reads a camera's frame ring
+
+    Frames are views into shared memory, valid until the next read_latest()
+    call, so a FleetProcessor can run on them without copies.
+    """
+
+    def __init__(self, ring: FrameRing, source: str = None):
+        self.ring = ring
+        self.source = source or ring.shm.name
+        self.threaded = True
+        self.last_timestamp = None
+        self.skipped_frames = 0
+
+    def read_latest(self, timeout: float = 1.0):
+        """
+        Get the newest frame not returned before, with its capture time
+
+        Returns:
+            (frame, capture timestamp) or (None, None) if no new frame arrived
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            frame, captured_at = self.ring.read()
+            if frame is not None:
+                self.last_timestamp = captured_at
+                return frame, captured_at
+            if self.ring.finished or time.monotonic() >= deadline:
+                return None, None
+            time.sleep(min(0.005, max(0.0, deadline - time.monotonic())))
+
+    def get_frame(self):
+        frame, _ = self.read_latest()
+        return frame
+
+    @property
+    def finished(self) -> bool:
+        return self.ring.finished
+
+    @property
+    def captured_frames(self) -> int:
+        return int(self.ring.header["written"][0])
+
+    @property
+    def dropped_frames(self) -> int:
+        return int(self.ring.header["dropped"][0])
+
+    @property
+    def frame_age(self) -> float:
+        if self.last_timestamp is None:
+            return 0.0
+        return time.time() - self.last_timestamp
+
+    def release(self):
+        self.ring.close()
+
+
+def _ignore_interrupts():
+    """Workers stop when the supervisor says so, not on the terminal's Ctrl-C"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _pump(camera_id: int, source: str, ring: FrameRing, stop: threading.Event):
+    """Capture thread: decode one camera and publish its frames to the ring"""
+    streamer = VideoStreamer(int(source) if source.isdigit() else source, threaded=True, target_fps=CAPTURE_TARGET_FPS)
+    refused = False
+    try:
+        while not stop.is_set():
+            frame, captured_at = streamer.read_latest(timeout=1.0)
+            ring.beat()
+            if frame is not None:
+                try:
+                    ring.write(frame, captured_at)
+                    refused = False
+                except ValueError as e:
+                    # The supervisor grows the ring; frames are dropped until then
+                    if not refused:
+                        logger.warning(f"Camera {camera_id}: {e}, waiting for a larger ring")
+                    refused = True
+            elif streamer.finished:
+                logger.info(f"Camera {camera_id} source ended")
+                ring.finish()
+                break
+    finally:
+        streamer.release()
+
+
+def _capture_main(heartbeat, stop, cameras: List[Tuple[int, str]], rings: Dict[int, Tuple[str, Any]]):
+    """Capture process: one decoding thread per camera"""
+    _ignore_interrupts()
+    attached = {camera_id: FrameRing.attach(name, lock) for camera_id, (name, lock) in rings.items()}
+    pumps_stop = threading.Event()
+    threads = [
+        threading.Thread(target=_pump, args=(camera_id, source, attached[camera_id], pumps_stop),
+                         name=f"capture-{camera_id}", daemon=True)
+        for camera_id, source in cameras
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while not stop.value:
+            heartbeat.value = time.time()
+            time.sleep(1.0)
+            dead = [t.name for t in threads if not t.is_alive() and not attached[int(t.name.split("-")[1])].finished]
+            if dead:
+                # Let the supervisor start the process over
+                logger.error(f"Capture threads died: {dead}")
+                os._exit(1)
+    finally:
+        pumps_stop.set()
+        for thread in threads:
+            thread.join(timeout=2)
+        for ring in attached.values():
+            ring.close()
+
+
+def _shard_main(
+    heartbeat,
+    stop,
+    index: int,
+    cameras: list,
+    rings: Dict[int, Tuple[str, Any]],
+    backend_url: str,
+    workers: int,
+    metrics_port: int,
+    live_port: int,
+    share: float
+):
+    """
+    Processing shard: a FleetProcessor over this shard's cameras, reading frames from the rings
+
+    The host's inference quota (DISPATCH_RATE, DISPATCH_BURST) and scheduler
+    budget are split over the shards by share, their fraction of the cameras.
+    """
+    from processor import FleetProcessor
+    from live_view import LiveViewServer
+    from backends import RoboflowBackend
+    from detector import ParkingDetector
+    from dispatcher import InferenceDispatcher
+    from api_client import BackendClient
+    from spool import UpdateSpool
+
+    _ignore_interrupts()
+    if metrics_port:
+        MetricsServer(metrics_port).start()
+    live_view = None
+    if live_port:
+        live_view = LiveViewServer(live_port)
+        live_view.start()
+
+    detector = None
+    if DISPATCH_ENABLED and INFERENCE_BACKEND.lower() == RoboflowBackend.name:
+        backend = RoboflowBackend(pool_size=DISPATCH_CONCURRENCY)
+        burst = max(1, round(DISPATCH_BURST * share)) if DISPATCH_BURST else None
+        detector = ParkingDetector(
+            backend=backend, dispatcher=InferenceDispatcher(backend, rate=DISPATCH_RATE * share, burst=burst)
+        )
+    api_client = BackendClient(
+        base_url=backend_url, pool_size=workers,
+        spool=UpdateSpool(shard_spool_path(index)) if SPOOL_ENABLED else None
+    )
+    fleet = FleetProcessor(
+        cameras, workers=workers, live_view=live_view, detector=detector, api_client=api_client,
+        budget=SCHEDULER_BUDGET * share
+    )
+    for cam in cameras:
+        name, lock = rings[cam.camera_id]
+        fleet.streamers[cam.camera_id] = RingReader(FrameRing.attach(name, lock), source=cam.source)
+
+    def watch():
+        # Beats come from the scheduling loop, so a hung loop goes silent and gets the shard restarted
+        while not stop.value:
+            heartbeat.value = fleet.last_loop or time.time()
+            time.sleep(1.0)
+        fleet.running = False
+
+    threading.Thread(target=watch, name="shard-heartbeat", daemon=True).start()
+    logger.info(f"Shard {index}: cameras {[cam.camera_id for cam in cameras]}")
+    try:
+        fleet.run()
+    finally:
+        if live_view is not None:
+            live_view.stop()
+
+
+def assign_cameras(cameras: list, shards: int) -> List[list]:
+    """
+    Split cameras over shards, keeping each parking lot's cameras together
+
+    Lots are placed largest first on the least loaded shard.
+    """
+    lots: Dict[int, list] = {}
+    for cam in cameras:
+        lots.setdefault(cam.parking_lot_id, []).append(cam)
+    groups: List[list] = [[] for _ in range(max(1, shards))]
+    for lot in sorted(lots.values(), key=len, reverse=True):
+        min(groups, key=len).extend(lot)
+    return [group for group in groups if group]
+
+
+@dataclass
+class _Worker:
+    """A supervised child process"""
+    name: str
+    target: Any
+    args: tuple
+    heartbeat: Any
+    rings: List[FrameRing]
+    process: Any = None
+    started_at: float = 0.0
+    restarts: int = 0
+    next_start: float = 0.0
+    failures: int = 0  # consecutive short-lived runs, for the backoff
+    restarts_metric: Any = field(default=None, repr=False)
+
+
+class ShardSupervisor:
+    """
+    Runs a camera fleet as several processes on one host
+
+    Capture processes decode their cameras into per-camera shared-memory
+    rings; processing shards each run a FleetProcessor over a subset of the
+    cameras (a parking lot's cameras stay together) and read frames from
+    the rings without copying. Decoding and the Python-heavy processing
+    both spread over cores instead of one interpreter. Each shard gets its
+    camera share of the inference rate and scheduler budget, and spools
+    undeliverable updates to its own file.
+
+    The supervisor owns the rings, so a crashed worker loses nothing but
+    its in-flight frames. Workers that exit or stop sending heartbeats are
+    restarted with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        cameras: list,
+        shards: int = None,
+        capture_processes: int = None,
+        backend_url: str = None,
+        workers: int = None,
+        metrics_port: int = 0,
+        live_port: int = 0,
+        heartbeat_timeout: float = None,
+        max_backoff: float = None
+    ):
+        """
+        Initialize the supervisor
+
+        Args:
+            cameras: Cameras to monitor (CameraConfig)
+            shards: Processing processes (default: SHARD_PROCESSES, at most one per camera)
+            capture_processes: Decoding processes (default: SHARD_CAPTURE_PROCESSES, 0 = one per shard)
+            backend_url: Backend API URL
+            workers: Inference worker pool size of each shard
+            metrics_port: Shard i serves metrics on metrics_port + 1 + i (0 = off)
+            live_port: Shard i serves live views on live_port + i (0 = off)
+            heartbeat_timeout: Seconds of silence before a worker is restarted
+            max_backoff: Longest wait before restarting a crashing worker
+        """
+        self.cameras = cameras
+        shards = shards or SHARD_PROCESSES or os.cpu_count() or 1
+        self.groups = assign_cameras(cameras, min(shards, len(cameras)))
+        capture_processes = min(capture_processes or SHARD_CAPTURE_PROCESSES or len(self.groups), len(cameras))
+        self.capture_groups = [cameras[i::capture_processes] for i in range(capture_processes)]
+        self.backend_url = backend_url
+        self.workers = workers or FLEET_WORKERS
+        self.metrics_port = metrics_port
+        self.live_port = live_port
+        self.heartbeat_timeout = SHARD_HEARTBEAT_TIMEOUT if heartbeat_timeout is None else heartbeat_timeout
+        self.max_backoff = SHARD_RESTART_BACKOFF if max_backoff is None else max_backoff
+
+        # Children import the processing stack themselves instead of inheriting threads and sockets
+        self._ctx = multiprocessing.get_context("spawn")
+        # Plain shared flags, not Events: a killed worker must not be able to leave a lock taken
+        self._stop = self._ctx.Value("b", 0, lock=False)
+        self.rings: Dict[int, FrameRing] = {}
+        self.workers_list: List[_Worker] = []
+        self.running = False
+
+    def _create_rings(self):
+        """One ring per camera, sized from its first frame (SHARD_MAX_FRAME if it cannot be read yet)"""
+        with ThreadPoolExecutor(max_workers=min(16, len(self.cameras)), thread_name_prefix="probe") as executor:
+            probed = list(executor.map(probe_frame_bytes, [cam.source for cam in self.cameras]))
+        for cam, capacity in zip(self.cameras, probed):
+            if capacity is None:
+                capacity = max_frame_bytes()
+                logger.warning(f"Camera {cam.camera_id}: no frame to size its ring, assuming {SHARD_MAX_FRAME}")
+            ring = FrameRing.create(ring_name(cam.camera_id), capacity, self._ctx.Lock())
+            self.rings[cam.camera_id] = ring
+            camera = str(cam.camera_id)
+            RING_FRAMES.labels(camera, "written").set_function(lambda r=ring: r.header["written"][0] if r.header is not None else 0)
+            RING_FRAMES.labels(camera, "dropped").set_function(lambda r=ring: r.header["dropped"][0] if r.header is not None else 0)
+        total = sum(ring.capacity for ring in self.rings.values()) * RING_SLOTS
+        logger.info(f"Created {len(self.rings)} frame rings, {total / 1e6:.1f} MB")
+
+    def _ring_specs(self, cameras: list) -> Dict[int, Tuple[str, Any]]:
+        return {cam.camera_id: (self.rings[cam.camera_id].shm.name, self.rings[cam.camera_id].lock) for cam in cameras}
+
+    def _add_worker(self, name: str, cameras: list, target, args: tuple):
+        heartbeat = self._ctx.Value("d", 0.0, lock=False)
+        worker = _Worker(
+            name=name, target=target, args=(heartbeat, self._stop) + args, heartbeat=heartbeat,
+            rings=[self.rings[cam.camera_id] for cam in cameras]
+        )
+        worker.restarts_metric = SHARD_RESTARTS_TOTAL.labels(name)
+        self.workers_list.append(worker)
+
+    def _start(self, worker: _Worker):
+        worker.heartbeat.value = time.time()
+        worker.process = self._ctx.Process(target=worker.target, args=worker.args, name=worker.name, daemon=True)
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        logger.info(f"Started {worker.name} (pid {worker.process.pid})")
+
+    def start(self):
+        """Create the rings and start every worker"""
+        self._create_rings()
+        for i, group in enumerate(self.capture_groups):
+            sources = [(cam.camera_id, cam.source) for cam in group]
+            self._add_worker(f"capture-{i}", group, _capture_main, (sources, self._ring_specs(group)))
+        for i, group in enumerate(self.groups):
+            self._add_worker(f"shard-{i}", group, _shard_main, (
+                i, group, self._ring_specs(group), self.backend_url, self.workers,
+                self.metrics_port + 1 + i if self.metrics_port else 0,
+                self.live_port + i if self.live_port else 0,
+                len(group) / len(self.cameras)
+            ))
+        for worker in self.workers_list:
+            self._start(worker)
+        self.running = True
+        logger.info(f"Supervising {len(self.capture_groups)} capture processes and {len(self.groups)} shards "
+                     f"for {len(self.cameras)} cameras")
+
+    def check(self):
+        """Grow rings that refused a frame, restart workers that exited or went silent"""
+        for camera_id, ring in self.rings.items():
+            if ring.needed > ring.capacity:
+                logger.warning(f"Camera {camera_id}: {ring.needed}-byte frames do not fit its ring, replacing it")
+                ring.resize(ring.needed)
+        now = time.monotonic()
+        for worker in self.workers_list:
+            process = worker.process
+            if process is not None:
+                silent = time.time() - worker.heartbeat.value
+                if process.is_alive() and silent < self.heartbeat_timeout:
+                    continue
+                if process.is_alive():
+                    logger.error(f"{worker.name} silent for {silent:.0f}s, restarting")
+                    process.kill()
+                    process.join(timeout=5)
+                else:
+                    logger.error(f"{worker.name} exited with code {process.exitcode}, restarting")
+                # Quick deaths back off exponentially, a long healthy run resets the backoff
+                worker.failures = worker.failures + 1 if now - worker.started_at < self.max_backoff else 1
+                worker.next_start = now + min(2 ** (worker.failures - 1), self.max_backoff)
+                worker.process = None
+            if now >= worker.next_start:
+                for ring in worker.rings:
+                    if ring.recover():
+                        logger.warning(f"Freed the frame ring {ring.shm.name} left locked by {worker.name}")
+                worker.restarts += 1
+                worker.restarts_metric.inc()
+                self._start(worker)
+
+    def stats(self) -> Dict[str, Any]:
+        """Worker restarts and per-camera ring counters"""
+        return {
+            "workers": {w.name: {"alive": w.process is not None and w.process.is_alive(), "restarts": w.restarts}
+                        for w in self.workers_list},
+            "rings": {camera_id: ring.stats() for camera_id, ring in self.rings.items()}
+        }
+
+    def stop(self):
+        """Stop every worker and remove the rings"""
+        self.running = False
+        self._stop.value = 1
+        deadline = time.monotonic() + 15.0
+        for worker in self.workers_list:
+            if worker.process is not None:
+                worker.process.join(timeout=max(0.1, deadline - time.monotonic()))
+                if worker.process.is_alive():
+                    logger.warning(f"{worker.name} did not stop, killing it")
+                    worker.process.kill()
+                    worker.process.join(timeout=5)
+        for camera_id, ring in self.rings.items():
+            RING_FRAMES.remove(str(camera_id), "written")
+            RING_FRAMES.remove(str(camera_id), "dropped")
+            ring.close()
+        self.rings.clear()
+
+    def run(self, duration: float = None):
+        """
+        Supervise until stopped
+
+        Args:
+            duration: Seconds to run (None for infinite)
+        """
+        self.start()
+        start = time.monotonic()
+        next_report = start + FLEET_REPORT_INTERVAL
+        try:
+            while self.running:
+                now = time.monotonic()
+                if duration and now - start >= duration:
+                    break
+                self.check()
+                if now >= next_report:
+                    stats = self.stats()
+                    logger.info(f"Shard workers: {stats['workers']}")
+                    for camera_id, ring in stats["rings"].items():
+                        age = ring["frame_age"]
+                        logger.info(f"Camera {camera_id} ring: {ring['written']} frames, {ring['dropped']} dropped, "
+                                    f"newest {age:.1f}s old" if age is not None else
+                                    f"Camera {camera_id} ring: no frames yet")
+                    next_report = now + FLEET_REPORT_INTERVAL
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            logger.info("Sharded fleet stopped by user")
+        finally:
+            self.stop()
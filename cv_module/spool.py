@@ -0,0 +1,153 @@
+"""
+Durable spool for backend updates
+Append-only SQLite log of updates the backend could not take, replayed in order
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Tuple
+
+from config import SPOOL_PATH, SPOOL_MAX_MB
+
+logger = logging.getLogger(__name__)
+
+# Update kinds; each is compacted to its latest entry per key on replay
+LOT_STATUS = "lot_status"
+SPOT_STATUS = "spot_status"
+EVENT = "event"
+
+
+class UpdateSpool:
+    """
+    On-disk queue of unsent updates
+
+    Entries carry the capture time of the frame they came from. Replay
+    reads the log compacted to the newest entry per (kind, key) - a spot
+    that flipped ten times during an outage is sent once, with its final
+    state - in original order. When the log outgrows max_bytes the oldest
+    entries are dropped first.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = None):
+        """
+        Initialize the spool
+
+        Args:
+            path: SQLite database file (default: SPOOL_PATH)
+            max_bytes: Payload size bound (default: SPOOL_MAX_MB)
+        """
+        self.path = path or SPOOL_PATH
+        self.max_bytes = max_bytes or SPOOL_MAX_MB * 1024 * 1024
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS updates ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, key TEXT, payload TEXT, "
+            "observed_at REAL, size INTEGER)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_updates_key ON updates (kind, key, seq)")
+        self._total_bytes, self._count = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM updates"
+        ).fetchone()
+
+        self.appended = 0
+        self.replayed = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, kind: str, key: Any, payload: Dict[str, Any], observed_at: float = None):
+        """
+        Record an update that could not be delivered
+
+        Args:
+            kind: LOT_STATUS, SPOT_STATUS or EVENT
+            key: Entity the update is about (lot id, spot id, ...)
+            payload: Request body to send on replay
+            observed_at: Capture time, epoch seconds (default: now)
+        """
+        data = json.dumps(payload, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO updates (kind, key, payload, observed_at, size) VALUES (?, ?, ?, ?, ?)",
+                (kind, str(key), data, observed_at or time.time(), len(data))
+            )
+            self._total_bytes += len(data)
+            self._count += 1
+            self.appended += 1
+            if self._total_bytes > self.max_bytes:
+                self._trim()
+
+    def _trim(self):
+        """Drop the oldest entries until the spool is back under 90% of its budget"""
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT seq, size FROM updates ORDER BY seq").fetchall()
+        cutoff = None
+        for seq, size in rows:
+            if self._total_bytes <= target:
+                break
+            self._total_bytes -= size
+            self._count -= 1
+            self.dropped += 1
+            cutoff = seq
+        if cutoff is not None:
+            self._conn.execute("DELETE FROM updates WHERE seq <= ?", (cutoff,))
+            logger.warning(f"Spool over {self.max_bytes // (1024 * 1024)} MB, dropped oldest updates up to #{cutoff}")
+
+    def compacted(self, limit: int = None) -> List[Tuple[int, str, str, Dict[str, Any], float]]:
+        """
+        Newest entry per (kind, key), oldest first
+
+        Returns:
+            (seq, kind, key, payload, observed_at) tuples
+        """
+        query = (
+            "SELECT seq, kind, key, payload, observed_at FROM updates "
+            "WHERE seq IN (SELECT MAX(seq) FROM updates GROUP BY kind, key) ORDER BY seq"
+        )
+        params = ()
+        if limit:
+            query += " LIMIT ?"
+            params = (limit,)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [(seq, kind, key, json.loads(payload), observed_at) for seq, kind, key, payload, observed_at in rows]
+
+    def acknowledge(self, entries: List[Tuple[int, str, str]]):
+        """
+        Remove delivered entries and everything older for the same keys
+
+        Args:
+            entries: (seq, kind, key) of delivered compacted entries
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for seq, kind, key in entries:
+                self._conn.execute(
+                    "DELETE FROM updates WHERE kind = ? AND key = ? AND seq <= ?", (kind, key, seq)
+                )
+            self._conn.execute("COMMIT")
+            self._total_bytes, self._count = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM updates"
+            ).fetchone()
+            self.replayed += len(entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self._count,
+            "bytes": self._total_bytes,
+            "appended": self.appended,
+            "replayed": self.replayed,
+            "dropped": self.dropped
+        }
+
+    def close(self):
+        self._conn.close()
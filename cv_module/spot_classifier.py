@@ -0,0 +1,301 @@
+"""
+Per-spot occupancy classifier
+Cheap CPU check of every calibrated spot between full detections
+"""
+import time
+import logging
+from typing import Dict, Tuple
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from config import (
+    SPOT_CLASSIFIER_PATCH,
+    SPOT_CLASSIFIER_MIN_CONFIDENCE,
+    SPOT_CLASSIFIER_DRIFT,
+    SPOT_CLASSIFIER_MIN_SAMPLES,
+    SPOT_CLASSIFIER_REFRESH
+)
+from spots import SpotLayout, SpotMatch
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SpotFeatures:
+    """Classifier input for every spot of one frame"""
+    x: np.ndarray  # (S, 4) edge density, color spread, difference from the empty reference, has reference
+    patches: np.ndarray  # (S, P, P) grayscale spot patches with their mean removed, zero outside the ROI
+
+
+@dataclass
+class SpotEstimate:
+    """Classifier output for every spot of one frame"""
+    occupied: np.ndarray  # (S,) bool
+    confidence: np.ndarray  # (S,) 0-1
+    reason: str  # why the full detector has to run, "" when it does not
+
+    @property
+    def needs_detection(self) -> bool:
+        return bool(self.reason)
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30.0, 30.0)))
+
+
+class SpotClassifier:
+    """
+    Occupancy of every spot from a few image statistics, learned from the detector
+
+    Each spot ROI is resampled to a small square patch; all patches come
+    from one remap call and every feature is computed over the (S, P, P)
+    stack at once:
+
+    - edge density: share of pixels on a strong brightness step (cars have
+      many, asphalt few)
+    - color spread: standard deviation of the spot's colors
+    - difference from the spot's learned empty reference, brightness
+      normalized so daylight changes do not count
+
+    A logistic model maps them to P(occupied). Its weights, the empty
+    references and each spot's last verified look are learned from the
+    full detections, so the classifier adapts to each camera. A spot that
+    still looks the way it did when the detector last confirmed it keeps
+    its committed state with full confidence.
+
+    The full detector is needed when a spot seems to have flipped, any
+    spot is uncertain or unknown, too few detector labels were seen yet,
+    or refresh_interval passed since the last detection. Spots the detector
+    still never matched after UNKNOWN_DETECTIONS full detections (occluded,
+    or too small to match) are left out of the decision; the periodic
+    refresh still picks them up if they become visible.
+    """
+
+    EDGE_DELTA = 24.0  # gray level step (horizontal + vertical) counted as an edge
+    LEARNING_RATE = 0.5
+    EPOCHS = 5  # gradient steps per detected frame
+    REFERENCE_ALPHA = 0.2  # weight of the newest empty look in the reference
+    UNKNOWN_DETECTIONS = 5  # full detections after which never-matched spots no longer force one
+    REASONS = ("refresh", "unknown", "learning", "flip", "uncertain")
+
+    def __init__(
+        self,
+        layout: SpotLayout,
+        patch_size: int = None,
+        min_confidence: float = None,
+        drift: float = None,
+        min_samples: int = None,
+        refresh_interval: float = None
+    ):
+        """
+        Initialize the classifier
+
+        Args:
+            layout: Spot ROIs of the camera
+            patch_size: Side of the square patch each spot is resampled to
+            min_confidence: Lowest per-spot confidence (0-1) that still skips the detector
+            drift: Mean patch difference (gray levels / 32) still taken as an unchanged spot
+            min_samples: Detector labels needed before the detector is ever skipped
+            refresh_interval: Seconds after which the detector runs anyway
+        """
+        self.layout = layout
+        self.patch_size = patch_size or SPOT_CLASSIFIER_PATCH
+        self.min_confidence = SPOT_CLASSIFIER_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self.drift = SPOT_CLASSIFIER_DRIFT if drift is None else drift
+        self.min_samples = SPOT_CLASSIFIER_MIN_SAMPLES if min_samples is None else min_samples
+        self.refresh_interval = SPOT_CLASSIFIER_REFRESH if refresh_interval is None else refresh_interval
+
+        num_spots, size = len(layout), self.patch_size
+        boxes = layout.boxes
+        # Sample positions of every patch pixel, in frame pixels
+        steps = (np.arange(size, dtype=np.float32) + 0.5) / size
+        self._xs = boxes[:, 0:1] + steps * (boxes[:, 2:3] - boxes[:, 0:1])  # (S, P)
+        self._ys = boxes[:, 1:2] + steps * (boxes[:, 3:4] - boxes[:, 1:2])  # (S, P)
+        spot_sizes = np.concatenate((boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]))
+        self._spot_size = float(np.median(spot_sizes)) if len(spot_sizes) else 1.0
+
+        # Patch pixels inside the spot polygon (the whole box for plain boxes)
+        mask = np.ones((num_spots, size, size), dtype=bool)
+        if layout.polygons is not None and num_spots:
+            points = np.stack((
+                np.broadcast_to(self._xs[:, None, :], mask.shape),
+                np.broadcast_to(self._ys[:, :, None], mask.shape)
+            ), axis=-1).reshape(-1, 2)
+            mask = layout._inside_polygons(np.repeat(np.arange(num_spots), size * size), points).reshape(mask.shape)
+        self._mask = mask.astype(np.float32)
+        self._mask_count = np.maximum(self._mask.sum(axis=(1, 2)), 1.0)
+        self._edge_mask = self._mask[:, :-1, :-1]
+        self._edge_count = np.maximum(self._edge_mask.sum(axis=(1, 2)), 1.0)
+
+        self._maps: Dict[Tuple[int, int], tuple] = {}
+
+        # Learned state: a prior that favours occupied on edges, spread and difference from empty
+        self.weights = np.array([6.0, 3.0, 4.0, 0.0], dtype=np.float32)
+        self.bias = -2.5
+        self.empty_reference = np.zeros((num_spots, size, size), dtype=np.float32)
+        self.has_reference = np.zeros(num_spots, dtype=bool)
+        self.verified = np.zeros((num_spots, size, size), dtype=np.float32)
+        self.has_verified = np.zeros(num_spots, dtype=bool)
+        self.samples = 0
+        self.detections = 0
+        self._last_verified = 0.0
+
+        self.skipped = 0
+        self.triggered = {reason: 0 for reason in self.REASONS}
+
+    def _sampling(self, height: int, width: int) -> tuple:
+        """Spot region, downscale factor and remap grids for a frame size, built once per size"""
+        sampling = self._maps.get((height, width))
+        if sampling is not None:
+            return sampling
+
+        # Shrink first (area filter) so the median spot spans about two patches:
+        # bilinear sampling of a much larger ROI would alias edges away. An integer
+        # factor over a region that is a multiple of it takes OpenCV's fast path
+        factor = max(1, int(self._spot_size / (2.0 * self.patch_size)))
+        boxes = self.layout.boxes
+        spans = []
+        for lo, hi, limit in (
+            (boxes[:, 0].min(), boxes[:, 2].max(), width),
+            (boxes[:, 1].min(), boxes[:, 3].max(), height)
+        ):
+            length = min(int(np.ceil((hi - lo + 2) / factor)) * factor, limit // factor * factor)
+            start = int(np.clip(np.floor(lo) - 1, 0, limit - length))
+            spans.append((start, length))
+        (x0, region_w), (y0, region_h) = spans
+
+        map_x = np.repeat((self._xs - x0) / factor - 0.5, self.patch_size, axis=0).astype(np.float32)
+        map_y = np.repeat(((self._ys - y0) / factor - 0.5).reshape(-1, 1), self.patch_size, axis=1).astype(np.float32)
+        map_x, map_y = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+        sampling = ((x0, y0, x0 + region_w, y0 + region_h), factor, map_x, map_y)
+        self._maps[(height, width)] = sampling
+        return sampling
+
+    def features(self, frame: np.ndarray) -> SpotFeatures:
+        """
+        Features of every spot in a frame
+
+        Args:
+            frame: numpy array (BGR format from OpenCV)
+        """
+        num_spots, size = len(self.layout), self.patch_size
+        (x0, y0, x1, y1), factor, map_x, map_y = self._sampling(frame.shape[0], frame.shape[1])
+        small = frame[y0:y1, x0:x1]
+        if factor > 1:
+            small = cv2.resize(small, ((x1 - x0) // factor, (y1 - y0) // factor), interpolation=cv2.INTER_AREA)
+        # One (S * P, P) image holding every spot patch
+        stacked = cv2.remap(small, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+        color = stacked.reshape(num_spots, size, size, -1).astype(np.float32)
+        if stacked.ndim == 3:
+            gray = cv2.cvtColor(stacked, cv2.COLOR_BGR2GRAY).reshape(num_spots, size, size).astype(np.float32)
+        else:
+            gray = color[..., 0]
+        mask, count = self._mask, self._mask_count
+
+        # Strong brightness steps inside the ROI
+        step = np.abs(np.diff(gray, axis=2))[:, :-1, :] + np.abs(np.diff(gray, axis=1))[:, :, :-1]
+        edges = ((step > self.EDGE_DELTA) * self._edge_mask).sum(axis=(1, 2)) / self._edge_count
+
+        # Color standard deviation, averaged over channels
+        weighted = color * mask[..., None]
+        mean = weighted.sum(axis=(1, 2)) / count[:, None]
+        variance = (((color - mean[:, None, None]) ** 2) * mask[..., None]).sum(axis=(1, 2)) / count[:, None]
+        spread = np.sqrt(variance).mean(axis=1) / 64.0
+
+        # Brightness-normalized patch, compared with the empty look of the spot
+        patches = (gray - ((gray * mask).sum(axis=(1, 2)) / count)[:, None, None]) * mask
+        difference = np.abs(patches - self.empty_reference).sum(axis=(1, 2)) / count / 32.0
+        difference[~self.has_reference] = 0.0
+
+        x = np.column_stack((edges, spread, difference, self.has_reference)).astype(np.float32)
+        return SpotFeatures(x=x, patches=patches)
+
+    def classify(self, features: SpotFeatures, committed: np.ndarray) -> SpotEstimate:
+        """
+        Estimate every spot and decide whether the full detector is needed
+
+        Args:
+            features: Output of features() for the frame
+            committed: (S,) committed spot states (-1 unknown, 0 empty, 1 occupied)
+
+        Returns:
+            SpotEstimate
+        """
+        p = _sigmoid(features.x @ self.weights + self.bias)
+        occupied = p >= 0.5
+        confidence = np.abs(2.0 * p - 1.0)
+
+        # Spots that still look as the detector last confirmed them keep their state
+        drift = np.abs(features.patches - self.verified).sum(axis=(1, 2)) / self._mask_count / 32.0
+        stable = self.has_verified & (drift < self.drift)
+        occupied = np.where(stable, committed == 1, occupied)
+        confidence = np.where(stable, 1.0, confidence)
+
+        known = committed >= 0
+        if time.monotonic() - self._last_verified >= self.refresh_interval:
+            reason = "refresh"
+        elif not known.all() and (self.detections < self.UNKNOWN_DETECTIONS or not known.any()):
+            reason = "unknown"
+        elif self.samples < self.min_samples:
+            reason = "learning"
+        elif (occupied != (committed == 1))[known].any():
+            reason = "flip"
+        elif (confidence < self.min_confidence)[known].any():
+            reason = "uncertain"
+        else:
+            reason = ""
+
+        if reason:
+            self.triggered[reason] += 1
+        else:
+            self.skipped += 1
+        return SpotEstimate(occupied=occupied, confidence=confidence, reason=reason)
+
+    def learn(self, features: SpotFeatures, match: SpotMatch, committed: np.ndarray):
+        """
+        Learn from the detector's result for a frame
+
+        Args:
+            features: Output of features() for the detected frame
+            match: Detections of the frame matched to the spots
+            committed: (S,) committed spot states after the frame
+        """
+        observed = match.matched
+        labels = match.occupied
+        self.detections += 1
+
+        if observed.any():
+            x = features.x[observed]
+            y = labels[observed].astype(np.float32)
+            for _ in range(self.EPOCHS):
+                error = _sigmoid(x @ self.weights + self.bias) - y
+                self.weights -= self.LEARNING_RATE * (x.T @ error) / len(y)
+                self.bias -= self.LEARNING_RATE * float(error.mean())
+            self.samples += len(y)
+
+        # Empty reference from spots the detector saw empty and that are committed empty
+        empty = observed & ~labels & (committed == 0)
+        blend = empty & self.has_reference
+        first = empty & ~self.has_reference
+        self.empty_reference[blend] += self.REFERENCE_ALPHA * (features.patches[blend] - self.empty_reference[blend])
+        self.empty_reference[first] = features.patches[first]
+        self.has_reference |= empty
+
+        # Current look of spots whose observation agrees with their committed state
+        agree = observed & (committed >= 0) & (labels == (committed == 1))
+        self.verified[agree] = features.patches[agree]
+        self.has_verified |= agree
+        self._last_verified = time.monotonic()
+
+    def stats(self) -> dict:
+        """Skip rate and why the detector was needed"""
+        total = self.skipped + sum(self.triggered.values())
+        return {
+            "skipped": self.skipped,
+            "triggered": dict(self.triggered),
+            "skip_rate": self.skipped / total if total else 0.0,
+            "samples": self.samples
+        }
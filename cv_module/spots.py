@@ -0,0 +1,415 @@
+"""
+Per-camera parking spot calibration
+Maps detections to ParkingSpot rows with one vectorized pass per frame
+"""
+import os
+import json
+import logging
+from typing import Any, List, Dict, Optional
+from dataclasses import dataclass
+
+import numpy as np
+
+from config import (
+    SPOT_CALIBRATION_DIR,
+    SPOT_MIN_IOU,
+    SPOT_SMOOTHING,
+    SPOT_EMA_ALPHA,
+    SPOT_OCCUPIED_THRESHOLD,
+    SPOT_EMPTY_THRESHOLD,
+    SPOT_VOTE_WINDOW,
+    SPOT_VOTE_MIN
+)
+
+logger = logging.getLogger(__name__)
+
+SPOT_EMPTY = "empty"
+SPOT_OCCUPIED = "occupied"
+SPOT_UNKNOWN = "unknown"
+
+
+@dataclass
+class SpotMatch:
+    """Result of matching one frame's detections to the spot layout (arrays indexed by spot)"""
+    spot_ids: np.ndarray  # (S,) int
+    detection_index: np.ndarray  # (S,) int, -1 when no detection matched
+    iou: np.ndarray  # (S,) float
+    occupied: np.ndarray  # (S,) bool, only meaningful where matched
+    confidence: np.ndarray  # (S,) float, 0 where unmatched
+
+    @property
+    def matched(self) -> np.ndarray:
+        return self.detection_index >= 0
+
+    def states(self) -> Dict[int, str]:
+        """Spot id -> state string (empty, occupied or unknown)"""
+        labels = np.where(self.occupied, SPOT_OCCUPIED, SPOT_EMPTY).astype(object)
+        labels[~self.matched] = SPOT_UNKNOWN
+        return dict(zip(self.spot_ids.tolist(), labels.tolist()))
+
+
+class SpotLayout:
+    """
+    Static spot ROIs for one camera
+
+    Calibration files are JSON:
+
+        {
+            "camera_id": 1,
+            "parking_lot_id": 1,
+            "spots": [
+                {"spot_id": 12, "box": [x1, y1, x2, y2]},
+                {"spot_id": 13, "polygon": [[x, y], [x, y], [x, y], [x, y]]}
+            ]
+        }
+
+    A detection matches a spot when its center falls inside the spot ROI
+    and the box IoU reaches min_iou; each spot keeps its best match.
+    """
+
+    def __init__(
+        self,
+        spot_ids: List[int],
+        boxes: np.ndarray,
+        polygons: List[Optional[np.ndarray]] = None,
+        min_iou: float = None,
+        camera_id: int = None,
+        parking_lot_id: int = None
+    ):
+        """
+        Initialize the layout
+
+        Args:
+            spot_ids: ParkingSpot ids, one per ROI
+            boxes: (S, 4) axis-aligned ROI bounds as x1, y1, x2, y2
+            polygons: Optional polygon per spot (None for plain boxes)
+            min_iou: Minimum IoU between detection and spot box
+            camera_id: Camera the layout belongs to
+            parking_lot_id: Parking lot of the spots
+        """
+        self.spot_ids = np.asarray(spot_ids, dtype=np.int64)
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.areas = (self.boxes[:, 2] - self.boxes[:, 0]) * (self.boxes[:, 3] - self.boxes[:, 1])
+        self.min_iou = SPOT_MIN_IOU if min_iou is None else min_iou
+        self.camera_id = camera_id
+        self.parking_lot_id = parking_lot_id
+
+        # Polygons padded to a common vertex count (repeating the last vertex
+        # adds zero-length edges) so containment runs as one array operation
+        self.polygons = None
+        if polygons and any(p is not None for p in polygons):
+            max_vertices = max(len(p) for p in polygons if p is not None)
+            padded = np.empty((len(polygons), max_vertices, 2), dtype=np.float32)
+            for i, (poly, box) in enumerate(zip(polygons, self.boxes)):
+                if poly is None:
+                    poly = np.array([[box[0], box[1]], [box[2], box[1]], [box[2], box[3]], [box[0], box[3]]])
+                poly = np.asarray(poly, dtype=np.float32)
+                padded[i, :len(poly)] = poly
+                padded[i, len(poly):] = poly[-1]
+            self.polygons = padded
+
+        self._build_grid()
+
+    def _build_grid(self):
+        """
+        Bucket spots into a uniform grid so each detection only checks the
+        few spots sharing its cell instead of every spot in the layout
+        """
+        if not len(self.boxes):
+            self._cell = 1.0
+            self._grid_shape = (1, 1)
+            self._grid = np.full((1, 1), -1, dtype=np.int64)
+            return
+
+        sizes = np.concatenate((self.boxes[:, 2] - self.boxes[:, 0], self.boxes[:, 3] - self.boxes[:, 1]))
+        self._cell = float(max(np.median(sizes), 1.0))
+        first = np.floor(self.boxes[:, :2] / self._cell).astype(np.int64).clip(0)
+        last = np.floor(self.boxes[:, 2:] / self._cell).astype(np.int64).clip(0)
+        grid_w, grid_h = int(last[:, 0].max()) + 1, int(last[:, 1].max()) + 1
+        self._grid_shape = (grid_w, grid_h)
+
+        buckets: Dict[int, List[int]] = {}
+        for i, ((cx1, cy1), (cx2, cy2)) in enumerate(zip(first, last)):
+            for gy in range(cy1, cy2 + 1):
+                for gx in range(cx1, cx2 + 1):
+                    buckets.setdefault(gy * grid_w + gx, []).append(i)
+
+        depth = max(len(v) for v in buckets.values())
+        self._grid = np.full((grid_w * grid_h, depth), -1, dtype=np.int64)
+        for cell, members in buckets.items():
+            self._grid[cell, :len(members)] = members
+
+    def __len__(self) -> int:
+        return len(self.spot_ids)
+
+    @classmethod
+    def from_file(cls, path: str, min_iou: float = None) -> "SpotLayout":
+        """Load a calibration JSON file"""
+        with open(path) as f:
+            data = json.load(f)
+
+        spot_ids, boxes, polygons = [], [], []
+        for spot in data["spots"]:
+            spot_ids.append(spot["spot_id"])
+            if "polygon" in spot:
+                poly = np.asarray(spot["polygon"], dtype=np.float32)
+                boxes.append([poly[:, 0].min(), poly[:, 1].min(), poly[:, 0].max(), poly[:, 1].max()])
+                polygons.append(poly)
+            else:
+                boxes.append(spot["box"])
+                polygons.append(None)
+
+        logger.info(f"Loaded {len(spot_ids)} spot ROIs from {path}")
+        return cls(
+            spot_ids, np.asarray(boxes, dtype=np.float32).reshape(-1, 4), polygons,
+            min_iou=min_iou,
+            camera_id=data.get("camera_id"),
+            parking_lot_id=data.get("parking_lot_id")
+        )
+
+    def _inside_polygons(self, spot_index: np.ndarray, points: np.ndarray) -> np.ndarray:
+        """Even-odd ray casting for (spot, point) pairs"""
+        poly = self.polygons[spot_index]  # (P, V, 2)
+        nxt = np.roll(poly, -1, axis=1)
+        px = points[:, 0:1]
+        py = points[:, 1:2]
+        x1, y1, x2, y2 = poly[..., 0], poly[..., 1], nxt[..., 0], nxt[..., 1]
+        crosses = (y1 > py) != (y2 > py)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        return np.count_nonzero(crosses & (px < x_at), axis=1) % 2 == 1
+
+    def match(self, boxes: np.ndarray, confidences: np.ndarray, occupied: np.ndarray) -> SpotMatch:
+        """
+        Match detections to spots
+
+        Args:
+            boxes: (D, 4) detection boxes as x1, y1, x2, y2
+            confidences: (D,) detection confidences
+            occupied: (D,) True where the detection is an occupied space/vehicle
+
+        Returns:
+            SpotMatch with per-spot arrays
+        """
+        num_spots = len(self.spot_ids)
+        detection_index = np.full(num_spots, -1, dtype=np.int64)
+        best_iou = np.zeros(num_spots, dtype=np.float32)
+        spot_occupied = np.zeros(num_spots, dtype=bool)
+        spot_confidence = np.zeros(num_spots, dtype=np.float32)
+
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        if len(boxes) and num_spots:
+            centers = np.empty((len(boxes), 2), dtype=np.float32)
+            centers[:, 0] = (boxes[:, 0] + boxes[:, 2]) * 0.5
+            centers[:, 1] = (boxes[:, 1] + boxes[:, 3]) * 0.5
+
+            # Candidate pairs from the spot grid, then exact center-in-box check
+            sb = self.boxes
+            cells = np.floor(centers / self._cell).astype(np.int64)
+            on_grid = (
+                (cells[:, 0] >= 0) & (cells[:, 0] < self._grid_shape[0])
+                & (cells[:, 1] >= 0) & (cells[:, 1] < self._grid_shape[1])
+            )
+            cell_index = np.where(on_grid, cells[:, 1] * self._grid_shape[0] + cells[:, 0], 0)
+            candidates = self._grid[cell_index]  # (D, depth)
+            candidates[~on_grid] = -1
+            det_idx, slot = np.nonzero(candidates >= 0)
+            spot_idx = candidates[det_idx, slot]
+
+            c = centers[det_idx]
+            a = sb[spot_idx]
+            inside = (a[:, 0] <= c[:, 0]) & (c[:, 0] <= a[:, 2]) & (a[:, 1] <= c[:, 1]) & (c[:, 1] <= a[:, 3])
+            spot_idx, det_idx = spot_idx[inside], det_idx[inside]
+
+            if self.polygons is not None and len(spot_idx):
+                keep = self._inside_polygons(spot_idx, centers[det_idx])
+                spot_idx, det_idx = spot_idx[keep], det_idx[keep]
+
+            if len(spot_idx):
+                # IoU only for candidate pairs
+                a, b = sb[spot_idx], boxes[det_idx]
+                iw = np.clip(np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]), 0, None)
+                ih = np.clip(np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]), 0, None)
+                inter = iw * ih
+                det_area = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+                iou = inter / np.maximum(self.areas[spot_idx] + det_area - inter, 1e-6)
+
+                keep = iou >= self.min_iou
+                spot_idx, det_idx, iou = spot_idx[keep], det_idx[keep], iou[keep]
+
+                # Best IoU per spot: sort by spot then descending IoU, take first of each run
+                order = np.lexsort((-iou, spot_idx))
+                spot_idx, det_idx, iou = spot_idx[order], det_idx[order], iou[order]
+                first = np.ones(len(spot_idx), dtype=bool)
+                first[1:] = spot_idx[1:] != spot_idx[:-1]
+                spot_idx, det_idx, iou = spot_idx[first], det_idx[first], iou[first]
+
+                detection_index[spot_idx] = det_idx
+                best_iou[spot_idx] = iou
+                spot_occupied[spot_idx] = np.asarray(occupied, dtype=bool)[det_idx]
+                spot_confidence[spot_idx] = np.asarray(confidences, dtype=np.float32)[det_idx]
+
+        return SpotMatch(self.spot_ids, detection_index, best_iou, spot_occupied, spot_confidence)
+
+    def match_detections(self, detections) -> SpotMatch:
+        """
+        Match a frame's detections to spots
+
+        Args:
+            detections: DetectionBatch or list of Detection objects
+
+        Returns:
+            SpotMatch with per-spot arrays
+        """
+        if hasattr(detections, "xyxy"):
+            return self.match(detections.xyxy, detections.confidences, detections.occupied_mask)
+
+        count = len(detections)
+        boxes = np.empty((count, 4), dtype=np.float32)
+        confidences = np.empty(count, dtype=np.float32)
+        occupied = np.empty(count, dtype=bool)
+        for i, d in enumerate(detections):
+            boxes[i] = (d.x - d.width / 2, d.y - d.height / 2, d.x + d.width / 2, d.y + d.height / 2)
+            confidences[i] = d.confidence
+            occupied[i] = d.is_occupied
+        return self.match(boxes, confidences, occupied)
+
+
+class SpotStateTracker:
+    """
+    Per-spot temporal smoothing with hysteresis
+
+    Raw per-frame matches are noisy around the confidence threshold. Each
+    spot keeps a smoothed occupancy score and only commits a new state
+    once the evidence crosses a hysteresis band:
+
+    - "ema": occupancy score that moves toward each observed class by
+      alpha * confidence, so even moderate-confidence detections eventually
+      commit; commit occupied at >= occupied_threshold, empty at <= empty_threshold
+    - "vote": N-of-M voting over the last M observations
+
+    Spots without a matching detection in a frame are left untouched. The
+    first observation of a spot commits immediately.
+    """
+
+    def __init__(
+        self,
+        num_spots: int,
+        mode: str = None,
+        alpha: float = None,
+        occupied_threshold: float = None,
+        empty_threshold: float = None,
+        vote_window: int = None,
+        vote_min: int = None
+    ):
+        """
+        Initialize the tracker
+
+        Args:
+            num_spots: Number of spots in the layout
+            mode: "ema" or "vote"
+            alpha: EMA weight of the newest observation
+            occupied_threshold: Score at or above which a spot becomes occupied
+            empty_threshold: Score at or below which a spot becomes empty
+            vote_window: M, observations kept per spot
+            vote_min: N, agreeing observations needed to commit
+        """
+        self.mode = (mode or SPOT_SMOOTHING).lower()
+        if self.mode not in ("ema", "vote"):
+            raise ValueError(f"Invalid smoothing mode: {self.mode}. Must be one of: ema, vote")
+        self.alpha = SPOT_EMA_ALPHA if alpha is None else alpha
+        self.occupied_threshold = SPOT_OCCUPIED_THRESHOLD if occupied_threshold is None else occupied_threshold
+        self.empty_threshold = SPOT_EMPTY_THRESHOLD if empty_threshold is None else empty_threshold
+        self.vote_window = vote_window or SPOT_VOTE_WINDOW
+        self.vote_min = vote_min or SPOT_VOTE_MIN
+
+        # Committed state per spot: -1 unknown, 0 empty, 1 occupied
+        self.state = np.full(num_spots, -1, dtype=np.int8)
+        self.score = np.zeros(num_spots, dtype=np.float32)
+        # Vote ring buffer: -1 no observation, 0 empty, 1 occupied
+        self.votes = np.full((num_spots, self.vote_window), -1, dtype=np.int8)
+        self._vote_pos = np.zeros(num_spots, dtype=np.int64)
+
+        self.observations = 0
+        self.transitions = 0
+
+    def update(self, match: SpotMatch) -> np.ndarray:
+        """
+        Feed one frame of matches
+
+        Args:
+            match: SpotMatch for the frame
+
+        Returns:
+            Indices of spots whose committed state changed
+        """
+        seen = np.nonzero(match.matched)[0]
+        if not len(seen):
+            return seen
+        occupied = match.occupied[seen]
+        self.observations += len(seen)
+
+        if self.mode == "ema":
+            # Score moves toward the observed class; confidence sets how far. Moving toward
+            # 1 - conf instead would leave low-confidence classes short of the thresholds
+            p = occupied.astype(np.float32)
+            step = self.alpha * match.confidence[seen]
+            first = self.state[seen] < 0
+            self.score[seen] = np.where(first, p, self.score[seen] + step * (p - self.score[seen]))
+            target = np.full(len(seen), -1, dtype=np.int8)
+            target[self.score[seen] >= self.occupied_threshold] = 1
+            target[self.score[seen] <= self.empty_threshold] = 0
+            target[first] = occupied[first]
+        else:
+            pos = self._vote_pos[seen]
+            self.votes[seen, pos] = occupied
+            self._vote_pos[seen] = (pos + 1) % self.vote_window
+            window = self.votes[seen]
+            target = np.full(len(seen), -1, dtype=np.int8)
+            target[np.count_nonzero(window == 1, axis=1) >= self.vote_min] = 1
+            target[np.count_nonzero(window == 0, axis=1) >= self.vote_min] = 0
+            first = self.state[seen] < 0
+            target[first] = occupied[first]
+
+        changed = (target >= 0) & (target != self.state[seen])
+        flipped = seen[changed]
+        self.state[flipped] = target[changed]
+        self.transitions += len(flipped)
+        return flipped
+
+    def states(self, spot_ids: np.ndarray) -> Dict[int, str]:
+        """Committed state per spot id"""
+        labels = np.array([SPOT_UNKNOWN, SPOT_EMPTY, SPOT_OCCUPIED], dtype=object)[self.state + 1]
+        return dict(zip(spot_ids.tolist(), labels.tolist()))
+
+    def summary(self) -> Dict[str, Any]:
+        """Lot counts from committed spot states (unknown spots excluded)"""
+        occupied = int(np.count_nonzero(self.state == 1))
+        empty = int(np.count_nonzero(self.state == 0))
+        total = occupied + empty
+        return {
+            "total": total,
+            "empty": empty,
+            "occupied": occupied,
+            "occupancy_rate": occupied / total if total else 0
+        }
+
+
+def load_spot_layout(camera_id: int = None, path: str = None) -> Optional[SpotLayout]:
+    """
+    Load the spot calibration of a camera
+
+    Args:
+        camera_id: Camera id, resolved to SPOT_CALIBRATION_DIR/camera_<id>.json
+        path: Explicit calibration file (takes precedence)
+
+    Returns:
+        SpotLayout, or None if the camera has no calibration
+    """
+    if path is None:
+        if camera_id is None:
+            return None
+        path = os.path.join(SPOT_CALIBRATION_DIR, f"camera_{camera_id}.json")
+        if not os.path.exists(path):
+            return None
+    return SpotLayout.from_file(path)
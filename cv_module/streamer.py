@@ -1,14 +1,225 @@
+"""
+Video capture for the CV processor
+Synchronous reads or a background grabber that always holds the newest frame
+"""
+import time
+import logging
+import threading
+from typing import Callable, Optional
+
 import cv2
 
+logger = logging.getLogger(__name__)
+
+
 class VideoStreamer:
-    def __init__(self, source=0):
+    """
+    Video source wrapper around cv2.VideoCapture
+
+    In threaded mode a background thread keeps draining the stream into a
+    triple buffer, so get_frame() always returns the newest decoded frame no
+    matter how slow the consumer is. Frames that were overwritten before
+    being consumed are counted as dropped.
+
+    With target_fps set, the stream is still advanced frame by frame with
+    grab() but only sampled frames are decoded with retrieve(). Files are
+    sampled on their own timeline (frame index / native FPS), live streams
+    on the wall clock. Grabbed but undecoded frames are counted as skipped.
+    """
+
+    def __init__(
+        self,
+        source=0,
+        threaded: bool = False,
+        target_fps: float = None,
+        on_decode: Callable[[float], None] = None
+    ):
+        """
+        Initialize the streamer
+
+        Args:
+            source: Camera index, file path or stream URL
+            threaded: Capture continuously on a background thread
+            target_fps: Decode at most this many frames per second (None/0 decodes every frame)
+            on_decode: Called with the seconds spent grabbing and decoding each returned frame
+        """
+        self.source = source
         self.cap = cv2.VideoCapture(source)
+        self.threaded = threaded
+        self.is_file = isinstance(source, str) and "://" not in source
+        self.target_fps = target_fps or 0.0
+        self._sample_period = 1.0 / self.target_fps if self.target_fps > 0 else 0.0
+        self._next_sample = 0.0
+        self._grabbed = 0
+        # Decode target reused across reads (valid until the next get_frame call)
+        self._frame = None
+
+        # Threaded capture state: back (being decoded), middle (newest), front (handed out)
+        self._back = [None, 0.0]
+        self._middle = [None, 0.0]
+        self._front = [None, 0.0]
+        self._fresh = False
+        self._cond = threading.Condition()
+        self._thread = None
+        self.running = False
+        self.finished = False
+        self.on_decode = on_decode
+
+        self.captured_frames = 0
+        self.dropped_frames = 0
+        self.skipped_frames = 0
+        self.last_timestamp = None
+
+        if threaded:
+            self.start()
+
+    def start(self):
+        """Start the background capture thread"""
+        if self._thread is not None:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._capture_loop, name="video-capture", daemon=True)
+        self._thread.start()
+
+    def _stream_time(self) -> float:
+        """Position used for sampling: seconds into the file, or the wall clock for live streams"""
+        if not self.is_file:
+            return time.monotonic()
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        if fps and fps > 0:
+            return (self._grabbed - 1) / fps
+        return self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+
+    def _grab_sampled(self) -> Optional[bool]:
+        """
+        Advance the stream by one frame and decide whether to decode it
+
+        Returns:
+            True to decode, False to skip, None when the grab failed
+        """
+        if not self.cap.grab():
+            return None
+        self._grabbed += 1
+        if not self._sample_period:
+            return True
+
+        position = self._stream_time()
+        if position < self._next_sample:
+            self.skipped_frames += 1
+            return False
+        # No catch-up bursts after a stall: the next sample is one period from now
+        self._next_sample = max(self._next_sample + self._sample_period, position)
+        return True
+
+    def _capture_loop(self):
+        """Drain the stream, publishing each decoded frame as the newest one"""
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.is_file else 0
+        frame_period = 1.0 / fps if fps and fps > 0 else 0.0
+        next_due = time.monotonic()
+
+        while self.running:
+            started = time.perf_counter()
+            sampled = self._grab_sampled()
+            if sampled is None:
+                if self.is_file:
+                    logger.info(f"End of video: {self.source}")
+                    break
+                logger.warning(f"Capture read failed, reopening: {self.source}")
+                time.sleep(1)
+                self.cap.release()
+                self.cap = cv2.VideoCapture(self.source)
+                continue
+
+            ret, frame = self.cap.retrieve(self._back[0]) if sampled else (False, None)
+            if ret:
+                if self.on_decode is not None:
+                    self.on_decode(time.perf_counter() - started)
+                self._back[0] = frame
+                self._back[1] = time.time()
+
+                with self._cond:
+                    if self._fresh:
+                        self.dropped_frames += 1
+                    self._back, self._middle = self._middle, self._back
+                    self._fresh = True
+                    self.captured_frames += 1
+                    self._cond.notify_all()
+
+            # Replay files at their native rate instead of racing through them
+            if frame_period:
+                next_due += frame_period
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_due = time.monotonic()
+
+        with self._cond:
+            self.finished = True
+            self._cond.notify_all()
+
+    def read_latest(self, timeout: float = 1.0):
+        """
+        Get the newest frame not returned before, with its capture time
+
+        The returned array is reused once read_latest() is called again.
+
+        Args:
+            timeout: Seconds to wait for a new frame
+
+        Returns:
+            (frame, capture timestamp) or (None, None) if no new frame arrived
+        """
+        if not self.threaded:
+            frame = self.get_frame()
+            return frame, self.last_timestamp if frame is not None else None
+
+        with self._cond:
+            if not self._fresh:
+                self._cond.wait_for(lambda: self._fresh or self.finished, timeout=timeout)
+            if not self._fresh:
+                return None, None
+            self._front, self._middle = self._middle, self._front
+            self._fresh = False
+            self.last_timestamp = self._front[1]
+            return self._front[0], self._front[1]
 
     def get_frame(self):
-        ret, frame = self.cap.read()
+        if self.threaded:
+            frame, _ = self.read_latest()
+            return frame
+
+        started = time.perf_counter()
+        if self.is_file:
+            # Skip to the next sampled position without decoding the frames in between
+            sampled = False
+            while not sampled:
+                sampled = self._grab_sampled()
+                if sampled is None:
+                    return None
+        elif not self.cap.grab():
+            return None
+
+        ret, frame = self.cap.retrieve(self._frame)
         if not ret:
             return None
+        self._frame = frame
+        self.captured_frames += 1
+        self.last_timestamp = time.time()
+        if self.on_decode is not None:
+            self.on_decode(time.perf_counter() - started)
         return frame
 
+    @property
+    def frame_age(self) -> float:
+        """Seconds since the last returned frame was captured"""
+        if self.last_timestamp is None:
+            return 0.0
+        return time.time() - self.last_timestamp
+
     def release(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
         self.cap.release()
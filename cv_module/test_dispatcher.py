@@ -0,0 +1,117 @@
+"""
+Tests for the rate limiter and the concurrent inference dispatcher
+Run with: python -m pytest test_dispatcher.py
+"""
+import time
+import threading
+
+import pytest
+
+from dispatcher import DeadlineExceeded, InferenceDispatcher, TokenBucket
+
+
+class _Backend:
+    """Backend whose n-th call sleeps and then answers or fails as told (the last behaviour repeats)"""
+
+    def __init__(self, *behaviours):
+        self.behaviours = behaviours or ((0.0, None),)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def infer_prepared(self, payload, timeout=None):
+        with self._lock:
+            attempt = self.calls
+            self.calls += 1
+        delay, error = self.behaviours[min(attempt, len(self.behaviours) - 1)]
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return [{"payload": payload, "attempt": attempt}]
+
+
+@pytest.fixture
+def dispatchers():
+    created = []
+
+    def make(backend, **kwargs):
+        kwargs.setdefault("concurrency", 4)
+        kwargs.setdefault("rate", 0)
+        kwargs.setdefault("deadline", 2.0)
+        kwargs.setdefault("hedge", False)
+        dispatcher = InferenceDispatcher(backend, **kwargs)
+        created.append(dispatcher)
+        return dispatcher
+
+    yield make
+    for dispatcher in created:
+        dispatcher.close()
+
+
+def test_bucket_allows_burst_then_refills():
+    bucket = TokenBucket(rate=20, capacity=2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    time.sleep(0.06)
+    assert bucket.try_acquire()
+
+
+def test_bucket_acquire_waits_only_within_timeout():
+    bucket = TokenBucket(rate=20, capacity=1)
+    assert bucket.try_acquire()
+    assert not bucket.acquire(timeout=0.01)
+    started = time.monotonic()
+    assert bucket.acquire(timeout=0.5)
+    assert 0.02 < time.monotonic() - started < 0.2
+
+
+def test_zero_rate_is_unlimited():
+    bucket = TokenBucket(rate=0)
+    assert all(bucket.try_acquire() for _ in range(1000))
+
+
+def test_results_and_errors_reach_the_future(dispatchers):
+    dispatcher = dispatchers(_Backend((0.0, None), (0.0, RuntimeError("backend down"))))
+    assert dispatcher.infer("frame-1", camera_id=1) == [{"payload": "frame-1", "attempt": 0}]
+    with pytest.raises(RuntimeError, match="backend down"):
+        dispatcher.infer("frame-2", camera_id=1)
+    stats = dispatcher.stats()
+    assert (stats["ok"], stats["error"], stats["in_flight"]) == (1, 1, 0)
+
+
+def test_slow_call_fails_at_its_deadline(dispatchers):
+    dispatcher = dispatchers(_Backend((1.0, None)))
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        dispatcher.submit("frame", camera_id=1, deadline=0.1).result(timeout=2)
+    assert time.monotonic() - started < 0.5
+    assert dispatcher.stats()["deadline"] == 1
+
+
+def test_rate_limit_fails_calls_that_cannot_start_in_time(dispatchers):
+    dispatcher = dispatchers(_Backend(), rate=1, burst=1, deadline=0.2)
+    assert dispatcher.infer("frame-1")
+    with pytest.raises(DeadlineExceeded):
+        dispatcher.infer("frame-2")
+    assert dispatcher.stats()["throttled"] == 1
+
+
+def test_hedge_answers_for_a_slow_first_attempt(dispatchers):
+    dispatcher = dispatchers(_Backend((1.0, None), (0.0, None)), hedge=True, hedge_delay=0.05)
+    started = time.monotonic()
+    result = dispatcher.infer("frame", camera_id=1)
+    assert time.monotonic() - started < 0.5
+    assert result[0]["attempt"] == 1
+    stats = dispatcher.stats()
+    assert (stats["hedged"], stats["hedge_won"], stats["ok"]) == (1, 1, 1)
+
+
+def test_failed_attempt_is_retried_once_when_hedging(dispatchers):
+    backend = _Backend((0.0, RuntimeError("flaky")), (0.0, None))
+    dispatcher = dispatchers(backend, hedge=True, hedge_delay=1.0)
+    assert dispatcher.infer("frame")[0]["attempt"] == 1
+    assert dispatcher.stats()["retried"] == 1
+
+    backend.behaviours = ((0.0, RuntimeError("down")),)
+    with pytest.raises(RuntimeError, match="down"):
+        dispatcher.infer("frame")
+    assert dispatcher.stats()["retried"] == 2
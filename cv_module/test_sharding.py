@@ -0,0 +1,115 @@
+"""
+Tests for the shared-memory frame rings
+Run with: python -m pytest test_sharding.py
+"""
+import os
+import itertools
+import multiprocessing
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from sharding import FrameRing, RingReader, ShardSupervisor
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def ring():
+    """Owner side of a small ring, removed after the test"""
+    owner = FrameRing.create(f"pv_test_{os.getpid()}_{next(_names)}", 16 * 16 * 3, multiprocessing.Lock())
+    yield owner
+    owner.close()
+
+
+def _frame(value: int, size: int = 16) -> np.ndarray:
+    return np.full((size, size, 3), value, np.uint8)
+
+
+def test_reader_gets_newest_frame_once(ring):
+    writer = FrameRing.attach(ring.shm.name, ring.lock)
+    reader = RingReader(FrameRing.attach(ring.shm.name, ring.lock))
+    assert reader.read_latest(timeout=0) == (None, None)
+
+    writer.write(_frame(1), 1.0)
+    frame, captured_at = reader.read_latest(timeout=0)
+    assert captured_at == 1.0 and (frame == 1).all()
+    assert reader.read_latest(timeout=0) == (None, None)
+
+    writer.write(_frame(2), 2.0)
+    frame, captured_at = reader.read_latest(timeout=0)
+    assert captured_at == 2.0 and (frame == 2).all()
+    assert reader.dropped_frames == 0
+    writer.close()
+    reader.release()
+
+
+def test_held_frame_survives_later_writes(ring):
+    """The writer never fills the slot the reader holds"""
+    writer = FrameRing.attach(ring.shm.name, ring.lock)
+    writer.write(_frame(1), 1.0)
+    held, _ = ring.read()
+    for value in range(2, 10):
+        writer.write(_frame(value), float(value))
+    assert (held == 1).all()
+
+    frame, captured_at = ring.read()
+    assert captured_at == 9.0 and (frame == 9).all()
+    # Frames 2 to 8 were replaced before the reader asked
+    assert ring.stats()["written"] == 9
+    assert ring.stats()["dropped"] == 7
+    del held, frame
+    writer.close()
+
+
+def test_grayscale_frames_keep_their_shape(ring):
+    ring.write(np.full((16, 16), 7, np.uint8), 1.0)
+    frame, _ = ring.read()
+    assert frame.shape == (16, 16) and (frame == 7).all()
+
+
+def test_oversize_frame_is_refused_not_resized(ring):
+    with pytest.raises(ValueError):
+        ring.write(_frame(1, size=32), 1.0)
+    assert ring.needed == 32 * 32 * 3
+    assert ring.read() == (None, None)
+
+
+def test_writer_and_reader_follow_a_resized_ring(ring):
+    writer = FrameRing.attach(ring.shm.name, ring.lock)
+    reader = FrameRing.attach(ring.shm.name, ring.lock)
+    writer.write(_frame(1), 1.0)
+    with pytest.raises(ValueError):
+        writer.write(_frame(2, size=32), 2.0)
+
+    ring.resize(ring.needed)
+    writer.write(_frame(3, size=32), 3.0)
+    frame, captured_at = reader.read()
+    assert captured_at == 3.0 and frame.shape == (32, 32, 3) and (frame == 3).all()
+    assert writer.capacity == reader.capacity == ring.capacity == 32 * 32 * 3
+    del frame
+    writer.close()
+    reader.close()
+
+
+def test_supervisor_grows_rings_that_refused_a_frame():
+    camera = SimpleNamespace(camera_id=1, parking_lot_id=1, source="/nonexistent/camera.mp4")
+    supervisor = ShardSupervisor([camera], shards=1, capture_processes=1)
+    supervisor._create_rings()
+    try:
+        owner = supervisor.rings[1]
+        writer = FrameRing.attach(owner.shm.name, owner.lock)
+        size = int((owner.capacity // 3) ** 0.5) + 1
+        with pytest.raises(ValueError):
+            writer.write(_frame(5, size=size), 1.0)
+
+        supervisor.check()
+        assert owner.capacity == size * size * 3
+        writer.write(_frame(5, size=size), 2.0)
+        frame, _ = owner.read()
+        assert frame.shape == (size, size, 3)
+        del frame
+        writer.close()
+    finally:
+        supervisor.stop()
@@ -0,0 +1,76 @@
+"""
+Tests for the durable update spool
+Run with: python -m pytest test_spool.py
+"""
+import pytest
+
+from spool import UpdateSpool, LOT_STATUS, SPOT_STATUS, EVENT
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = UpdateSpool(str(tmp_path / "spool.sqlite"))
+    yield spool
+    spool.close()
+
+
+def test_compacts_to_newest_entry_per_key_in_order(spool):
+    spool.append(SPOT_STATUS, 1, {"status": "occupied"}, 1.0)
+    spool.append(LOT_STATUS, 7, {"empty": 3}, 2.0)
+    spool.append(SPOT_STATUS, 1, {"status": "empty"}, 3.0)
+    spool.append(SPOT_STATUS, 2, {"status": "occupied"}, 4.0)
+    assert len(spool) == 4
+
+    entries = spool.compacted()
+    assert [(kind, key, payload, observed_at) for _, kind, key, payload, observed_at in entries] == [
+        (LOT_STATUS, "7", {"empty": 3}, 2.0),
+        (SPOT_STATUS, "1", {"status": "empty"}, 3.0),
+        (SPOT_STATUS, "2", {"status": "occupied"}, 4.0),
+    ]
+    assert len(spool.compacted(limit=2)) == 2
+
+
+def test_acknowledge_removes_delivered_and_older_entries(spool):
+    spool.append(SPOT_STATUS, 1, {"status": "occupied"}, 1.0)
+    spool.append(SPOT_STATUS, 1, {"status": "empty"}, 2.0)
+    spool.append(EVENT, 7, {"event_type": "lot_full"}, 3.0)
+    delivered = [(seq, kind, key) for seq, kind, key, _, _ in spool.compacted(limit=1)]
+    assert delivered[0][1:] == (SPOT_STATUS, "1")
+
+    # An update spooled while the batch was in flight must survive its acknowledgement
+    spool.append(SPOT_STATUS, 1, {"status": "occupied"}, 4.0)
+    spool.acknowledge(delivered)
+    remaining = [(kind, key, payload) for _, kind, key, payload, _ in spool.compacted()]
+    assert remaining == [(EVENT, "7", {"event_type": "lot_full"}), (SPOT_STATUS, "1", {"status": "occupied"})]
+    assert len(spool) == 2
+    assert spool.stats()["replayed"] == 1
+
+
+def test_trim_drops_oldest_entries_over_budget(tmp_path):
+    spool = UpdateSpool(str(tmp_path / "spool.sqlite"), max_bytes=200)
+    try:
+        for spot_id in range(20):
+            spool.append(SPOT_STATUS, spot_id, {"status": "occupied", "pad": "x" * 10})
+        stats = spool.stats()
+        assert stats["bytes"] <= 200
+        assert stats["dropped"] > 0
+        assert len(spool) == 20 - stats["dropped"]
+        # The newest updates are the ones kept
+        assert spool.compacted()[-1][2] == "19"
+        assert int(spool.compacted()[0][2]) == stats["dropped"]
+    finally:
+        spool.close()
+
+
+def test_survives_reopening(tmp_path):
+    path = str(tmp_path / "spool.sqlite")
+    spool = UpdateSpool(path)
+    spool.append(LOT_STATUS, 7, {"empty": 3}, 1.0)
+    spool.close()
+
+    reopened = UpdateSpool(path)
+    try:
+        assert len(reopened) == 1
+        assert reopened.compacted()[0][3] == {"empty": 3}
+    finally:
+        reopened.close()
@@ -0,0 +1,39 @@
+"""
+Tests for per-spot state smoothing
+Run with: python -m pytest test_spots.py
+"""
+import numpy as np
+
+from spots import SpotMatch, SpotStateTracker
+
+
+def _match(occupied: bool, confidence: float) -> SpotMatch:
+    """One spot matched by one detection"""
+    return SpotMatch(
+        spot_ids=np.array([1]),
+        detection_index=np.array([0]),
+        iou=np.array([0.8]),
+        occupied=np.array([occupied]),
+        confidence=np.array([confidence], dtype=np.float32)
+    )
+
+
+def test_ema_commits_moderate_confidence_flip():
+    """A spot seen empty at confidence 0.6 after being occupied must become empty"""
+    tracker = SpotStateTracker(1, mode="ema", alpha=0.5, occupied_threshold=0.65, empty_threshold=0.35)
+    tracker.update(_match(True, 0.9))
+    assert tracker.state[0] == 1
+
+    flips = [len(tracker.update(_match(False, 0.6))) for _ in range(10)]
+    assert tracker.state[0] == 0
+    assert sum(flips) == 1
+    # Hysteresis still holds back a single observation
+    assert flips[0] == 0
+
+
+def test_ema_ignores_single_outlier():
+    tracker = SpotStateTracker(1, mode="ema", alpha=0.5, occupied_threshold=0.65, empty_threshold=0.35)
+    tracker.update(_match(False, 0.9))
+    assert len(tracker.update(_match(True, 0.9))) == 0
+    assert len(tracker.update(_match(False, 0.9))) == 0
+    assert tracker.state[0] == 0
@@ -0,0 +1,127 @@
+"""
+Tests for tiled inference: tile layout, non-maximum suppression and merging tiles back into one frame
+Run with: python -m pytest test_tiling.py
+"""
+import cv2
+import numpy as np
+import pytest
+
+from backends import InferenceBackend
+from detector import DetectionBatch, ParkingDetector, TiledPayload, nms, tile_grid
+from dispatcher import InferenceDispatcher
+
+# (x0, y0) of 60x40 cars; several straddle the tile borders of a 900x600 frame cut into 400 px tiles
+CARS = [(20, 20), (280, 100), (330, 240), (500, 300), (610, 180), (150, 330), (790, 540), (440, 150)]
+CAR_W, CAR_H = 60, 40
+
+
+class _BlobBackend(InferenceBackend):
+    """Detects every white rectangle in the image; cars cut by the image border score lower"""
+
+    name = "blobs"
+
+    def __init__(self):
+        super().__init__("blobs")
+
+    def infer(self, image):
+        count, _, stats, _ = cv2.connectedComponentsWithStats((image[:, :, 0] > 0).astype(np.uint8))
+        height, width = image.shape[:2]
+        predictions = []
+        for x, y, w, h, _ in stats[1:count].tolist():
+            cut = x == 0 or y == 0 or x + w == width or y + h == height
+            predictions.append({
+                "x": x + w / 2, "y": y + h / 2, "width": w, "height": h,
+                "confidence": 0.6 if cut else 0.9, "class": "occupied"
+            })
+        return predictions
+
+
+def _frame() -> np.ndarray:
+    frame = np.zeros((600, 900, 3), np.uint8)
+    for x, y in CARS:
+        frame[y:y + CAR_H, x:x + CAR_W] = 255
+    return frame
+
+
+def _centers(batch: DetectionBatch) -> list:
+    return sorted((round(x - CAR_W / 2), round(y - CAR_H / 2)) for x, y in batch.boxes[:, :2].tolist())
+
+
+def test_tiles_cover_the_frame_and_owned_regions_partition_it():
+    tiles, owned = tile_grid(600, 900, 400, 0.25)
+    assert (tiles[:, 0] >= 0).all() and (tiles[:, 2] <= 900).all() and (tiles[:, 3] <= 600).all()
+    assert tiles[:, 2].max() == 900 and tiles[:, 3].max() == 600
+    assert ((tiles[:, 2] - tiles[:, 0]) == 400).all()
+
+    # Every pixel center is owned by exactly one tile, inside that tile
+    ys, xs = np.mgrid[0:600:7, 0:900:7] + 0.5
+    points = np.stack((xs.ravel(), ys.ravel()), axis=1)
+    inside = (
+        (points[:, None, 0] >= owned[None, :, 0]) & (points[:, None, 0] < owned[None, :, 2])
+        & (points[:, None, 1] >= owned[None, :, 1]) & (points[:, None, 1] < owned[None, :, 3])
+    )
+    assert (inside.sum(axis=1) == 1).all()
+    assert (owned[:, :2] >= tiles[:, :2]).all() and (owned[:, 2:] <= tiles[:, 2:]).all()
+
+
+def test_small_frame_is_a_single_tile():
+    tiles, owned = tile_grid(300, 200, 400, 0.25)
+    assert tiles.tolist() == [[0, 0, 200, 300]]
+    assert owned.tolist() == [[0.0, 0.0, 200.0, 300.0]]
+
+
+def test_nms_keeps_highest_score_of_overlapping_boxes():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [50, 50, 60, 60]], dtype=float)
+    scores = np.array([0.5, 0.9, 0.7])
+    assert nms(boxes, scores, 0.5).tolist() == [1, 2]
+    assert nms(boxes, scores, 0.9).tolist() == [1, 2, 0]
+
+
+def test_batch_nms_is_per_class_unless_agnostic():
+    batch = DetectionBatch(
+        np.array([[5, 5, 10, 10], [5.5, 5.5, 10, 10]]), np.array([0.9, 0.8]), np.array([0, 1]), ["occupied", "empty"]
+    )
+    assert len(batch.nms(0.5)) == 2
+    merged = batch.nms(0.5, class_agnostic=True)
+    assert len(merged) == 1 and merged.class_names[merged.class_ids[0]] == "occupied"
+
+
+def test_tiled_detection_finds_every_car_once():
+    detector = ParkingDetector(backend=_BlobBackend())
+    batch = detector.predict_prepared(detector.prepare_frame(_frame(), tile_size=400, tile_overlap=0.25))
+    assert _centers(batch) == sorted(CARS)
+    assert (batch.boxes[:, 2:] == (CAR_W, CAR_H)).all()
+
+
+@pytest.mark.parametrize("overlap", [0.0, 0.1])
+def test_cut_copies_are_dropped_with_small_overlaps(overlap):
+    detector = ParkingDetector(backend=_BlobBackend())
+    batch = detector.predict_prepared(detector.prepare_frame(_frame(), tile_size=400, tile_overlap=overlap))
+    assert len(batch) == len(CARS)
+
+
+def test_merge_suppresses_a_car_seen_by_two_tiles_either_side_of_the_split():
+    """Two tiles report one car with centers that straddle the middle of their overlap"""
+    tiles, owned = tile_grid(400, 700, 400, 0.25)
+    split = owned[0, 2]
+    tiled = TiledPayload(tiles=tiles, owned=owned, payloads=[None] * len(tiles))
+    car = {"y": 200, "width": 60, "height": 40, "class": "occupied"}
+    results = [
+        [dict(car, x=split - 2 - tiles[0, 0], confidence=0.8)],
+        [dict(car, x=split + 2 - tiles[1, 0], confidence=0.9)],
+    ]
+    merged = ParkingDetector(backend=_BlobBackend())._merge_tiles(tiled, results)
+    assert len(merged) == 1
+    assert merged.boxes[0, 0] == split + 2 and merged.confidences[0] == 0.9
+
+
+def test_dispatched_tiles_merge_like_inline_ones():
+    backend = _BlobBackend()
+    dispatcher = InferenceDispatcher(backend, concurrency=4, rate=0, hedge=False)
+    try:
+        detector = ParkingDetector(backend=backend, dispatcher=dispatcher)
+        payload = detector.prepare_frame(_frame(), tile_size=400, tile_overlap=0.25)
+        batch = detector.submit_prepared(payload, camera_id=1).result(timeout=5)
+        assert _centers(batch) == sorted(CARS)
+    finally:
+        dispatcher.close()
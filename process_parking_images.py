@@ -2,35 +2,29 @@
 Process parking images with Roboflow REST API
 """
 import os
-import requests
+import sys
 import base64
 from PIL import Image, ImageDraw, ImageFont
 
-# Roboflow configuration
-API_KEY = "0Zmk2YMfrmOASiUGMQSG"
-MODEL_ID = "car-parking-xutja/1"
-API_URL = f"https://serverless.roboflow.com/{MODEL_ID}"
+# Shared inference cache lives in the CV module
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "cv_module"))
+from cache import InferenceCache
+from backends import RoboflowBackend
+
+# Roboflow backend configured like the CV module's default one (ROBOFLOW_* settings, pooled
+# REST endpoint): its cache namespace covers endpoint, model and confidence, so both share entries
+backend = RoboflowBackend(pool_size=1)
+cache = InferenceCache()
 
 def process_image_with_model(image_path, output_path):
     """Process image with real Roboflow model via REST API"""
     print(f"Processing: {image_path}")
     
-    # Upload image to Roboflow
+    # Upload image to Roboflow (skipped when this exact image was inferred before)
     try:
         with open(image_path, 'rb') as f:
-            response = requests.post(
-                API_URL,
-                params={"api_key": API_KEY},
-                files={"file": f},
-                timeout=30
-            )
-        
-        if response.status_code != 200:
-            print(f"✗ API Error: {response.status_code} - {response.text}")
-            return False
-            
-        result = response.json()
-        predictions = result.get('predictions', [])
+            image_bytes = f.read()
+        predictions = cache.get_or_infer(image_bytes, backend.cache_namespace, lambda: backend.infer(image_path))
         print(f"✓ Model found {len(predictions)} detections")
         
     except Exception as e:
@@ -100,5 +94,8 @@ def main():
         print(f"Completed {i}/{len(image_files)}")
         print("-" * 60)
 
+    stats = cache.stats()
+    print(f"Inference cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+
 if __name__ == "__main__":
     main()